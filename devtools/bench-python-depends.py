@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# @mindmaze_header@
+"""
+Benchmark of the analysis of the dependencies of python modules performed
+by mmpack-build (python_depends module).
+
+A large module is generated along with an external module it uses. The
+generated module contains a deeply nested expression (as found in generated
+code) and many functions calling local and external functions. The time
+needed to analyze it is reported, as well as the failure of the analysis
+(for example RecursionError).
+
+The mmpack_build package benchmarked is the one found in python path, hence
+two versions can be compared by running for example:
+
+    PYTHONPATH=<staged mmpack_build parent dir> \\
+        devtools/bench-python-depends.py
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from astroid import MANAGER as astroid_manager
+
+from mmpack_build.python_depends import _gen_py_depends
+
+
+def _write_file(filename: str, content: str):
+    with open(filename, 'wt') as outfile:
+        outfile.write(content)
+
+
+def _gen_modules(moddir: str, num_terms: int, num_funcs: int) -> str:
+    """
+    Generate the external module and the module to analyze in moddir.
+
+    Returns:
+        path of the module to analyze
+    """
+    _write_file(os.path.join(moddir, 'benchdep.py'),
+                'def compute(val):\n    return val\n\n\n'
+                'class Helper:\n'
+                '    def run(self, val):\n'
+                '        return val\n')
+
+    lines = ['import benchdep', '', '']
+    lines.append('VAL = ' + ' + '.join('benchdep.compute({})'.format(i)
+                                       for i in range(num_terms)))
+    for i in range(num_funcs):
+        lines += ['', '',
+                  'def local{}(val):'.format(i),
+                  '    return val',
+                  '', '',
+                  'def func{}(val):'.format(i),
+                  '    helper = benchdep.Helper()',
+                  '    val = local{}(val) + helper.run(val)'.format(i),
+                  '    return benchdep.compute(val) + local{}(val)'.format(i)]
+
+    filename = os.path.join(moddir, 'benchmod.py')
+    _write_file(filename, '\n'.join(lines) + '\n')
+    return filename
+
+
+def main():
+    """
+    entry point of the benchmark
+    """
+    parser = ArgumentParser(description=__doc__,
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--terms', type=int, default=2000,
+                        help='number of terms of the nested expression')
+    parser.add_argument('--functions', type=int, default=1000,
+                        help='number of functions of the generated module')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of analyses of the module')
+    options = parser.parse_args()
+
+    moddir = mkdtemp()
+    sys.path.insert(0, moddir)
+    try:
+        filename = _gen_modules(moddir, options.terms, options.functions)
+        timings = []
+        for _ in range(options.repeat):
+            astroid_manager.clear_cache()
+            start = time.perf_counter()
+            try:
+                used = _gen_py_depends(filename, {filename})
+            except RecursionError as error:
+                print('analysis failed: {!r}'.format(error))
+                return 1
+            timings.append(time.perf_counter() - start)
+    finally:
+        sys.path.remove(moddir)
+        rmtree(moddir)
+
+    print('symbols used: {}'.format(', '.join(sorted(used))))
+    print('analysis time: best {:.3f}s, mean {:.3f}s over {} runs'
+          .format(min(timings), sum(timings) / len(timings), len(timings)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# @mindmaze_header@
+"""
+Placement of the artifacts (source tarballs, packages, manifests) produced
+by the different stages of a build.
+
+The artifacts are never modified once they have been created, hence they
+can be shared between the workspace folders instead of being copied byte
+for byte. In order of preference, a file is placed by:
+ - hardlinking it if the destination is on the same filesystem
+ - cloning it (reflink) or copying it within the kernel (copy_file_range)
+ - copying it
+"""
+
+import os
+import shutil
+
+from . common import dprint
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# ioctl request of linux to share the extents of a file with another one
+_FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)
+
+
+def _clone_file(src: str, dst: str) -> bool:
+    """
+    Copy src into dst without transferring its data through userspace.
+
+    Returns:
+        True if the file has been copied, False if not supported
+    """
+    with open(src, 'rb') as srcfile, open(dst, 'wb') as dstfile:
+        if fcntl:
+            try:
+                fcntl.ioctl(dstfile.fileno(), _FICLONE, srcfile.fileno())
+                return True
+            except OSError:
+                pass
+
+        if not hasattr(os, 'copy_file_range'):
+            return False
+
+        remaining = os.fstat(srcfile.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(srcfile.fileno(),
+                                            dstfile.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError:
+            return False
+
+        return remaining == 0
+
+
+def place_artifact(src: str, dst: str) -> str:
+    """
+    Place the file src at dst, sharing its data when possible. The
+    destination is replaced atomically, hence a concurrent reader never sees
+    a partially written file.
+
+    Args:
+        src: path of the artifact to place. It must not be modified
+            afterwards since it might be shared with dst.
+        dst: destination path or folder where to place src
+
+    Returns:
+        path of the placed file
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return dst
+
+    tmp = '{}.{}.tmp'.format(dst, os.getpid())
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+
+    try:
+        os.link(src, tmp)
+        dprint('{} hardlinked to {}'.format(src, dst))
+    except OSError:
+        if not _clone_file(src, tmp):
+            shutil.copyfile(src, tmp)
+        shutil.copymode(src, tmp)
+
+    os.replace(tmp, dst)
+    return dst
@@ -94,6 +94,16 @@ class BaseHook:
         # pylint: disable=unused-argument, no-self-use
         return None
 
+    def prepare_depends(self, pkgs: List[PackageInfo]):
+        """
+        Called once with all binary packages cobuilded by the same project
+        before update_depends() is called for each of them. It can be used
+        by hook implementation to gather what is used by all packages and
+        look it up at once, for example in the system package database.
+        """
+        # pylint: disable=unused-argument, no-self-use
+        return None
+
     def update_depends(self, pkg: PackageInfo, other_pkgs: List[PackageInfo]):
         """
         Look in files assigned to a binary package update the list of
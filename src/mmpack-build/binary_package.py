@@ -87,7 +87,8 @@ class BinaryPackage:
 
             # Add file with checksum
             cksums[filename] = sha256sum(filename, follow_symlink=False)
-        yaml_serialize(cksums, self._sha256sums_file(), use_block_style=True)
+        metadata_serialize(cksums, self._sha256sums_file(),
+                           use_block_style=True)
 
         # Create info file
         info = {'version': self.version,
@@ -96,7 +97,7 @@ class BinaryPackage:
                 'srcsha256': self.src_hash,
                 'sumsha256sums': sha256sum(self._sha256sums_file())}
         info.update(self._dependencies)
-        yaml_serialize({self.name: info}, 'MMPACK/info')
+        metadata_serialize({self.name: info}, 'MMPACK/info')
         popdir()
 
     def _store_provides(self, pkgdir: str):
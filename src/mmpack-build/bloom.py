@@ -0,0 +1,88 @@
+# @mindmaze_header@
+"""
+Minimal bloom filter implementation used to summarize the content of
+metadata files: it allows to know quickly that a key is NOT present in a file
+without having to parse it.
+"""
+
+import math
+from hashlib import blake2b
+from typing import Iterable
+
+
+_MAGIC = b'MMBLOOM1'
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings. A negative membership test is always
+    correct, a positive one may be a false positive.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes = None):
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = num_hashes
+        num_bytes = (self.num_bits + 7) // 8
+        self._bits = bytearray(bits if bits else num_bytes)
+        if len(self._bits) != num_bytes:
+            raise ValueError('bloom filter data does not match its size')
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[str],
+                  fp_rate: float = 0.01) -> 'BloomFilter':
+        """
+        Create a bloom filter containing keys, dimensioned to yield the
+        false positive rate fp_rate.
+        """
+        keys = list(keys)
+        num_keys = max(len(keys), 1)
+        num_bits = int(-num_keys * math.log(fp_rate) / (math.log(2) ** 2))
+        num_hashes = max(int(round(num_bits / num_keys * math.log(2))), 1)
+
+        bloom = cls(num_bits, num_hashes)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        hash1 = int.from_bytes(digest[:8], 'little')
+        hash2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (hash1 + i * hash2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        """
+        add key to the filter
+        """
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        for pos in self._positions(key):
+            if not self._bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, filename: str) -> None:
+        """
+        write bloom filter to filename
+        """
+        with open(filename, 'wb') as outfile:
+            header = '{} {}\n'.format(self.num_bits, self.num_hashes)
+            outfile.write(_MAGIC + b' ' + header.encode('ascii'))
+            outfile.write(self._bits)
+
+    @classmethod
+    def load(cls, filename: str) -> 'BloomFilter':
+        """
+        read bloom filter written by save() from filename
+
+        Raises:
+            ValueError: filename is not a valid bloom filter file
+        """
+        with open(filename, 'rb') as infile:
+            header = infile.readline().split()
+            if len(header) != 3 or header[0] != _MAGIC:
+                raise ValueError('invalid bloom filter file: ' + filename)
+            return cls(int(header[1]), int(header[2]), infile.read())
@@ -0,0 +1,278 @@
+# @mindmaze_header@
+"""
+Management of the disk space used by mmpack-build.
+
+The build folders, the copies of sources, the mirrors of git repositories,
+the cached downloads and source tarballs, the results of python analyses,
+the indexes of system packages, the provides indexes of repositories and
+the generated packages are all accounted in a single cache.
+The last use of each of them is tracked by its modification time, hence no
+separate database needs to be maintained.
+
+The size and the age of the cache can be limited in mmpack configuration
+file with the following keys:
+    build-cache-max-size: maximum total size, in bytes or with a K, M, G
+        or T suffix (for instance 20G)
+    build-cache-max-age: number of days after which an unused entry is
+        removed
+
+When a limit is exceeded, the least recently used entries are removed
+first.
+"""
+
+import os
+import re
+import stat
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from . common import dprint, iprint, yaml_load
+from . file_lock import FileLock
+from . workspace import Workspace, builddir_lock, srcdir_lock
+
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+
+class CacheEntry:
+    """
+    file or folder accounted in the cache
+
+    Attributes:
+        paths: paths to remove when the entry is evicted (the first one is
+            the one determining the last use)
+        last_use: timestamp of the last use of the entry
+        size: disk usage of the entry in bytes
+        lock: lock held while the entry is in use, None if not lockable
+    """
+
+    def __init__(self, paths: List[str], last_use: float, size: int,
+                 lock: FileLock = None):
+        self.paths = paths
+        self.last_use = last_use
+        self.size = size
+        self.lock = lock
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size in bytes, possibly suffixed by a binary unit (K, M, G or T).
+
+    Raises:
+        ValueError: value is not a valid size
+    """
+    value = str(value).strip().upper()
+    if value.endswith('B'):
+        value = value[:-1]
+
+    unit = value[-1:] if value[-1:] in _SIZE_UNITS else ''
+    number = value[:len(value) - len(unit)]
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def get_cache_quotas() -> Tuple[Optional[int], Optional[float]]:
+    """
+    Get the limits of the cache from mmpack configuration.
+
+    Returns:
+        maximum size in bytes and maximum age in days. Each of them is None
+        if not set.
+    """
+    try:
+        config = yaml_load(Workspace().config)
+    except FileNotFoundError:
+        config = None
+    if not isinstance(config, dict):
+        return (None, None)
+
+    max_size = config.get('build-cache-max-size')
+    max_age = config.get('build-cache-max-age')
+    return (parse_size(max_size) if max_size else None,
+            float(max_age) if max_age else None)
+
+
+class _DiskUsage:
+    """
+    Compute disk usage of files, counting the hardlinked files only once
+    """
+
+    def __init__(self):
+        self._inodes = set()
+
+    def file_size(self, info: os.stat_result) -> int:
+        """
+        get size of a file or 0 if it has already been accounted
+        """
+        inode = (info.st_dev, info.st_ino)
+        if inode in self._inodes:
+            return 0
+
+        self._inodes.add(inode)
+        return info.st_size
+
+    def size(self, path: str) -> int:
+        """
+        get the size of a file or folder
+        """
+        info = os.lstat(path)
+        size = self.file_size(info)
+        if not stat.S_ISDIR(info.st_mode):
+            return size
+
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                try:
+                    size += self.file_size(os.lstat(os.path.join(root, name)))
+                except FileNotFoundError:
+                    pass
+
+        return size
+
+
+def _list_candidates() -> Iterable[Tuple[List[str], Optional[FileLock]]]:
+    wrk = Workspace()
+
+    for builddir in wrk.list_builddirs():
+        yield ([builddir], builddir_lock(builddir))
+
+    # temporary sources are locked while used by a build
+    for name in os.listdir(wrk.sources):
+        if not name.endswith('.lock'):
+            path = os.path.join(wrk.sources, name)
+            yield ([path], srcdir_lock(path))
+
+    # partial downloads are locked while being downloaded
+    downloads = wrk.cachedir('downloads')
+    for name in os.listdir(downloads):
+        path = os.path.join(downloads, name)
+        if name.endswith('.lock'):
+            base = path[:-len('.lock')]
+            if not os.path.lexists(base) and \
+                    not os.path.lexists(base + '.part'):
+                yield ([path], FileLock(path))  # left by removed download
+        else:
+            lockpath = re.sub(r'\.part$', '', path) + '.lock'
+            yield ([path], FileLock(lockpath))
+
+    # git mirrors are locked while updated or read. A mirror being created is
+    # cloned in <mirror>.<pid>.tmp
+    gitdir = wrk.cachedir('git')
+    for name in os.listdir(gitdir):
+        path = os.path.join(gitdir, name)
+        if name.endswith('.lock'):
+            if not os.path.lexists(path[:-len('.lock')]):
+                yield ([path], FileLock(path))  # left by removed mirror
+        else:
+            mirror = re.sub(r'\.\d+\.tmp$', '', path)
+            yield ([path], FileLock(mirror + '.lock'))
+
+    for root, _, files in os.walk(wrk.cachedir('pyanalysis')):
+        for name in files:
+            yield ([os.path.join(root, name)], None)
+
+    indexes = wrk.cachedir('indexes')
+    for name in os.listdir(indexes):
+        yield ([os.path.join(indexes, name)], None)
+
+    repo_provides = wrk.cachedir('repo-provides')
+    for name in os.listdir(repo_provides):
+        if not name.endswith('.etag'):
+            path = os.path.join(repo_provides, name)
+            yield ([path, path + '.etag'], None)
+
+    upstream = wrk.cachedir('upstream')
+    for subdir in os.scandir(upstream):
+        if subdir.is_dir():
+            for name in os.listdir(subdir.path):
+                yield ([os.path.join(subdir.path, name)], None)
+
+    srctar = wrk.cachedir('srctar')
+    for name in os.listdir(srctar):
+        if name.endswith('.tar.xz'):
+            path = os.path.join(srctar, name)
+            yield ([path, path + '.sha256'], None)
+
+    for name in os.listdir(wrk.packages):
+        yield ([os.path.join(wrk.packages, name)], None)
+
+
+def list_cache_entries() -> List[CacheEntry]:
+    """
+    List the entries of the cache, the least recently used first
+    """
+    usage = _DiskUsage()
+    entries = []
+    for paths, lock in _list_candidates():
+        try:
+            last_use = os.lstat(paths[0]).st_mtime
+            size = sum(usage.size(p) for p in paths if os.path.lexists(p))
+        except FileNotFoundError:
+            continue
+        entries.append(CacheEntry(paths, last_use, size, lock))
+
+    entries.sort(key=lambda e: e.last_use)
+    return entries
+
+
+def collect_garbage(max_size: int = None, max_age: float = None,
+                    keep: Iterable[str] = ()) -> List[CacheEntry]:
+    """
+    Remove the least recently used entries of the cache until it complies
+    with the limits.
+
+    Args:
+        max_size: maximum size of the cache in bytes. None if unlimited.
+        max_age: maximum age of unused entry in days. None if unlimited.
+        keep: paths that must not be removed
+
+    Returns:
+        the removed entries
+    """
+    if max_size is None and max_age is None:
+        return []
+
+    keep = {os.path.abspath(p) for p in keep}
+    entries = list_cache_entries()
+    total_size = sum(e.size for e in entries)
+    oldest = time.time() - max_age * 86400 if max_age is not None else None
+
+    evicted = []
+    for entry in entries:
+        if ((oldest is None or entry.last_use >= oldest)
+                and (max_size is None or total_size <= max_size)):
+            break
+
+        # kept entries use space but cannot be removed
+        if os.path.abspath(entry.paths[0]) in keep:
+            continue
+
+        # Entries in use by a concurrent build cannot be removed either. The
+        # lock is held until the entry is discarded, then its lock file is
+        # removed as well.
+        if entry.lock and not entry.lock.acquire(blocking=False):
+            dprint('skipping {} in use'.format(entry.paths[0]))
+            continue
+
+        dprint('evicting {} from cache'.format(entry.paths[0]))
+        evicted.append(entry)
+        total_size -= entry.size
+
+    try:
+        Workspace().discard([p for e in evicted for p in e.paths])
+    finally:
+        for entry in evicted:
+            if entry.lock:
+                entry.lock.remove()
+
+    return evicted
+
+
+def gc_workspace(keep: Iterable[str] = ()):
+    """
+    Enforce the limits of the cache set in mmpack configuration
+    """
+    max_size, max_age = get_cache_quotas()
+    evicted = collect_garbage(max_size, max_age, keep)
+    if evicted:
+        iprint('removed {} unused entries ({} bytes) from cache'
+               .format(len(evicted), sum(e.size for e in evicted)))
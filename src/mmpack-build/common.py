@@ -3,6 +3,7 @@
 A set of helpers used throughout the mmpack project
 """
 
+import json
 import logging
 import logging.handlers
 import os
@@ -17,6 +18,14 @@ from typing import Union, Tuple
 
 import yaml
 
+# Use libyaml bindings to load yaml when available: they are much faster. The
+# pure python dumper is kept for serialization since libyaml emitter does not
+# produce the same output (for instance on long double-quoted scalars).
+try:
+    from yaml import CBaseLoader as YamlLoader
+except ImportError:
+    from yaml import BaseLoader as YamlLoader
+
 CONFIG = {'debug': True, 'verbose': True}
 LOGGER = None
 
@@ -238,6 +247,98 @@ def _set_representer(dumper, data):
 yaml.add_representer(set, _set_representer)
 
 
+# Serialization format of each type of metadata file generated by
+# mmpack-build. The type of a file is deduced from its name (see
+# _metadata_filetype()). Possible formats are:
+#  - 'yaml': human readable yaml (default)
+#  - 'compact': single line json document with only string scalars. Since
+#    json is a subset of yaml, such a file is also loadable with yaml_load().
+#    It is much faster to write and read but meant only for machine-only
+#    metadata, ie those listed in _COMPACT_CAPABLE_FILETYPES.
+METADATA_FORMATS = {
+    'specs': 'yaml',
+    'provides': 'yaml',
+    'symbols': 'yaml',
+    'pyobjects': 'yaml',
+    'sha256sums': 'yaml',
+    'info': 'yaml',
+    'manifest': 'yaml',
+}
+
+# metadata files only consumed by mmpack-build (the others are also read by
+# mmpack or by humans)
+_COMPACT_CAPABLE_FILETYPES = {'symbols', 'pyobjects'}
+
+
+def set_metadata_format(filetype: str, fmt: str) -> None:
+    """
+    Select the format used to write metadata file of type `filetype`
+
+    Raises:
+        ValueError: invalid or unsupported format for filetype
+    """
+    if filetype not in METADATA_FORMATS or fmt not in ('yaml', 'compact'):
+        raise ValueError('Invalid metadata format {} for {}'
+                         .format(fmt, filetype))
+
+    if fmt == 'compact' and filetype not in _COMPACT_CAPABLE_FILETYPES:
+        raise ValueError('{} metadata files cannot use compact format'
+                         .format(filetype))
+
+    METADATA_FORMATS[filetype] = fmt
+
+
+def _metadata_filetype(filename: str) -> str:
+    """
+    get the metadata file type from its name
+    """
+    basename = os.path.basename(filename)
+    if basename in ('specs', 'info'):
+        return basename
+
+    ext = os.path.splitext(basename)[1][1:]
+    if ext == 'mmpack-manifest':
+        return 'manifest'
+
+    return ext
+
+
+def _stringify(obj):
+    """
+    convert recursively obj into lists, dicts and strings in the same way
+    a yaml dump would be read by yaml_load()
+    """
+    if isinstance(obj, dict):
+        return {str(k): _stringify(v) for k, v in obj.items()}
+    if isinstance(obj, (set, frozenset)):
+        return sorted(_stringify(v) for v in obj)
+    if isinstance(obj, (list, tuple)):
+        return [_stringify(v) for v in obj]
+    if obj is None:
+        return 'null'
+    if isinstance(obj, bool):
+        return 'true' if obj else 'false'
+
+    return str(obj)
+
+
+def metadata_serialize(obj: Union[list, dict], filename: str,
+                       use_block_style: bool = False) -> None:
+    """
+    Save metadata object in filename using the format configured for its
+    file type in METADATA_FORMATS.
+    """
+    if METADATA_FORMATS.get(_metadata_filetype(filename)) != 'compact':
+        yaml_serialize(obj, filename, use_block_style)
+        return
+
+    with open(filename, 'w+', newline='\n') as outfile:
+        json.dump(_stringify(obj), outfile, ensure_ascii=False,
+                  sort_keys=True, separators=(',', ':'))
+        outfile.write('\n')
+    dprint('wrote {0}'.format(filename))
+
+
 def sha256sum(filename: str, follow_symlink: bool = True) -> str:
     """
     compute the SHA-256 hash of a file
@@ -362,7 +463,23 @@ def yaml_load(filename: str):
     """
     helper: load yaml file with BasicLoader
     """
-    return yaml.load(open(filename, 'rb').read(), Loader=yaml.BaseLoader)
+    return yaml.load(open(filename, 'rb').read(), Loader=YamlLoader)
+
+
+def metadata_load(filename: str):
+    """
+    Load a metadata file whatever the format it has been written with
+    """
+    content = open(filename, 'rb').read()
+
+    # compact format is written as json object: try it first
+    if content.startswith(b'{'):
+        try:
+            return json.loads(content.decode('utf-8'))
+        except ValueError:
+            pass  # it is a yaml flow mapping, not json
+
+    return yaml.load(content, Loader=YamlLoader)
 
 
 def convert_path_native(path: str) -> str:
@@ -405,7 +522,7 @@ class Assert(AssertionError):
         _log_or_store(logging.ERROR, *args, **kwargs)
 
 
-def _reset_entry_attrs(tarinfo: tarfile.TarInfo):
+def reset_entry_attrs(tarinfo: tarfile.TarInfo):
     """
     filter function for tar creation that will remove all file attributes
     (uid, gid, mtime) from the file added to tar would can make the build
@@ -445,7 +562,7 @@ def create_tarball(srcdir: str, dstfile: str, compression: str = '') -> None:
             - 'xz': create a tarfile with lzma compression
     """
     tar = tarfile.open(dstfile, 'w:' + compression)
-    tar.add(srcdir, recursive=True, filter=_reset_entry_attrs, arcname='.')
+    tar.add(srcdir, recursive=True, filter=reset_entry_attrs, arcname='.')
     tar.close()
 
 
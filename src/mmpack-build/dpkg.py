@@ -6,15 +6,122 @@ helper module containing dpkg files parsing functions
 import os
 import re
 
-from glob import glob
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 
-from . common import parse_soname, get_host_arch, Assert, shell
+from . common import parse_soname, get_host_arch, Assert
+from . file_utils import pyimport_name
+from . index_cache import cached_index
 from . mm_version import Version
-from . settings import DPKG_METADATA_PREFIX
+from . settings import DPKG_PREFIX
 
 
-def dpkg_find_shlibs_file(target_soname: str):
+def _info_file_pkgname(filename: str, ext: str) -> str:
+    """
+    Get the package name from the name of a file in dpkg info folder
+    (<pkgname>[:<arch>].<ext>). Returns None if the file does not have the
+    expected extension or belongs to a package of a foreign architecture.
+    """
+    if not filename.endswith(ext):
+        return None
+
+    pkgname, _, arch = filename[:-len(ext)].partition(':')
+    if arch and arch != get_host_arch():
+        return None
+
+    return pkgname
+
+
+def _parse_symbols_sonames(filename: str) -> List[str]:
+    """
+    Get list of sonames described in a dpkg symbols file
+    """
+    sonames = []
+    for line in open(filename, 'rt', errors='replace'):
+        # skip symbols, alternative templates, fields and comments
+        if not line.strip() or line[0] in ' \t|*#':
+            continue
+        sonames.append(line.split(maxsplit=1)[0])
+
+    return sonames
+
+
+def _parse_shlibs_keys(filename: str) -> List[str]:
+    """
+    Get list of "<library name> <version>" described in a dpkg shlibs file
+    """
+    keys = []
+    for line in open(filename, 'rt', errors='replace'):
+        fields = line.split()
+        # skip empty lines, comments and entries of specific type (udeb)
+        if (len(fields) < 2
+                or fields[0].startswith('#')
+                or fields[0].endswith(':')):
+            continue
+        keys.append(fields[0] + ' ' + fields[1])
+
+    return keys
+
+
+def _index_add(index: Dict[str, List[str]], key: str, guess: Optional[str],
+               entry: List[str]):
+    """
+    Add entry ([<file>, <pkgname>]) to index unless key is already set by a
+    package whose name starts with guess
+    """
+    current = index.get(key)
+    if (current is None
+            or (guess and entry[1].startswith(guess)
+                and not current[1].startswith(guess))):
+        index[key] = entry
+
+
+def _build_soname_index(infodir: str) -> dict:
+    """
+    Scan all symbols and shlibs files of dpkg info folder and generate the
+    soname index:
+        {
+            'symbols': {<soname>: [<symbols file>, <pkgname>], ...},
+            'shlibs': {'<name> <version>': [<shlibs file>, <pkgname>], ...},
+        }
+
+    If several packages describe the same library, the one named after it
+    (<name><version>*, as per debian policy) is preferred, otherwise the
+    first one in alphabetical order.
+    """
+    index = {'symbols': {}, 'shlibs': {}}
+    for entry in sorted(os.scandir(infodir), key=lambda e: e.name):
+        pkgname = _info_file_pkgname(entry.name, '.symbols')
+        if pkgname:
+            for soname in _parse_symbols_sonames(entry.path):
+                try:
+                    guess = ''.join(parse_soname(soname))
+                except ValueError:
+                    guess = None
+                _index_add(index['symbols'], soname, guess,
+                           [entry.path, pkgname])
+            continue
+
+        pkgname = _info_file_pkgname(entry.name, '.shlibs')
+        if pkgname:
+            for key in _parse_shlibs_keys(entry.path):
+                _index_add(index['shlibs'], key, key.replace(' ', ''),
+                           [entry.path, pkgname])
+
+    return index
+
+
+def dpkg_soname_index(admindir: str = DPKG_PREFIX) -> dict:
+    """
+    Get the index of symbols and shlibs files of installed debian packages.
+    The index is built with a single pass over the dpkg info folder and is
+    cached until the dpkg database is modified.
+    """
+    return cached_index('dpkg-sonames', [admindir + '/status'],
+                        lambda: _build_soname_index(admindir + '/info'))
+
+
+def dpkg_find_shlibs_file(target_soname: str,
+                          admindir: str = DPKG_PREFIX) -> str:
     """
     Find shlibs file from soname.
 
@@ -25,41 +132,33 @@ def dpkg_find_shlibs_file(target_soname: str):
       FileNotFoundError: shlibs could not be found
     """
     name, version = parse_soname(target_soname)
-    guess_pkgname = name + version
-    shlib_soname_regex = re.compile(r'\b{0} {1}\b .*'.format(name, version))
-
-    guess = glob(DPKG_METADATA_PREFIX + '/'
-                 + guess_pkgname + '**.shlibs')
-    if guess and os.path.exists(guess[0]):
-        return guess[0]
-
-    for shlibs_file in glob(DPKG_METADATA_PREFIX + '/**.shlibs'):
-        if shlib_soname_regex.search(open(shlibs_file).read()):
-            return shlibs_file
+    entry = dpkg_soname_index(admindir)['shlibs'].get(name + ' ' + version)
+    if not entry:
+        errmsg = 'could not find dpkg shlibs file for ' + target_soname
+        raise FileNotFoundError(errmsg)
 
-    errmsg = 'could not find dpkg shlibs file for ' + target_soname
-    raise FileNotFoundError(errmsg)
+    return entry[0]
 
 
-def _prune_soname_symbols(library_path: str, symbols_list: List[str]):
+def _library_symbols(library_path: str) -> Set[str]:
     # to the import at the last moment in order to prevent windows
     # from failing to import elftools
     from . elf_utils import symbols_set
-    for sym in symbols_set(library_path):
-        if sym in symbols_list:
-            symbols_list.remove(sym)
+    return symbols_set(library_path)
 
 
-def dpkg_parse_shlibs(filename: str, target_soname: str,
-                      symbols_list: List[str]) -> str:
+def _parse_shlibs_table(filename: str, target_soname: str) -> dict:
     """
-    Parse dpkg shlibs file.
+    Parse dpkg shlibs file and generate the symbols table of target_soname.
+    Since shlibs files do not list symbols, the symbols are read from the
+    library files installed by the package owning the shlibs file.
 
     Returns:
-        A dependency template
+        symbols table as described in _parse_symbols_file(). All symbols
+        have no minimal version.
 
     Raises:
-        Assert: symbols could not be found
+        Assert: target_soname is not described in filename
     """
     dependency_template = None
     name, version = parse_soname(target_soname)
@@ -70,25 +169,38 @@ def dpkg_parse_shlibs(filename: str, target_soname: str,
             dependency_template = line[len(shlib_soname):]
             break
     if not dependency_template:
-        raise Assert(target_soname + 'not found in ' + filename)
-
-    # read library file to prune symbols
-    # assert the existence of <pkgname>*.list
-    pkgname = dependency_template.split(' ')[0]
-    glob_search_pattern = '{}/{}**:{}.list' \
-                          .format(DPKG_METADATA_PREFIX,
-                                  pkgname,
-                                  get_host_arch())
-    dpkg_list_file = glob(glob_search_pattern)[0]
+        raise Assert(target_soname + ' not found in ' + filename)
+
+    # read library files listed in <pkgname>[:<arch>].list
+    symbols = set()
+    dpkg_list_file = filename[:-len('.shlibs')] + '.list'
     for line in open(dpkg_list_file):
         line = line.strip('\n')
         if target_soname in line:
-            _prune_soname_symbols(line, symbols_list)
+            symbols.update(_library_symbols(line))
 
-    return dependency_template
+    return {'templates': [dependency_template],
+            'symbols': dict.fromkeys(symbols, (None, 0))}
 
 
-def dpkg_find_symbols_file(target_soname: str) -> str:
+def dpkg_parse_shlibs(filename: str, target_soname: str,
+                      symbols_set: Set[str]) -> str:
+    """
+    Parse dpkg shlibs file.
+    The symbols provided by target_soname are removed from symbols_set.
+
+    Returns:
+        A dependency template
+
+    Raises:
+        Assert: symbols could not be found
+    """
+    table = _parse_shlibs_table(filename, target_soname)
+    return dpkg_fill_dependency(table, symbols_set)
+
+
+def dpkg_find_symbols_file(target_soname: str,
+                           admindir: str = DPKG_PREFIX) -> str:
     """
     Find symbols file from soname.
 
@@ -98,36 +210,19 @@ def dpkg_find_symbols_file(target_soname: str) -> str:
     Raises:
       FileNotFoundError: symbols could not be found
     """
-    name, version = parse_soname(target_soname)
-    guess_pkgname = name + version
+    entry = dpkg_soname_index(admindir)['symbols'].get(target_soname)
+    if not entry:
+        errmsg = 'could not find dpkg symbols file for ' + target_soname
+        raise FileNotFoundError(errmsg)
 
-    # make sure the library characters are not interpreted as PCRE
-    # Eg: libstdc++.so.6
-    #            ^^^  ^  all those are PCRE wildcards
-    # Note: '\b' is PCRE for word boundary
-    symbols_soname_regex = re.compile(r'\b{0}\b .*'
-                                      .format(re.escape(target_soname)))
+    return entry[0]
 
-    glob_search_pattern = '{}/{}**:{}.symbols' \
-                          .format(DPKG_METADATA_PREFIX,
-                                  guess_pkgname,
-                                  get_host_arch())
-    guess = glob(glob_search_pattern)
-    if guess and os.path.exists(guess[0]):
-        return guess[0]
 
-    glob_search_pattern = '{}/**:{}.symbols' \
-                          .format(DPKG_METADATA_PREFIX, get_host_arch())
-    for symbols_file in glob(glob_search_pattern):
-        if symbols_soname_regex.search(open(symbols_file).read()):
-            return symbols_file
+# parsed symbols files (indexed by filename)
+_SYMBOLS_TABLES = {}
 
-    errmsg = 'could not find dpkg symbols file for ' + target_soname
-    raise FileNotFoundError(errmsg)
 
-
-def dpkg_parse_symbols(filename: str, target_soname: str,
-                       symbols_list: List[str]) -> str:
+def _parse_symbols_file(filename: str) -> Dict[str, dict]:
     """
     Parse dpkg symbols file.
 
@@ -141,69 +236,103 @@ def dpkg_parse_symbols(filename: str, target_soname: str,
          [...]
          symbol minimal-version [id-of-dependency-template]
 
-    }
-
     Returns:
-        A filled dependency template:
-        - correct alternate dependency will have been chosen
-        - #MINVER# will be filled
+        dict mapping each soname described in the file to a dict with keys:
+        - 'templates': list of dependency templates. Element 0 is the main
+          dependency template, the following the alternative ones.
+        - 'symbols': dict mapping symbol name to a tuple of its minimal
+          version (string) and the id of its dependency template.
     """
-    # TODO: find a way to split this (and thus satisty the two below ...)
-    # pylint: disable=too-many-locals
-    # pylint: disable=too-many-branches
-    dependency_template = None
-    templates = {}
-    templates_cpt = 0
-    minversion = None
-    soname = None
-
-    for line in open(filename):
-        line = line.strip('\n')
-        if line.startswith('*'):  # field name: field-value
-            continue  # ignored
-        elif line.startswith('|'):  # alternate dependency
-            alt_dependency_template = line[2:]
-            templates[templates_cpt] = alt_dependency_template
-            templates_cpt += 1
+    tables = {}
+    curr = None
+    for line in open(filename, 'rt', errors='replace'):
+        line = line.rstrip('\n')
+        if not line or line.startswith(('*', '#')):
+            continue  # fields and comments are ignored
+
+        if line.startswith('|'):  # alternate dependency
+            if curr:
+                curr['templates'].append(line[2:])
         elif line.startswith(' '):  # symbol
-            if not soname:
+            if not curr:
                 continue
 
-            line = line[1:]  # skip leading space
-            split = line.split(' ')
-
+            split = line[1:].split(' ')
             sym = split[0]
             if sym.endswith('@Base'):
                 sym = sym[:-len('@Base')]
-            if sym not in symbols_list:
-                continue
-            symbols_list.remove(sym)
+            template_id = int(split[2]) if len(split) == 3 else 0
+            curr['symbols'][sym] = (split[1], template_id)
+        else:  # library-soname
+            soname, _, main_template = line.partition(' ')
+            curr = {'templates': [main_template], 'symbols': {}}
+            tables.setdefault(soname, curr)
 
-            version = Version(split[1])
-            if not minversion:
-                minversion = version
-            else:
-                minversion = max(minversion, version)
+    return tables
 
-            if len(split) == 3:
-                alt_index = int(split[2])
-                dependency_template = templates[alt_index]
 
-        else:  # library-soname
-            if soname:
-                break
+def _load_symbols_table(filename: str) -> Dict[str, dict]:
+    """
+    Get parsed content of symbols file (see _parse_symbols_file()). A file is
+    parsed only once.
+    """
+    tables = _SYMBOLS_TABLES.get(filename)
+    if tables is None:
+        tables = _parse_symbols_file(filename)
+        _SYMBOLS_TABLES[filename] = tables
 
-            read_soname = line.split(' ')[0]
-            if read_soname != target_soname:
-                continue
+    return tables
 
-            soname = read_soname
-            main_dependency_template = ' '.join(line.split(' ')[1:])
-            templates[templates_cpt] = main_dependency_template
-            templates_cpt += 1
 
-            dependency_template = main_dependency_template
+def dpkg_parse_symbols(filename: str, target_soname: str,
+                       symbols_set: Set[str]) -> str:
+    """
+    Get filled dependency template of target_soname from a dpkg symbols file.
+    The symbols provided by target_soname are removed from symbols_set.
+
+    Returns:
+        A filled dependency template:
+        - correct alternate dependency will have been chosen
+        - #MINVER# will be filled
+
+    Raises:
+        Assert: target_soname is not described in filename
+    """
+    table = _load_symbols_table(filename).get(target_soname)
+    if not table:
+        raise Assert(target_soname + ' not found in ' + filename)
+
+    return dpkg_fill_dependency(table, symbols_set)
+
+
+def dpkg_fill_dependency(table: dict, symbols_set: Set[str]) -> str:
+    """
+    Get filled dependency template of a soname given the symbols used from
+    it. The symbols provided by the soname are removed from symbols_set.
+
+    Args:
+        table: symbols table of the soname as described in
+            _parse_symbols_file()
+        symbols_set: set of used symbols
+
+    Returns:
+        A filled dependency template:
+        - correct alternate dependency will have been chosen
+        - #MINVER# will be filled
+    """
+    syms = table['symbols']
+    used_symbols = symbols_set.intersection(syms)
+    symbols_set.difference_update(used_symbols)
 
+    minversion = None
+    template_id = 0
+    if used_symbols:
+        versions = [Version(syms[sym][0]) for sym in used_symbols
+                    if syms[sym][0]]
+        minversion = max(versions) if versions else None
+        template_id = max(syms[sym][1] for sym in used_symbols)
+
+    dependency_template = table['templates'][template_id]
     if '#MINVER#' in dependency_template:
         if minversion:
             minver = '(>= {0})'.format(str(minversion))
@@ -217,24 +346,338 @@ def dpkg_parse_symbols(filename: str, target_soname: str,
     return dependency_template.strip()
 
 
-def dpkg_find_dependency(soname: str, symbol_list: List[str]) -> str:
+# symbols tables generated from shlibs files (indexed by admindir and soname)
+_SHLIBS_TABLES = {}
+
+
+def dpkg_soname_table(soname: str, admindir: str = DPKG_PREFIX) -> dict:
     """
-    Parses the debian system files, find a dependency template for soname
+    Get the symbols table (see _parse_symbols_file()) of soname from the
+    symbols file providing it or, if there is none, from the shlibs file.
+    Each table is generated only once.
+
+    Raises:
+        FileNotFoundError: soname is not provided by any installed package
     """
     try:
-        symbols_file = dpkg_find_symbols_file(soname)
-        return dpkg_parse_symbols(symbols_file, soname, symbol_list)
+        symbols_file = dpkg_find_symbols_file(soname, admindir)
+        return _load_symbols_table(symbols_file)[soname]
     except FileNotFoundError:
-        shlibs_file = dpkg_find_shlibs_file(soname)
-        return dpkg_parse_shlibs(shlibs_file, soname, symbol_list)
+        pass
+
+    table = _SHLIBS_TABLES.get((admindir, soname))
+    if table is None:
+        shlibs_file = dpkg_find_shlibs_file(soname, admindir)
+        table = _parse_shlibs_table(shlibs_file, soname)
+        _SHLIBS_TABLES[(admindir, soname)] = table
+
+    return table
+
+
+def dpkg_soname_tables(sonames: Set[str],
+                       admindir: str = DPKG_PREFIX) -> Dict[str, dict]:
+    """
+    Get the symbols tables of all sonames in a single lookup of the dpkg
+    database. The sonames not provided by any installed package are not
+    present in the returned dict.
+    """
+    tables = {}
+    for soname in sonames:
+        try:
+            tables[soname] = dpkg_soname_table(soname, admindir)
+        except FileNotFoundError:
+            continue
+
+    return tables
 
 
-def dpkg_find_pypkg(pypkg: str) -> str:
+def dpkg_find_dependency(soname: str, symbol_set: Set[str]) -> str:
+    """
+    Parses the debian system files, find a dependency template for soname
+    """
+    return dpkg_fill_dependency(dpkg_soname_table(soname), symbol_set)
+
+
+# folder where debian packages install their python 3 modules
+_DPKG_PY3_SITEDIR = '/usr/lib/python3/dist-packages/'
+
+
+def _build_pyimport_index(infodir: str) -> Dict[str, str]:
+    """
+    Scan all file lists of dpkg info folder and generate the index mapping
+    top-level python import name to the package providing it. If several
+    packages provide the same name, the first one in alphabetical order is
+    used.
+    """
+    index = {}
+    for entry in sorted(os.scandir(infodir), key=lambda e: e.name):
+        pkgname = _info_file_pkgname(entry.name, '.list')
+        if not pkgname:
+            continue
+
+        for line in open(entry.path, 'rt', errors='replace'):
+            if not line.startswith(_DPKG_PY3_SITEDIR):
+                continue
+
+            name = pyimport_name(line[len(_DPKG_PY3_SITEDIR):].strip())
+            if name:
+                index.setdefault(name, pkgname)
+
+    return index
+
+
+def dpkg_pyimport_index(admindir: str = DPKG_PREFIX) -> Dict[str, str]:
+    """
+    Get the index mapping python 3 top-level import names to the installed
+    debian package providing them. The index is built with a single pass over
+    the file lists of the dpkg info folder and is cached until the dpkg
+    database is modified.
+    """
+    return cached_index('dpkg-pyimports', [admindir + '/status'],
+                        lambda: _build_pyimport_index(admindir + '/info'))
+
+
+def dpkg_find_pypkgs(pypkgs: Set[str],
+                     admindir: str = DPKG_PREFIX) -> Dict[str, str]:
+    """
+    Get installed debian packages providing the specified python packages
+
+    Returns:
+        dict mapping each python package name to the debian package providing
+        it. Python packages not provided by any installed package are not
+        present in the returned dict.
+    """
+    index = dpkg_pyimport_index(admindir)
+    return {pypkg: index[pypkg] for pypkg in pypkgs if pypkg in index}
+
+
+def dpkg_find_pypkg(pypkg: str, admindir: str = DPKG_PREFIX) -> str:
     """
     Get installed debian package providing the specified python package
     """
-    # dpkg -S accept a glob-like pattern
-    pattern = '/usr/lib/python3/dist-packages/{}[/|.py|.*.so]*'.format(pypkg)
-    cmd_output = shell(['dpkg', '--search', pattern])
-    debpkg_list = list({l.split(':')[0] for l in cmd_output.splitlines()})
-    return debpkg_list[0] if debpkg_list else None
+    return dpkg_find_pypkgs({pypkg}, admindir).get(pypkg)
+
+
+def _parse_status(filename: str) -> dict:
+    """
+    Parse dpkg status file and generate the table of installed packages:
+        {
+            'packages': {<pkgname>: <version>, ...},
+            'provides': {<virtual pkgname>: [<version or None>, ...], ...},
+        }
+    Packages of foreign architecture are registered as <pkgname>:<arch>.
+    """
+    table = {'packages': {}, 'provides': {}}
+    host_arch = get_host_arch()
+    content = open(filename, 'rt', errors='replace').read()
+    for paragraph in content.split('\n\n'):
+        fields = {}
+        for line in paragraph.splitlines():
+            if not line or line[0] in ' \t':
+                continue  # skip continuation of multi-line fields
+            name, _, value = line.partition(':')
+            fields[name] = value.strip()
+
+        if not fields.get('Status', '').endswith('ok installed'):
+            continue
+
+        pkgname = fields['Package']
+        arch = fields.get('Architecture', 'all')
+        if arch not in ('all', host_arch):
+            pkgname += ':' + arch
+        table['packages'][pkgname] = fields.get('Version')
+
+        for provided in fields.get('Provides', '').split(','):
+            name, _, version = provided.partition('(')
+            if not name.strip():
+                continue
+            version = version.rstrip(') ').lstrip('= ') or None
+            table['provides'].setdefault(name.strip(), []).append(version)
+
+    return table
+
+
+def dpkg_installed_packages(admindir: str = DPKG_PREFIX) -> dict:
+    """
+    Get the table of installed debian packages (see _parse_status()). It is
+    cached until the dpkg status file is modified.
+    """
+    status = admindir + '/status'
+    return cached_index('dpkg-status', [status],
+                        lambda: _parse_status(status))
+
+
+def _dpkg_char_order(char: str) -> int:
+    if not char or char.isdigit():
+        return 0
+    if char.isalpha():
+        return ord(char)
+    if char == '~':
+        return -1
+    return ord(char) + 256
+
+
+def _dpkg_verrevcmp(val: str, ref: str) -> int:
+    """
+    compare upstream version or revision strings following the algorithm of
+    dpkg (lib/dpkg/version.c)
+    """
+    i = j = 0
+    while i < len(val) or j < len(ref):
+        # compare non-digit parts
+        while ((i < len(val) and not val[i].isdigit())
+               or (j < len(ref) and not ref[j].isdigit())):
+            val_order = _dpkg_char_order(val[i] if i < len(val) else '')
+            ref_order = _dpkg_char_order(ref[j] if j < len(ref) else '')
+            if val_order != ref_order:
+                return val_order - ref_order
+            i += 1
+            j += 1
+
+        # compare numerical parts
+        i_end = i
+        while i_end < len(val) and val[i_end].isdigit():
+            i_end += 1
+        j_end = j
+        while j_end < len(ref) and ref[j_end].isdigit():
+            j_end += 1
+
+        diff = int(val[i:i_end] or '0') - int(ref[j:j_end] or '0')
+        if diff:
+            return diff
+        i, j = i_end, j_end
+
+    return 0
+
+
+def _dpkg_split_version(version: str) -> Tuple[int, str, str]:
+    """
+    split debian version in epoch, upstream version and revision
+    """
+    epoch = 0
+    if ':' in version:
+        epoch, version = version.split(':', maxsplit=1)
+
+    revision = ''
+    if '-' in version:
+        version, revision = version.rsplit('-', maxsplit=1)
+
+    return (int(epoch), version, revision)
+
+
+def dpkg_version_compare(val: str, ref: str) -> int:
+    """
+    Compare two debian versions
+
+    Returns:
+        negative, 0 or positive integer if val is respectively lower, equal
+        or greater than ref
+    """
+    val_epoch, val_upstream, val_revision = _dpkg_split_version(val)
+    ref_epoch, ref_upstream, ref_revision = _dpkg_split_version(ref)
+    if val_epoch != ref_epoch:
+        return val_epoch - ref_epoch
+
+    return (_dpkg_verrevcmp(val_upstream, ref_upstream)
+            or _dpkg_verrevcmp(val_revision, ref_revision))
+
+
+_DEP_OPERATORS = {
+    '<<': lambda cmp: cmp < 0,
+    '<=': lambda cmp: cmp <= 0,
+    '=': lambda cmp: cmp == 0,
+    '>=': lambda cmp: cmp >= 0,
+    '>>': lambda cmp: cmp > 0,
+    # obsolete forms still accepted by dpkg
+    '<': lambda cmp: cmp <= 0,
+    '>': lambda cmp: cmp >= 0,
+}
+
+# <pkgname>[:<archqual>] [(<op> <version>)] [[<arch list>]] [<<profiles>>]
+_DEP_REGEX = re.compile(r'\s*(?P<name>[^\s:(\[<]+)(?::(?P<archqual>\S+?))?'
+                        r'\s*(?:\(\s*(?P<op><<|<=|>=|>>|=|<|>)\s*'
+                        r'(?P<version>[^)\s]+)\s*\))?'
+                        r'\s*(?:\[(?P<archs>[^\]]*)\])?'
+                        r'\s*(?:<.*>)?\s*$')
+
+
+def _arch_matches_host(arch: str) -> bool:
+    """
+    Test whether an architecture name or wildcard (any, <os>-any,
+    any-<cpu>, <os>-<cpu>) of a restriction list matches the host. dpkg is
+    only used on linux, hence the host os is linux.
+    """
+    host_cpu = get_host_arch()
+    if arch in ('any', host_cpu):
+        return True
+
+    osname, _, cpu = arch.rpartition('-')
+    return osname in ('any', 'linux') and cpu in ('any', host_cpu)
+
+
+def _dep_applies_to_host(archs: str) -> bool:
+    if not archs:
+        return True
+
+    archs = archs.split()
+    if all(arch.startswith('!') for arch in archs):
+        return not any(_arch_matches_host(arch[1:]) for arch in archs)
+    return any(_arch_matches_host(arch) for arch in archs)
+
+
+def _is_dep_satisfied(dep: str, installed: dict) -> bool:
+    """
+    check whether a dependency without alternative is satisfied by
+    installed packages
+    """
+    match = _DEP_REGEX.match(dep)
+    if not match:
+        raise Assert('invalid dependency: ' + dep)
+
+    name = match.group('name')
+    archqual = match.group('archqual')
+    if archqual and archqual not in ('any', 'native', get_host_arch()):
+        name += ':' + archqual
+
+    if match.group('op'):
+        check_op = _DEP_OPERATORS[match.group('op')]
+        ref = match.group('version')
+        versions = [installed['packages'].get(name)]
+        versions += installed['provides'].get(name, [])
+        return any(check_op(dpkg_version_compare(version, ref))
+                   for version in versions if version)
+
+    return (name in installed['packages']
+            or name in installed['provides'])
+
+
+def dpkg_check_depends(depends: List[str],
+                       admindir: str = DPKG_PREFIX) -> List[str]:
+    """
+    Check that the dependencies are satisfied by the installed debian
+    packages. Each element of depends can be a comma separated list of
+    dependencies, each of them being possibly a list of alternatives
+    separated by '|'.
+
+    Returns:
+        list of unmet dependencies (empty if all are satisfied)
+    """
+    installed = dpkg_installed_packages(admindir)
+    unmet = []
+    for dep in ','.join(depends).split(','):
+        if not dep.strip():
+            continue
+
+        alternatives = []
+        for alt in dep.split('|'):
+            match = _DEP_REGEX.match(alt)
+            if match and not _dep_applies_to_host(match.group('archs')):
+                continue
+            alternatives.append(alt)
+
+        if (alternatives
+                and not any(_is_dep_satisfied(alt, installed)
+                            for alt in alternatives)):
+            unmet.append(dep.strip())
+
+    return unmet
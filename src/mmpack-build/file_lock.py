@@ -0,0 +1,148 @@
+# @mindmaze_header@
+"""
+Inter-process locks based on lock files. They are used to share the caches
+of mmpack-build between builds running concurrently.
+
+The locks are advisory and released by the system when the process holding
+them terminates, hence a crashed build never leaves a cache locked.
+
+A lock file can be removed by the process holding the lock (see
+FileLock.remove()): a process that opened it before its removal notices it
+once the lock is acquired and retries with a new lock file.
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Lock associated with a lock file, usable as context manager:
+
+        with FileLock(path):
+            # access the shared resource
+
+    On Windows, only exclusive locks are supported: shared locks are then
+    exclusive.
+    """
+
+    def __init__(self, path: str, shared: bool = False):
+        """
+        Args:
+            path: path of the lock file. It is created if missing.
+            shared: if True, the lock can be held by several processes at
+                once (as long as none holds it exclusively)
+        """
+        self.path = path
+        self.shared = shared
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Acquire the lock.
+
+        Args:
+            blocking: if False, return immediately if the lock is held by
+                another process
+
+        Returns:
+            True if the lock has been acquired, False otherwise
+        """
+        while True:
+            fd = self._try_lock(blocking)
+            if fd is None:
+                return False
+
+            # Retry if the lock file has been removed meanwhile
+            if self._is_current_file(fd):
+                break
+            os.close(fd)
+
+        self._fd = fd
+        return True
+
+    def _is_current_file(self, fd: int) -> bool:
+        """
+        test whether fd is still the file at self.path
+        """
+        if not fcntl:
+            return True  # an opened file cannot be removed on Windows
+
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        fdinfo = os.fstat(fd)
+        return (info.st_dev, info.st_ino) == (fdinfo.st_dev, fdinfo.st_ino)
+
+    def _try_lock(self, blocking: bool) -> int:
+        """
+        open the lock file and lock it
+
+        Returns:
+            the locked file descriptor, None if not blocking and the lock is
+            held by another process
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                if not blocking:
+                    flags |= fcntl.LOCK_NB
+                fcntl.flock(fd, flags)
+            else:
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                while True:
+                    try:
+                        msvcrt.locking(fd, mode, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 seconds
+                        if not blocking:
+                            raise
+        except OSError:
+            os.close(fd)
+            if blocking:
+                raise
+            return None
+
+        return fd
+
+    def release(self):
+        """
+        Release the lock
+        """
+        if self._fd is None:
+            return
+
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def remove(self):
+        """
+        Remove the lock file and release the lock. The lock must be held
+        exclusively.
+        """
+        try:
+            os.remove(self.path)
+        except OSError:  # already removed or still opened on Windows
+            pass
+        self.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
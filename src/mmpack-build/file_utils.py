@@ -264,3 +264,24 @@ def is_python_script(filename: str) -> str:
     returns whether a file is a python script
     """
     return filetype(filename) in ('py', 'python', 'python3')
+
+
+def pyimport_name(sitedir_relpath: str) -> str:
+    """
+    Get the top-level import name provided by a path relative to the python
+    site folder. Returns None if the path does not provide an importable
+    module (metadata folder, .pth file, __pycache__, ...).
+    """
+    topname, sep, _ = sitedir_relpath.partition('/')
+    if not sep:  # module file at top-level (or package folder entry)
+        for suffix in ('.py', '.so', '.pyd'):
+            if topname.endswith(suffix):
+                # strip ABI tag of extension if any: mod.cpython-37m-xxx.so
+                topname = topname[:-len(suffix)].split('.')[0]
+                break
+
+    # skip special folders like __pycache__
+    if not topname.isidentifier() or topname.startswith('__'):
+        return None
+
+    return topname
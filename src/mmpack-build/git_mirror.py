@@ -0,0 +1,373 @@
+# @mindmaze_header@
+"""
+Cache of git repositories used as sources of packages.
+
+Each repository is mirrored in a bare repository located in the git folder
+of mmpack cache. The mirror is updated with an incremental fetch each time
+the repository is used, hence only the objects not fetched yet are
+transferred. The sources are then checked out from the mirror locally.
+
+The mirrors are protected by lock files so that they can be shared by
+concurrent builds.
+"""
+
+import os
+import re
+import shutil
+import tarfile
+from hashlib import sha256
+from subprocess import Popen, PIPE, run, DEVNULL
+from typing import Dict, List, Optional, Tuple
+
+from . common import iprint, dprint, shell, reset_entry_attrs
+from . file_lock import FileLock
+from . workspace import Workspace
+
+
+def _normalize_url(url: str) -> str:
+    """
+    Get url of repository suitable for git commands. Local folders are
+    converted to file:// urls.
+    """
+    if os.path.isdir(url):
+        url = 'file://' + os.path.abspath(url)
+    return url
+
+
+def git_mirror_path(url: str) -> str:
+    """
+    Get the path of the mirror of the repository at url
+    """
+    url = _normalize_url(url)
+    name = re.sub(r'(\.git)?/*$', '', url).rsplit('/', 1)[-1]
+    name = re.sub(r'[^\w.-]', '_', name)
+    urlhash = sha256(url.encode('utf-8')).hexdigest()[:16]
+    return '{}/{}-{}.git'.format(Workspace().cachedir('git'), name, urlhash)
+
+
+def _git(args: str, git_ssh_cmd: str = None) -> str:
+    cmd_env = ''
+    if git_ssh_cmd:
+        cmd_env += 'GIT_SSH_COMMAND="{}" '.format(git_ssh_cmd)
+
+    return shell(cmd_env + 'git ' + args)
+
+
+def _has_pinned_commit(mirror: str, tag: str = None) -> bool:
+    """
+    Test whether tag is a full commit hash already present in the mirror.
+    Such a revision cannot change upstream, hence fetching it is useless.
+    """
+    if not tag or not re.fullmatch(r'[0-9a-f]{40}', tag):
+        return False
+
+    proc = run(['git', '--git-dir=' + mirror, 'cat-file', '-e',
+                tag + '^{commit}'], stdout=DEVNULL, stderr=DEVNULL)
+    return proc.returncode == 0
+
+
+def _update_mirror_head(mirror: str, url: str, git_ssh_cmd: str = None):
+    """
+    Make the HEAD of the mirror point to the current HEAD of the repository.
+    Fetching does not update it, while the HEAD of a repository changes when
+    its default branch changes or, for a local repository, when another
+    branch is checked out.
+    """
+    remote_head = _git('ls-remote --symref {} HEAD'.format(url), git_ssh_cmd)
+    match = re.search(r'^ref: (\S+)\tHEAD$', remote_head, re.MULTILINE)
+    if match:
+        _git('--git-dir={} symbolic-ref HEAD {}'
+             .format(mirror, match.group(1)))
+        return
+
+    # Detached HEAD: its commit is not fetched if no ref points to it
+    match = re.search(r'^([0-9a-f]+)\tHEAD$', remote_head, re.MULTILINE)
+    if match:
+        _git('--git-dir={} fetch --quiet origin HEAD'.format(mirror),
+             git_ssh_cmd)
+        _git('--git-dir={} update-ref --no-deref HEAD {}'
+             .format(mirror, match.group(1)))
+
+
+def _update_git_mirror(url: str, git_ssh_cmd: str = None,
+                       tag: str = None) -> str:
+    """
+    Create or update the mirror of a repository. The mirror lock must be
+    held.
+
+    Args:
+        url: url of git repository
+        git_ssh_cmd: optional, ssh cmd to use when fetching the git repo
+        tag: optional revision that will be used. If it is a commit hash
+            already present in the mirror, the mirror is not updated.
+
+    Returns:
+        path of the mirror
+    """
+    url = _normalize_url(url)
+    mirror = git_mirror_path(url)
+
+    if os.path.exists(mirror) and _has_pinned_commit(mirror, tag):
+        dprint('{} already in mirror of {}'.format(tag, url))
+        return mirror
+
+    if os.path.exists(mirror):
+        iprint('updating mirror of {}'.format(url))
+        _git('--git-dir={} fetch --quiet --prune origin'.format(mirror),
+             git_ssh_cmd)
+        _update_mirror_head(mirror, url, git_ssh_cmd)
+        return mirror
+
+    # Clone mirror in temporary folder so that an interrupted clone does not
+    # leave an invalid mirror
+    iprint('creating mirror of {} in {}'.format(url, mirror))
+    tmpdir = '{}.{}.tmp'.format(mirror, os.getpid())
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    _git('clone --quiet --mirror {} {}'.format(url, tmpdir), git_ssh_cmd)
+    os.replace(tmpdir, mirror)
+    return mirror
+
+
+def git_mirror_checkout(url: str, clonedir: str, tag: str = None,
+                        git_ssh_cmd: str = None):
+    """
+    Update the mirror of a repository and check out a revision from it.
+
+    Args:
+        url: url of git repository
+        clonedir: folder where the repo must be checked out
+        tag: option tag, branch, commit hash to check out. If None, the
+            default branch of the repository is checked out.
+        git_ssh_cmd: optional, ssh cmd to use when fetching the git repo
+            through ssh
+    """
+    mirror = git_mirror_path(url)
+    with FileLock(mirror + '.lock'):
+        _update_git_mirror(url, git_ssh_cmd, tag)
+        os.utime(mirror)  # mark it as recently used (see cache_manager.py)
+
+        # The clone shares the objects of the mirror, hence the lock is held
+        # until the files are checked out
+        iprint('cloning {} into tmp dir {}'.format(url, clonedir))
+        if tag:
+            _git('clone --quiet --shared --no-checkout {} {}'
+                 .format(mirror, clonedir))
+            _git('-C {} checkout --quiet {}'.format(clonedir, tag))
+        else:
+            _git('clone --quiet --shared {} {}'.format(mirror, clonedir))
+
+
+def _mirror_head_name(mirror: str) -> str:
+    """
+    Get the name of the branch HEAD of the mirror points to, or 'HEAD' if it
+    is detached.
+    """
+    proc = run(['git', '--git-dir=' + mirror, 'symbolic-ref', '--quiet',
+                '--short', 'HEAD'], stdout=PIPE, stderr=DEVNULL, text=True)
+    if proc.returncode != 0:
+        return 'HEAD'
+
+    return proc.stdout.strip()
+
+
+def git_mirror_resolve(url: str, tag: str = None,
+                       git_ssh_cmd: str = None) -> Tuple[str, str, str]:
+    """
+    Update the mirror of a repository and resolve the commit of a revision.
+
+    Args:
+        url: url of git repository
+        tag: option tag, branch, commit hash to resolve. If None, the
+            default branch of the repository is used.
+        git_ssh_cmd: optional, ssh cmd to use when fetching the git repo
+            through ssh
+
+    Returns:
+        the path of the mirror, the commit hash and the tag (the name of
+        the default branch if tag is None)
+    """
+    mirror = git_mirror_path(url)
+    with FileLock(mirror + '.lock'):
+        _update_git_mirror(url, git_ssh_cmd, tag)
+        os.utime(mirror)  # mark it as recently used (see cache_manager.py)
+        if not tag:
+            tag = _mirror_head_name(mirror)
+        commit = _git('--git-dir={} rev-parse --verify {}^{{commit}}'
+                      .format(mirror, tag)).strip()
+
+    return (mirror, commit, tag)
+
+
+def git_mirror_tree_id(mirror: str, commit: str) -> str:
+    """
+    Get the hash of the tree object of a commit
+    """
+    return _git('--git-dir={} rev-parse --verify {}^{{tree}}'
+                .format(mirror, commit)).strip()
+
+
+def git_mirror_read(mirror: str, commit: str, path: str) -> Optional[bytes]:
+    """
+    Read the content of a file of a commit without checking it out.
+
+    Returns:
+        the content of the file, None if the file does not exist
+    """
+    proc = run(['git', '--git-dir=' + mirror, 'cat-file', 'blob',
+                '{}:{}'.format(commit, path)],
+               stdout=PIPE, stderr=DEVNULL)
+    if proc.returncode != 0:
+        return None
+
+    return proc.stdout
+
+
+class _BlobReader:
+    """
+    Reader of objects of a git repository through git cat-file --batch
+    """
+
+    def __init__(self, mirror: str):
+        self._proc = Popen(['git', '--git-dir=' + mirror, 'cat-file',
+                            '--batch'], stdin=PIPE, stdout=PIPE)
+
+    def open(self, obj: str) -> int:
+        """
+        request the content of an object. Its content must then be read
+        entirely from the stream attribute.
+
+        Returns:
+            size of the object
+        """
+        self._proc.stdin.write(obj.encode('utf-8') + b'\n')
+        self._proc.stdin.flush()
+        header = self._proc.stdout.readline().split()
+        if len(header) != 3:
+            raise ValueError('Failed to read git object ' + obj)
+
+        return int(header[2])
+
+    @property
+    def stream(self):
+        """
+        stream from which the content of the requested object is read
+        """
+        return self._proc.stdout
+
+    def close_object(self):
+        """
+        skip the separator following the content of an object
+        """
+        self._proc.stdout.read(1)
+
+    def close(self):
+        """
+        terminate the reader
+        """
+        self._proc.stdin.close()
+        self._proc.wait()
+
+
+class _TeeReader:
+    """
+    file-like reader copying the data read from src into dst
+    """
+
+    def __init__(self, src, dst):
+        self._src = src
+        self._dst = dst
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        read data from src and write it into dst
+        """
+        data = self._src.read(size)
+        self._dst.write(data)
+        return data
+
+
+def _add_tree_entry(tar: tarfile.TarFile, blobs: _BlobReader, dstdir: str,
+                    mode: str, obj: str, path: str):
+    """
+    Extract an entry of the git tree in dstdir like git checkout does (ie
+    with permissions subject to the umask) and add it to the tarball. The
+    tar entry is generated from the extracted file exactly like
+    create_tarball() does.
+    """
+    dstpath = os.path.join(dstdir, path)
+    arcname = './' + path
+
+    if mode in ('040000', '160000'):  # folder or submodule
+        os.mkdir(dstpath)
+        tar.addfile(reset_entry_attrs(tar.gettarinfo(dstpath, arcname)))
+        return
+
+    size = blobs.open(obj)
+    if mode == '120000':  # symlink
+        os.symlink(blobs.stream.read(size).decode('utf-8'), dstpath)
+        blobs.close_object()
+        tar.addfile(reset_entry_attrs(tar.gettarinfo(dstpath, arcname)))
+        return
+
+    perms = 0o777 if mode == '100755' else 0o666
+    fd = os.open(dstpath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, perms)
+    with open(fd, 'wb') as dstfile:
+        tarinfo = tar.gettarinfo(dstpath, arcname, fileobj=dstfile)
+        tarinfo.size = size
+        tar.addfile(reset_entry_attrs(tarinfo),
+                    _TeeReader(blobs.stream, dstfile))
+    blobs.close_object()
+
+
+def _add_tree(tar: tarfile.TarFile, blobs: _BlobReader, dstdir: str,
+              children: Dict[str, List[Tuple[str, str, str]]],
+              parent: str = ''):
+    """
+    Add the entries of the folder parent of the git tree, in the order
+    tarfile.add() uses, ie sorted by name and depth first
+    """
+    for name, mode, obj in sorted(children.get(parent, [])):
+        path = parent + '/' + name if parent else name
+        _add_tree_entry(tar, blobs, dstdir, mode, obj, path)
+        if mode == '040000':
+            _add_tree(tar, blobs, dstdir, children, path)
+
+
+def git_mirror_export(mirror: str, commit: str, dstdir: str, tarball: str):
+    """
+    Write the tree of a commit in a deterministic xz compressed tarball and
+    extract it at the same time, without cloning it. The content of the
+    files is streamed directly from the object store of the mirror. The
+    tarball is identical to the one create_tarball() generates from a
+    checkout of the same commit.
+
+    Args:
+        mirror: path of the mirror
+        commit: hash of the commit to export
+        dstdir: existing empty folder where the tree must be extracted
+        tarball: path of the tarball to create
+    """
+    dprint('exporting {} from {} into {}'.format(commit, mirror, tarball))
+
+    # The mirror cannot be updated while its objects are read
+    with FileLock(mirror + '.lock', shared=True):
+        tree = shell(['git', '--git-dir=' + mirror, 'ls-tree', '-r', '-t',
+                      '-z', '--full-tree', commit], log=False)
+
+        # entries of each folder of the tree: {folder: [(name, mode, obj)]}
+        children = {}
+        for entry in tree.split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            mode, _, obj = info.split()
+            parent, _, name = path.rpartition('/')
+            children.setdefault(parent, []).append((name, mode, obj))
+
+        blobs = _BlobReader(mirror)
+        try:
+            with tarfile.open(tarball, 'w:xz') as tar:
+                tar.addfile(reset_entry_attrs(tar.gettarinfo(dstdir, '.')))
+                _add_tree(tar, blobs, dstdir, children)
+        finally:
+            blobs.close()
@@ -3,22 +3,25 @@
 plugin tracking containing python file handling functions
 """
 
+import atexit
 import filecmp
+import json
 import os
 import re
 import shutil
+import stat
 from glob import glob
+from subprocess import Popen, PIPE
+from threading import Thread
 from typing import Set, Dict, List
 
 from . base_hook import BaseHook, PackageInfo
-from . common import shell, Assert
-from . dpkg import dpkg_find_pypkg
+from . common import Assert, ShellException, dprint, eprint, shell, wprint
 from . file_utils import is_python_script
 from . mm_version import Version
-from . pacman import pacman_find_pypkg
 from . provide import Provide, ProvideList, load_mmpack_provides
-from . settings import DPKG_PREFIX, PACMAN_PREFIX
-from . workspace import Workspace
+from . sysdep_resolver import SysdepResolver
+from . workspace import Workspace, get_install_prefix
 
 
 _SITEDIR = 'lib/python3/site-packages'
@@ -30,8 +33,10 @@ _SITEDIR = 'lib/python3/site-packages'
 # 'lib/python3/site-packages/foo_bar.py' => foo_bar
 # 'lib/python3/site-packages/foo/__init__.py' => foo
 # 'lib/python3/site-packages/foo/_internal.so' => foo
+# 'lib/python3/site-packages/__pycache__/foo.cpython-37.pyc' => foo
 # 'lib/python2/site-packages/foo.so' => None
-_PKG_REGEX = re.compile(r'lib/python3(?:\.\d)?/site-packages/_?([\w_]+)')
+_PKG_REGEX = re.compile(r'lib/python3(?:\.\d)?/site-packages/'
+                        r'(?:__pycache__/)?_?([\w_]+)')
 
 
 # location relative to the prefix dir where the files of public python packages
@@ -52,6 +57,70 @@ def _get_py3_public_import_name(filename: str) -> str:
     return res.groups()[0]
 
 
+def _is_same_file(src: str, dst: str) -> bool:
+    """
+    Test whether src and dst have the same content. The metadata is only
+    used to rule out files of different size, the content of regular files
+    is always compared otherwise.
+    """
+    src_stat = os.lstat(src)
+    dst_stat = os.lstat(dst)
+
+    if stat.S_ISLNK(src_stat.st_mode) or stat.S_ISLNK(dst_stat.st_mode):
+        return (stat.S_ISLNK(src_stat.st_mode)
+                and stat.S_ISLNK(dst_stat.st_mode)
+                and os.readlink(src) == os.readlink(dst))
+
+    if stat.S_ISDIR(src_stat.st_mode) or stat.S_ISDIR(dst_stat.st_mode):
+        return False
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+
+    return filecmp.cmp(src, dst, shallow=False)
+
+
+def _merge_tree(srcdir: str, dstdir: str):
+    """
+    Move the content of srcdir into the existing folder dstdir. Entries
+    missing in dstdir are moved at once with their whole subtree, only the
+    folders existing on both side are merged recursively.
+
+    Raises:
+        FileExistsError: a file exists on both side with different content
+    """
+    for entry in os.scandir(srcdir):
+        dst = os.path.join(dstdir, entry.name)
+        if not os.path.lexists(dst):
+            os.replace(entry.path, dst)
+        elif (entry.is_dir(follow_symlinks=False)
+              and os.path.isdir(dst) and not os.path.islink(dst)):
+            _merge_tree(entry.path, dst)
+        elif not _is_same_file(entry.path, dst):
+            raise FileExistsError(dst)
+
+
+def _compile_bytecode(sitedir: str):
+    """
+    Compile the python modules in sitedir into deterministic bytecode files.
+    The bytecode is hash-based and not checked against the source at import,
+    hence it does not depend on the time of the build and remains usable
+    from read-only prefixes.
+    """
+    # remove the bytecode possibly generated during the build or the tests
+    for pycache in glob(sitedir + '/**/__pycache__', recursive=True):
+        shutil.rmtree(pycache)
+
+    # record in bytecode the path of the modules at runtime
+    runtime_sitedir = get_install_prefix() + '/' + sitedir
+    cmd = ['python3', '-m', 'compileall', '-q', '-f', '-j', '0',
+           '--invalidation-mode', 'unchecked-hash',
+           '-d', runtime_sitedir, sitedir]
+    try:
+        shell(cmd)
+    except ShellException:
+        wprint('Some python modules could not be compiled into bytecode')
+
+
 def _mmpack_pkg_from_pyimport_name(pyimport_name: str):
     """
     Return the name of the mmpack package that should provide the
@@ -60,33 +129,103 @@ def _mmpack_pkg_from_pyimport_name(pyimport_name: str):
     return 'python3-' + pyimport_name.lower()
 
 
-def _gen_pysymbols(pyimport_name: str, pkg: PackageInfo,
-                   sitedir: str) -> Set[str]:
-    script = os.path.join(os.path.dirname(__file__), 'python_provides.py')
-    cmd = ['python3', script, '--site-path='+sitedir, pyimport_name]
+class _PythonAnalyzer:
+    """
+    Client of a python_analyzer.py worker process. The worker is kept alive
+    across requests so that the modules parsed by astroid are reused.
+    """
 
-    cmd_input = '\n'.join(pkg.files)
-    cmd_output = shell(cmd, input_str=cmd_input)
-    return set(cmd_output.split())
+    def __init__(self, sitedir: str):
+        script = os.path.join(os.path.dirname(__file__), 'python_analyzer.py')
+        jobs = Workspace().jobs or os.cpu_count() or 1
+        cmd = ['python3', script, '--site-path=' + sitedir,
+               '--cache-dir=' + Workspace().cachedir('pyanalysis'),
+               '--jobs={}'.format(jobs)]
+        dprint('[shell] {0}'.format(' '.join(cmd)))
+        self._proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                           universal_newlines=True)
+
+        # Reproduce stderr of worker with eprint()
+        self._stderr_thread = Thread(target=self._log_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _log_stderr(self):
+        for line in self._proc.stderr:
+            eprint(line.rstrip('\n'))
+
+    def request(self, cmd: str, pkgfiles: Set[str], **kwargs):
+        """
+        send a request to the worker and wait for its result
+        """
+        request = {'cmd': cmd, 'cwd': os.getcwd(), 'pkgfiles': list(pkgfiles)}
+        request.update(kwargs)
+        self._proc.stdin.write(json.dumps(request) + '\n')
+        self._proc.stdin.flush()
 
+        answer = self._proc.stdout.readline()
+        if not answer:
+            raise ShellException('python analyzer exited unexpectedly')
+
+        answer = json.loads(answer)
+        if 'error' in answer:
+            eprint(answer['error'])
+            raise ShellException('python analyzer failed to process {} '
+                                 'request'.format(cmd))
+
+        return answer['result']
+
+    def close(self):
+        """
+        terminate the worker
+        """
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._stderr_thread.join()
 
-def _gen_pydepends(pkg: PackageInfo, sitedir: str) -> Set[str]:
-    script = os.path.join(os.path.dirname(__file__), 'python_depends.py')
-    cmd = ['python3', script, '--site-path='+sitedir]
 
-    cmd_input = '\n'.join(pkg.files)
-    cmd_output = shell(cmd, input_str=cmd_input)
-    return set(cmd_output.split())
+# running python analyzers (indexed by site folder)
+_ANALYZERS = {}
 
 
-def _sysdep_find_pydep(pypkg: str) -> str:
-    wrk = Workspace()
-    if os.path.exists(DPKG_PREFIX):
-        return dpkg_find_pypkg(pypkg)
-    if os.path.exists(wrk.cygroot() + PACMAN_PREFIX):
-        return pacman_find_pypkg(pypkg)
+def _close_analyzers():
+    for analyzer in _ANALYZERS.values():
+        analyzer.close()
+    _ANALYZERS.clear()
 
-    raise FileNotFoundError('Could not find system package manager')
+
+def _get_analyzer(sitedir: str) -> _PythonAnalyzer:
+    sitedir = os.path.abspath(sitedir)
+    analyzer = _ANALYZERS.get(sitedir)
+    if not analyzer:
+        if not _ANALYZERS:
+            atexit.register(_close_analyzers)
+        analyzer = _PythonAnalyzer(sitedir)
+        _ANALYZERS[sitedir] = analyzer
+
+    return analyzer
+
+
+def _gen_pkg_pysymbols(pyimport_names: Set[str], pkg: PackageInfo,
+                       sitedir: str) -> Dict[str, Set[str]]:
+    analyzer = _get_analyzer(sitedir)
+    result = analyzer.request('provides', pkg.files,
+                              pypkgs=list(pyimport_names))
+    return {name: set(syms) for name, syms in result.items()}
+
+
+def _gen_pysymbols(pyimport_name: str, pkg: PackageInfo,
+                   sitedir: str) -> Set[str]:
+    return _gen_pkg_pysymbols({pyimport_name}, pkg, sitedir)[pyimport_name]
+
+
+def _gen_pydepends(pkg: PackageInfo, sitedir: str) -> Set[str]:
+    analyzer = _get_analyzer(sitedir)
+    return set(analyzer.request('depends', pkg.files))
+
+
+def _gen_pyimports(pkg: PackageInfo, sitedir: str) -> Set[str]:
+    analyzer = _get_analyzer(sitedir)
+    return set(analyzer.request('imports', pkg.files))
 
 
 #####################################################################
@@ -100,6 +239,7 @@ class MMPackBuildHook(BaseHook):
     def __init__(self, srcname: str, version: Version, host_archdist: str):
         super().__init__(srcname, version, host_archdist)
         self._mmpack_py_provides = None
+        self._used_pysymbols = dict()
 
     def _get_mmpack_provides(self) -> ProvideList:
         """
@@ -137,8 +277,9 @@ class MMPackBuildHook(BaseHook):
             currpkg.add_to_deplist(pkgname, version)
 
         # provided by the host system
+        resolver = SysdepResolver()
         for pypkg in imports:
-            sysdep = _sysdep_find_pydep(pypkg)
+            sysdep = resolver.find_pydep(pypkg)
             if not sysdep:
                 # <pypkg> dependency could not be met with any available means
                 errmsg = 'Could not find package providing {} python package'\
@@ -153,36 +294,28 @@ class MMPackBuildHook(BaseHook):
         to a unversioned python3 folder. This way, python3 version can be
         upgraded (normally, only python3 standard library has to be
         installed in a version installed folder).
+
+        If enabled for the build, the python modules are then compiled into
+        bytecode.
         """
         # Move all public package from unversioned python3 folder to an
         # unversioned one
         for pydir in glob('lib/python3.*/site-packages'):
-            os.makedirs(_MMPACK_REL_PY_SITEDIR, exist_ok=True)
-            for srcdir, dirs, files in os.walk(pydir):
-                reldir = os.path.relpath(srcdir, pydir)
-                dstdir = os.path.join(_MMPACK_REL_PY_SITEDIR, reldir)
-
-                # Create the folders in unversioned python3 site package
-                for dirpath in dirs:
-                    os.makedirs(os.path.join(dstdir, dirpath), exist_ok=True)
-
-                # Move files to unversioned python3 site package
-                for filename in files:
-                    src = os.path.join(srcdir, filename)
-                    dst = os.path.join(dstdir, filename)
-
-                    # If destination file exists, we have no issue if source
-                    # and destination are the same
-                    if os.path.lexists(dst):
-                        if filecmp.cmp(src, dst):
-                            continue
-                        raise FileExistsError
+            if not os.path.lexists(_MMPACK_REL_PY_SITEDIR):
+                os.makedirs(os.path.dirname(_MMPACK_REL_PY_SITEDIR),
+                            exist_ok=True)
+                os.replace(pydir, _MMPACK_REL_PY_SITEDIR)
+                continue
 
-                    os.replace(src, dst)
+            _merge_tree(pydir, _MMPACK_REL_PY_SITEDIR)
 
             # Remove the remainings
             shutil.rmtree(pydir)
 
+        if (Workspace().python_bytecode
+                and os.path.isdir(_MMPACK_REL_PY_SITEDIR)):
+            _compile_bytecode(_MMPACK_REL_PY_SITEDIR)
+
     def get_dispatch(self, install_files: Set[str]) -> Dict[str, Set[str]]:
         pkgs = dict()
         for file in install_files:
@@ -201,19 +334,23 @@ class MMPackBuildHook(BaseHook):
         # Loop over all python modules contained in the mmpack package and
         # parse the python public entry point of it (ie the entry point of the
         # python package)
-        for pyname in {_get_py3_public_import_name(f) for f in pkg.files}:
-            # file not in python package will generate None, discard them
-            if not pyname:
-                continue
-
+        pynames = {_get_py3_public_import_name(f) for f in pkg.files}
+        # file not in python package will generate None, discard them
+        pynames.discard(None)
+        for pyname in pynames:
             root = '{}/{}'.format(_MMPACK_REL_PY_SITEDIR, pyname)
-            if not {root+'/__init__.py', root+'.py'}.isdisjoint(pkg.files):
-                symbols = _gen_pysymbols(pyname, pkg, _MMPACK_REL_PY_SITEDIR)
-            else:
+            if {root+'/__init__.py', root+'.py'}.isdisjoint(pkg.files):
                 raise RuntimeError('Not entry point found for python '
                                    'package {} in {}'
                                    .format(pyname, _MMPACK_REL_PY_SITEDIR))
 
+        # analyze all python packages at once
+        pysymbols = {}
+        if pynames:
+            pysymbols = _gen_pkg_pysymbols(pynames, pkg,
+                                           _MMPACK_REL_PY_SITEDIR)
+
+        for pyname, symbols in pysymbols.items():
             provide = Provide(pyname)
             provide.pkgdepends = _mmpack_pkg_from_pyimport_name(pyname)
             provide.add_symbols(symbols, self._version)
@@ -228,11 +365,37 @@ class MMPackBuildHook(BaseHook):
         filename = '{}/{}.pyobjects'.format(folder, pkg.name)
         pkg.provides['python'].serialize(filename)
 
+    def _get_imports(self, pkg: PackageInfo) -> Set[str]:
+        """
+        Get the set of top-level packages imported by the python files of
+        pkg. The files of a package are analyzed only once.
+
+        If the python depends mode of the build is 'imports', the import
+        statements are used instead of the symbols actually used.
+        """
+        imports = self._used_pysymbols.get(pkg.name)
+        if imports is None:
+            imports = set()
+            if any(is_python_script(f) for f in pkg.files):
+                if Workspace().python_depends == 'imports':
+                    used_symbols = _gen_pyimports(pkg, _SITEDIR)
+                else:
+                    used_symbols = _gen_pydepends(pkg, _SITEDIR)
+                imports = {s.split('.', maxsplit=1)[0] for s in used_symbols}
+            self._used_pysymbols[pkg.name] = imports
+
+        return imports
+
+    def prepare_depends(self, pkgs: List[PackageInfo]):
+        # register all imports used by the build to look them up at once
+        resolver = SysdepResolver()
+        for pkg in pkgs:
+            resolver.add_pyimports(self._get_imports(pkg))
+
     def update_depends(self, pkg: PackageInfo, other_pkgs: List[PackageInfo]):
-        py_scripts = [f for f in pkg.files if is_python_script(f)]
-        if not py_scripts:
+        # copy the set since it is consumed while dependencies are found
+        imports = set(self._get_imports(pkg))
+        if not imports:
             return
 
-        used_symbols = _gen_pydepends(pkg, _SITEDIR)
-        imports = {s.split('.', maxsplit=1)[0] for s in used_symbols}
         self._gen_py_deps(pkg, imports, other_pkgs)
@@ -6,28 +6,15 @@ plugin tracking the exported symbol and dependencies of shared libraries
 import importlib
 import os
 from glob import glob
-from typing import Set, Dict, List
+from typing import Set, Dict, List, Tuple
 
 from . base_hook import BaseHook, PackageInfo
 from . common import shlib_keyname, Assert
-from . dpkg import dpkg_find_dependency
 from . file_utils import is_dynamic_library, get_exec_fileformat, \
     filetype, is_importlib, get_linked_dll
 from . mm_version import Version
-from . pacman import pacman_find_dependency
 from . provide import ProvideList, load_mmpack_provides
-from . settings import DPKG_PREFIX, PACMAN_PREFIX
-from . workspace import Workspace
-
-
-def _sysdep_find_dependency(soname: str, symbol_set: Set[str]) -> str:
-    wrk = Workspace()
-    if os.path.exists(DPKG_PREFIX):
-        return dpkg_find_dependency(soname, symbol_set)
-    if os.path.exists(wrk.cygroot() + PACMAN_PREFIX):
-        return pacman_find_dependency(soname, symbol_set)
-
-    raise FileNotFoundError('Could not find system package manager')
+from . sysdep_resolver import SysdepResolver
 
 
 def _add_dll_dep_to_pkginfo(currpkg: PackageInfo, import_lib: str,
@@ -56,6 +43,7 @@ class MMPackBuildHook(BaseHook):
     def __init__(self, srcname: str, version: Version, host_archdist: str):
         super().__init__(srcname, version, host_archdist)
         self._mmpack_shlib_provides = None
+        self._used_shlibs = dict()
 
         # load python module to use for handling the executable file
         # format of the targeted host
@@ -106,7 +94,8 @@ class MMPackBuildHook(BaseHook):
 
         # provided by the host system
         for soname in sonames:
-            sysdep = _sysdep_find_dependency(soname, symbol_set)
+            sysdep = SysdepResolver().find_shlib_dependency(soname,
+                                                            symbol_set)
             if not sysdep:
                 # <soname> dependency could not be met with any available means
                 errmsg = 'Could not find package providing ' + soname
@@ -170,22 +159,48 @@ class MMPackBuildHook(BaseHook):
         filename = '{}/{}.symbols'.format(folder, pkg.name)
         pkg.provides['sharedlib'].serialize(filename)
 
-    def update_depends(self, pkg: PackageInfo, other_pkgs: List[PackageInfo]):
+    def _get_used_shlibs(self, pkg: PackageInfo) -> Tuple[Set[str], Set[str]]:
+        """
+        Get the set of sonames of shared libraries used by the files of pkg
+        and the set of used symbols external to the files. The files of a
+        package are scanned only once.
+        """
+        used = self._used_shlibs.get(pkg.name)
+        if used:
+            return used
+
         deps = set()
         symbols = set()
+        for inst_file in pkg.files:
+            if (not is_importlib(inst_file)
+                    and filetype(inst_file) == self._execfmt):
+                symbols.update(self._module.undefined_symbols(inst_file))
+                deps.update(self._module.soname_deps(inst_file))
+
+        used = (deps, symbols)
+        self._used_shlibs[pkg.name] = used
+        return used
+
+    def prepare_depends(self, pkgs: List[PackageInfo]):
+        # register all sonames used by the build to look them up at once
+        resolver = SysdepResolver()
+        for pkg in pkgs:
+            deps, _ = self._get_used_shlibs(pkg)
+            resolver.add_sonames(deps)
+
+    def update_depends(self, pkg: PackageInfo, other_pkgs: List[PackageInfo]):
         for inst_file in pkg.files:
             if is_importlib(inst_file):
                 _add_dll_dep_to_pkginfo(pkg, inst_file,
                                         other_pkgs, self._version)
-                continue
 
-            # populate the set of sonames of shared libraries used by the
-            # file and the set of used symbols external to the file. This
-            # will be use to determine the dependencies
-            file_type = filetype(inst_file)
-            if file_type == self._execfmt:
-                symbols.update(self._module.undefined_symbols(inst_file))
-                deps.update(self._module.soname_deps(inst_file))
+        # populate the set of sonames of shared libraries used by the
+        # package and the set of used symbols external to the files. This
+        # will be use to determine the dependencies. The sets are copied
+        # since they are consumed while dependencies are found.
+        deps, symbols = self._get_used_shlibs(pkg)
+        deps = set(deps)
+        symbols = set(symbols)
 
         # Given the set of sonames and used symbols by all file in the
         # package, determine the actual package dependencies, ie find which
@@ -0,0 +1,81 @@
+# @mindmaze_header@
+"""
+Persistence in the workspace cache of the indexes built from the system
+package databases. An index is rebuilt only if one of the files it has been
+built from (stamp files) has been modified since.
+"""
+
+import json
+import os
+from hashlib import sha256
+from typing import Callable, List
+
+from . common import dprint
+from . workspace import Workspace
+
+
+# Version of the format of the indexes. It must be incremented each time the
+# content of an index built from the same databases changes, so that indexes
+# built by previous versions are not used.
+_INDEX_FORMAT = 2
+
+# indexes already loaded by the current process
+_LOADED_INDEXES = {}
+
+
+def _get_stamp(stamp_files: List[str]) -> List:
+    stamp = [_INDEX_FORMAT]
+    for filename in stamp_files:
+        try:
+            stamp.append(os.stat(filename).st_mtime_ns)
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+
+def cached_index(name: str, stamp_files: List[str],
+                 build_index: Callable[[], dict]) -> dict:
+    """
+    Get an index from the cache or build it if it is missing or outdated.
+
+    Args:
+        name: name of the index
+        stamp_files: list of files whose modification time invalidates the
+            index. Their paths also identify the index, hence the same index
+            built from different databases are cached separately.
+        build_index: function returning the content of the index. It must
+            be serializable in json.
+
+    Returns:
+        the content of the index
+    """
+    key = sha256('\n'.join(stamp_files).encode('utf-8')).hexdigest()[:16]
+    cachefile = '{}/{}-{}.json'.format(Workspace().cachedir('indexes'),
+                                       name, key)
+    stamp = _get_stamp(stamp_files)
+
+    loaded = _LOADED_INDEXES.get(cachefile)
+    if loaded and loaded['stamp'] == stamp:
+        return loaded['data']
+
+    try:
+        loaded = json.load(open(cachefile, 'rt'))
+        if loaded['stamp'] == stamp:
+            os.utime(cachefile)  # mark it as recently used
+            _LOADED_INDEXES[cachefile] = loaded
+            return loaded['data']
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+
+    dprint('building index {} ...'.format(name))
+    loaded = {'stamp': stamp, 'data': build_index()}
+
+    # write in temporary file and rename it to prevent concurrent processes
+    # to read a partially written index
+    tmpfile = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmpfile, 'wt') as outfile:
+        json.dump(loaded, outfile, separators=(',', ':'))
+    os.replace(tmpfile, cachefile)
+
+    _LOADED_INDEXES[cachefile] = loaded
+    return loaded['data']
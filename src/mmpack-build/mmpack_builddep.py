@@ -8,11 +8,13 @@ system dependency is unmet. All the available mmpack packages found
 missing will be proposed for install within the current prefix.
 """
 
+import os
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 from subprocess import run
 
-from . common import get_host_dist, yaml_load, dprint
-from . settings import LIBEXECDIR
+from . common import get_host_dist, yaml_load, dprint, eprint
+from . dpkg import dpkg_check_depends
+from . settings import DPKG_PREFIX, LIBEXECDIR
 from . workspace import find_project_root_folder, Workspace
 
 
@@ -77,7 +79,12 @@ def process_dependencies(system_builddeps, mmpack_builddeps,
     2/ install mmpack deps if missing
     """
     # check sysdeps first
-    if system_builddeps:
+    if system_builddeps and os.path.exists(DPKG_PREFIX):
+        unmet = dpkg_check_depends(system_builddeps)
+        if unmet:
+            eprint('Unmet dependencies: ' + ', '.join(unmet))
+            return 1
+    elif system_builddeps:
         sysdep_cmd = [LIBEXECDIR + '/mmpack/mmpack-check-sysdep']
         sysdep_cmd += system_builddeps
         ret = run(sysdep_cmd)
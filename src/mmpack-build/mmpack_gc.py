@@ -0,0 +1,47 @@
+# @mindmaze_header@
+"""
+Remove the least recently used files of mmpack-build (build folders, sources,
+git mirrors, downloads, cached analyses and indexes and generated packages)
+so that their total size and age comply with the limits set in mmpack
+configuration file.
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+
+from . cache_manager import collect_garbage, get_cache_quotas, \
+    list_cache_entries, parse_size
+from . common import iprint
+
+
+CMD = 'gc'
+
+
+def main(argv):
+    """
+    helper to limit the disk space used by mmpack-build
+    """
+    # pylint: disable=invalid-name
+    parser = ArgumentParser(description=__doc__,
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--max-size', type=parse_size,
+                        help='maximum total size (eg 20G), overriding '
+                        'build-cache-max-size configuration')
+    parser.add_argument('--max-age', type=float,
+                        help='maximum age in days of unused files, '
+                        'overriding build-cache-max-age configuration')
+
+    options = parser.parse_args(argv[1:])
+
+    max_size, max_age = get_cache_quotas()
+    if options.max_size is not None:
+        max_size = options.max_size
+    if options.max_age is not None:
+        max_age = options.max_age
+
+    evicted = collect_garbage(max_size, max_age)
+    for entry in evicted:
+        iprint('removed {} ({} bytes)'.format(entry.paths[0], entry.size))
+
+    entries = list_cache_entries()
+    iprint('{} entries using {} bytes'
+           .format(len(entries), sum(e.size for e in entries)))
@@ -7,6 +7,8 @@ Usage:
 mmpack pkg-create [--git-url <path or url of a git repo> | --src <tarball> |
                    --mmpack-src <mmpack_source_tarball>]
                   [--tag <tag>] [--prefix <prefix>] [--skip-build-tests]
+                  [--python-depends {symbols,imports}] [--python-bytecode]
+                  [--jobs <num>]
 
 If neither git url or source tarball was given, look through the tree for a
 mmpack folder, and use the containing folder as root directory.
@@ -32,8 +34,9 @@ $ mmpack pkg-create --url ssh://git@intranet.mindmaze.ch:7999/~user/XXX.git \
 import os
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
-from . common import set_log_file
-from . src_package import SrcPackage
+from . cache_manager import gc_workspace
+from . common import set_log_file, set_metadata_format
+from . src_package import SrcPackage, PYTHON_DEPENDS_MODES
 from . workspace import Workspace, find_project_root_folder
 from . source_tarball import SourceTarball
 
@@ -72,6 +75,26 @@ def parse_options(argv):
     parser.add_argument('-y', '--yes',
                         action='store_true', dest='assumeyes',
                         help='always assume yes to any prompted question')
+    parser.add_argument('--compact-metadata',
+                        action='store_true', dest='compact_metadata',
+                        help='write machine-only metadata in compact format')
+    parser.add_argument('--repo-provides',
+                        action='store_true', dest='repo_provides',
+                        help='compute dependencies also against packages '
+                        'available in repositories')
+    parser.add_argument('--python-depends',
+                        action='store', dest='python_depends', type=str,
+                        choices=PYTHON_DEPENDS_MODES,
+                        help='method to compute python dependencies: symbols '
+                        'actually used (default) or imported modules')
+    parser.add_argument('--python-bytecode',
+                        action='store_true', dest='python_bytecode',
+                        default=None,
+                        help='ship compiled bytecode of python modules')
+    parser.add_argument('-j', '--jobs',
+                        action='store', dest='jobs', type=int,
+                        help='number of processes analyzing python modules '
+                        'concurrently (default: number of cpus)')
     args = parser.parse_args(argv)
 
     if not args.url and not args.srctar and not args.mmpack_srctar:
@@ -88,6 +111,11 @@ def parse_options(argv):
     if args.prefix:
         Workspace().prefix = os.path.abspath(args.prefix)
 
+    Workspace().use_repo_provides = args.repo_provides
+    Workspace().python_depends = args.python_depends
+    Workspace().python_bytecode = args.python_bytecode
+    Workspace().jobs = args.jobs
+
     return args
 
 
@@ -97,6 +125,10 @@ def main(argv):
     """
     args = parse_options(argv[1:])
 
+    if args.compact_metadata:
+        set_metadata_format('symbols', 'compact')
+        set_metadata_format('pyobjects', 'compact')
+
     if args.url:
         method = 'git'
         path_url = args.url
@@ -120,4 +152,8 @@ def main(argv):
 
     package.local_install(args.skip_tests)
     package.ventilate()
-    package.generate_binary_packages()
+    published = package.generate_binary_packages()
+
+    # Enforce the limits of disk usage, keeping the build just done and the
+    # packages it has generated
+    gc_workspace(keep=[package.pkgbuild_path()] + published)
@@ -5,58 +5,191 @@ helper module containing pacman wrappers and file parsing functions
 
 import os
 import re
-from typing import Set
+from typing import Dict, Set
 
-from . common import shell
+from . common import ShellException
+from . file_utils import pyimport_name
+from . index_cache import cached_index
 from . pe_utils import get_dll_from_soname, symbols_set
 from . settings import PACMAN_PREFIX
 from . workspace import Workspace
 
 
-def pacman_find_dependency(soname: str, symbol_set: Set[str]) -> str:
+# match files installed in python site folder of the mingw64 environment
+# targeted by mmpack, eg:
+# mingw64/lib/python3.7/site-packages/numpy/
+# mingw64/lib/python3.7/site-packages/numpy.py
+# The python modules of msys environment (usr/lib/python3.x) are not usable
+# by the packages, hence are not matched.
+_SITEDIR_REGEX = re.compile(r'mingw64/lib/python\d\.\d+/site-packages/')
+
+
+def _get_dbdir(dbdir: str = None) -> str:
+    if dbdir:
+        return dbdir
+    return Workspace().cygroot() + PACMAN_PREFIX
+
+
+def _parse_desc_name(filename: str) -> str:
     """
-    find pacman package providing given file
+    Get package name from desc file of pacman local database
+    """
+    lines = iter(open(filename, 'rt', errors='replace'))
+    for line in lines:
+        if line.strip() == '%NAME%':
+            return next(lines).strip()
+    return None
 
-    Raises:
-        ShellException: the package could not be found
+
+def _parse_files_list(filename: str):
+    """
+    Generator of files listed in files file of pacman local database
     """
-    filename = get_dll_from_soname(soname)
+    in_files_section = False
+    for line in open(filename, 'rt', errors='replace'):
+        line = line.strip()
+        if line.startswith('%'):
+            in_files_section = (line == '%FILES%')
+        elif in_files_section and line:
+            yield line
 
-    pacman_line = shell('pacman -Qo ' + filename)
-    pacman_line = pacman_line.split('is owned by ')[-1]
-    # It appears there can only be one package version and we cannot explicit
-    # a package version on install using the pacman command
-    # ... rolling-release paragigm and all ...
-    package, _version = pacman_line.split(' ')
 
-    # prune symbols
-    symbol_set.difference_update(symbols_set(filename))
+def _build_pacman_index(localdir: str) -> dict:
+    """
+    Scan all packages of pacman local database and generate the index:
+        {
+            'files': {<path relative to root (lowercase)>: <pkgname>, ...},
+            'pyimports': {<top-level python import name>: <pkgname>, ...},
+        }
 
-    return package
+    If several packages provide the same file or python package, the first
+    one in alphabetical order is used.
+    """
+    index = {'files': {}, 'pyimports': {}}
+    for entry in sorted(os.scandir(localdir), key=lambda e: e.name):
+        desc = os.path.join(entry.path, 'desc')
+        files = os.path.join(entry.path, 'files')
+        if not os.path.isfile(desc) or not os.path.isfile(files):
+            continue
+
+        pkgname = _parse_desc_name(desc)
+        if not pkgname:
+            continue
+
+        for path in _parse_files_list(files):
+            if path.endswith('/'):  # folder
+                continue
+
+            index['files'].setdefault(path.lower(), pkgname)
+
+            match = _SITEDIR_REGEX.match(path)
+            if match:
+                name = pyimport_name(path[match.end():])
+                if name:
+                    index['pyimports'].setdefault(name, pkgname)
+
+    return index
+
+
+def pacman_index(dbdir: str = None) -> dict:
+    """
+    Get the index of files and python packages installed by pacman. The
+    index is built with a single pass over the pacman local database and is
+    cached until a package is installed, removed or upgraded.
+    """
+    localdir = os.path.join(_get_dbdir(dbdir), 'local')
+    return cached_index('pacman', [localdir],
+                        lambda: _build_pacman_index(localdir))
+
+
+def _root_relpath(path: str) -> str:
+    """
+    convert path to the form used in pacman database, ie relative to msys
+    root with forward slashes
+    """
+    path = path.replace('\\', '/')
+    root = Workspace().cygroot().replace('\\', '/').rstrip('/')
+    if root and path.lower().startswith(root.lower() + '/'):
+        path = path[len(root):]
+    return path.lstrip('/')
 
 
-def pacman_find_pypkg(pypkg: str) -> str:
+def pacman_find_file_owner(filename: str, dbdir: str = None) -> str:
     """
-    Get packages providing files matchine the specified glob pattern
+    Get package owning the file, None if the file does not belong to any
+    package
     """
+    index = pacman_index(dbdir)
+    return index['files'].get(_root_relpath(filename).lower())
 
-    # either match:
-    # pypkg = 'numpy'
-    # mingw64/lib/python3.7/site-packages/numpy/
-    # mingw64/lib/python3.7/site-packages/numpy.py
-    pattern = r'mingw64/lib/python\d.\d+/site-packages/{}(.py|/.*)' \
-              .format(pypkg)
-    file_regex = re.compile(pattern)
 
-    pacman_pkgdir = Workspace().cygroot() + PACMAN_PREFIX + '\\local'
-    for mingw_pkg in os.listdir(pacman_pkgdir):
-        instfiles_filename = os.path.join(pacman_pkgdir, mingw_pkg, 'files')
-        if not os.path.isfile(instfiles_filename):
+def pacman_soname_tables(sonames: Set[str]) -> Dict[str, dict]:
+    """
+    Get for each soname the pacman package providing it and the symbols
+    exported by the dll. The sonames not provided by any installed package
+    are not present in the returned dict.
+
+    Returns:
+        dict mapping soname to {'package': <pkgname>, 'symbols': <set>}
+    """
+    tables = {}
+    for soname in sonames:
+        try:
+            filename = get_dll_from_soname(soname)
+        except ShellException:
             continue
 
-        for line in open(instfiles_filename, 'rt').readlines():
-            if file_regex.match(line):
-                desc_filename = os.path.join(pacman_pkgdir, mingw_pkg, 'desc')
-                return open(desc_filename, 'rt').readlines()[1].strip()
+        package = pacman_find_file_owner(filename)
+        if package:
+            tables[soname] = {'package': package,
+                              'symbols': symbols_set(filename)}
 
-    return None
+    return tables
+
+
+def pacman_fill_dependency(table: dict, symbol_set: Set[str]) -> str:
+    """
+    Get the dependency from the table of soname (see pacman_soname_tables())
+    and remove from symbol_set the symbols provided by it.
+    """
+    # prune symbols
+    symbol_set.difference_update(table['symbols'])
+
+    # It appears there can only be one package version and we cannot explicit
+    # a package version on install using the pacman command
+    # ... rolling-release paragigm and all ...
+    return table['package']
+
+
+def pacman_find_dependency(soname: str, symbol_set: Set[str]) -> str:
+    """
+    find pacman package providing given file
+
+    Returns:
+        the package providing soname, None if it cannot be found
+    """
+    table = pacman_soname_tables({soname}).get(soname)
+    if not table:
+        return None
+
+    return pacman_fill_dependency(table, symbol_set)
+
+
+def pacman_find_pypkgs(pypkgs: Set[str], dbdir: str = None) -> Dict[str, str]:
+    """
+    Get installed pacman packages providing the specified python packages
+
+    Returns:
+        dict mapping each python package name to the pacman package providing
+        it. Python packages not provided by any installed package are not
+        present in the returned dict.
+    """
+    index = pacman_index(dbdir)['pyimports']
+    return {pypkg: index[pypkg] for pypkg in pypkgs if pypkg in index}
+
+
+def pacman_find_pypkg(pypkg: str, dbdir: str = None) -> str:
+    """
+    Get installed pacman package providing the specified python package
+    """
+    return pacman_find_pypkgs({pypkg}, dbdir).get(pypkg)
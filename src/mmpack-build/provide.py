@@ -3,11 +3,15 @@
 common classes to specify provided symbols to other packages
 """
 
+import os
 from glob import glob
 from typing import Set, Dict, Tuple, List
 
-from . common import wprint, yaml_serialize, yaml_load
+from . bloom import BloomFilter
+from . common import wprint, metadata_serialize, metadata_load, \
+    get_host_arch_dist
 from . mm_version import Version
+from . repo_provides import load_repo_provides_indexes
 from . workspace import Workspace
 
 
@@ -89,6 +93,13 @@ class Provide:
                    'project version.')
 
 
+def _bloom_filename(filename: str) -> str:
+    """
+    get the name of the bloom filter summarizing a provide file
+    """
+    return filename + '.bloom'
+
+
 class ProvideList:
     """
     Container multiple provides of the same symbol type
@@ -97,6 +108,11 @@ class ProvideList:
     def __init__(self, symbol_type: str):
         self.type = symbol_type
         self._provides = dict()
+        # list of (bloom filter, filename) of provide files not parsed yet
+        self._pending = []
+        # sonames loaded from a repository provides index. They are not
+        # overridden by the ones of installed packages.
+        self._repo_sonames = set()
 
     def add(self, provide: Provide) -> None:
         """
@@ -104,16 +120,33 @@ class ProvideList:
         """
         self._provides[provide.soname] = provide
 
+    def _load_pending(self, soname: str) -> None:
+        """
+        parse the pending provide files that may provide soname
+        """
+        if not self._pending:
+            return
+
+        still_pending = []
+        for bloom, filename in self._pending:
+            if soname in bloom:
+                self._parse_file(filename)
+            else:
+                still_pending.append((bloom, filename))
+        self._pending = still_pending
+
     def get(self, soname) -> Provide:
         """
         return the provide associated to a soname (if available).
         None otherwise.
         """
+        self._load_pending(soname)
         return self._provides.get(soname)
 
     def serialize(self, filename: str) -> None:
         """
-        write the serialized version of the provide list.
+        write the serialized version of the provide list along with its bloom
+        filter summary of the sonames.
         """
         # empty provide list should not generate file
         if not self._provides:
@@ -124,19 +157,62 @@ class ProvideList:
             data[provide.soname] = {'depends': provide.pkgdepends,
                                     'symbols': provide.symbols}
 
-        yaml_serialize(data, filename)
+        metadata_serialize(data, filename)
+        BloomFilter.from_keys(data.keys()).save(_bloom_filename(filename))
 
-    def add_from_file(self, filename) -> None:
+    def add_from_file(self, filename, lazy: bool = False) -> None:
         """
-        Load provides by reading a file and add them to current
+        Load provides by reading a file and add them to current. If lazy is
+        True and a bloom filter summarizes the file, the parsing is deferred
+        until one of its soname is looked up.
         """
-        metadata = yaml_load(filename)
+        if lazy:
+            try:
+                bloom = BloomFilter.load(_bloom_filename(filename))
+                self._pending.append((bloom, filename))
+                return
+            except (FileNotFoundError, ValueError):
+                pass
+
+        self._parse_file(filename)
+
+    def _parse_file(self, filename) -> None:
+        self._add_from_data(metadata_load(filename))
+
+    def _add_from_data(self, metadata: dict, from_repo: bool = False):
         for name, sodata in metadata.items():
             provide = Provide(name)
+            if not from_repo and provide.soname in self._repo_sonames:
+                continue
+
             provide.pkgdepends = sodata['depends']
             provide.symbols = {sym: Version(version)
                                for sym, version in sodata['symbols'].items()}
             self.add(provide)
+            if from_repo:
+                self._repo_sonames.add(provide.soname)
+
+    def add_from_repo_index(self, index: Dict[str, Dict],
+                            arch: str) -> None:
+        """
+        Add the provides of the type of the list published in a repository
+        provides index (see repo_provides module). Only the packages built
+        for arch are considered. If several versions of the same package are
+        available, the provides of the most recent one are kept. The
+        provides added this way take precedence over the ones loaded from
+        files of installed packages.
+        """
+        entries = []
+        for mpkfile, metadata in (index.get(self.type) or {}).items():
+            # mpk file are named <name>_<version>_<arch>.mpk
+            fields = os.path.basename(mpkfile)[:-len('.mpk')].split('_')
+            if len(fields) != 3 or fields[2] != arch or not metadata:
+                continue
+            entries.append((Version(fields[1]), metadata))
+
+        entries.sort(key=lambda entry: entry[0])
+        for _, metadata in entries:
+            self._add_from_data(metadata, from_repo=True)
 
     def update_from_specs(self, pkg_spec_provide: Dict, pkgname: str) -> None:
         """
@@ -200,7 +276,7 @@ class ProvideList:
             If soname is found, a tuple containing package name and the minimal
             version to use, (None, None) otherwise.
         """
-        provide = self._provides.get(soname)
+        provide = self.get(soname)
         if not provide:
             return (None, Version(None))
 
@@ -246,7 +322,11 @@ class ProvideList:
 
 def load_mmpack_provides(extension: str, symtype) -> ProvideList:
     """
-    Load all the provides of one type from all installed packages in prefix
+    Load all the provides of one type from all installed packages in prefix.
+    If Workspace().use_repo_provides is set, the provides of the packages
+    available in the configured repositories are loaded as well. They take
+    precedence over those of installed packages, since the published
+    packages are installed along with the packages of the repositories.
 
     Args:
         extension: extension of the files that contains the data regarding
@@ -255,14 +335,20 @@ def load_mmpack_provides(extension: str, symtype) -> ProvideList:
 
     Returns:
         ProvideList representing the database of all exported symbols by all
-        installed mmpack packages matching symtype
+        installed (or available) mmpack packages matching symtype
     """
     wrk = Workspace()
+    provides = ProvideList(symtype)
+
+    if wrk.use_repo_provides:
+        arch = get_host_arch_dist()
+        for index in load_repo_provides_indexes():
+            provides.add_from_repo_index(index, arch)
+
     symfiles = glob('{}/var/lib/mmpack/metadata/**.{}'
                     .format(wrk.prefix, extension))
 
-    provides = ProvideList(symtype)
     for symfile in symfiles:
-        provides.add_from_file(symfile)
+        provides.add_from_file(symfile, lazy=True)
 
     return provides
@@ -0,0 +1,162 @@
+# @mindmaze_header@
+"""
+On-disk cache of the results of the python analyses performed by
+python_provides.py and python_depends.py.
+
+The key of each result is computed from the digest of the analyzed files,
+the version of astroid and the version of the python interpreter. A result
+can in addition depend on the other modules it has been resolved against:
+the digests of those modules are then part of the key under which the
+result is stored. Since those modules are known only once the analysis is
+done, the entry stored at the key of the analyzed files lists the sets of
+modules the stored results depend on. Hence the results obtained against
+different versions of the external modules (for example from different
+prefixes) are all kept.
+
+Paths inside the python site folder being analyzed are recorded relative to
+it, hence results stay valid when the same files are analyzed in a different
+build folder (for example when a new release of a project is packaged).
+"""
+
+import json
+import os
+import sys
+from hashlib import sha256
+from typing import Dict, Iterable, Optional
+
+import astroid
+
+
+_SITE_MARKER = '@site/'
+
+# maximum number of sets of external modules recorded for a key
+_MAX_VARIANTS = 8
+
+# digests of files already computed (indexed by path)
+_FILE_DIGESTS = {}
+
+
+def file_digest(path: str) -> str:
+    """
+    compute sha256 of file content. The computation is done only once per
+    process as long as the file is not modified.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    digest = _FILE_DIGESTS.get(path)
+    if digest and digest[0] == stamp:
+        return digest[1]
+
+    digest = sha256(open(path, 'rb').read()).hexdigest()
+    _FILE_DIGESTS[path] = (stamp, digest)
+    return digest
+
+
+class AnalysisCache:
+    """
+    store of python analysis results
+    """
+
+    def __init__(self, cachedir: str, sitedir: Optional[str] = None):
+        self.cachedir = cachedir
+        self.sitedir = os.path.abspath(sitedir) if sitedir else None
+
+    def relocate(self, path: str) -> str:
+        """
+        get the form of path to record in cache results
+        """
+        if self.sitedir and path.startswith(self.sitedir + '/'):
+            return _SITE_MARKER + path[len(self.sitedir) + 1:]
+        return path
+
+    def resolve(self, path: str) -> str:
+        """
+        get the actual path of a path recorded in cache results
+        """
+        if self.sitedir and path.startswith(_SITE_MARKER):
+            return os.path.join(self.sitedir, path[len(_SITE_MARKER):])
+        return path
+
+    def key(self, *parts) -> str:
+        """
+        generate the key of a result from its json serializable parts
+        """
+        data = [astroid.__version__, sys.version] + list(parts)
+        return sha256(json.dumps(data).encode('utf-8')).hexdigest()
+
+    def _get_filename(self, key: str) -> str:
+        return os.path.join(self.cachedir, key[:2], key + '.json')
+
+    def _variant_key(self, key: str, digests: Dict[str, str]) -> str:
+        return self.key(key, sorted(digests.items()))
+
+    def _write(self, key: str, content):
+        filename = self._get_filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        # write in temporary file and rename it to prevent concurrent
+        # processes to read a partially written result
+        tmpfile = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(tmpfile, 'wt') as outfile:
+            json.dump(content, outfile)
+        os.replace(tmpfile, filename)
+
+    def _read(self, key: str):
+        return json.load(open(self._get_filename(key), 'rt'))
+
+    def load(self, key: str):
+        """
+        get the result stored for key if any and if it has been resolved
+        against the current version of the modules it depends on. Returns
+        None otherwise.
+        """
+        try:
+            variants = self._read(key)['variants']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        for deps in variants:
+            try:
+                digests = {path: file_digest(self.resolve(path))
+                           for path in deps}
+                variant_key = self._variant_key(key, digests)
+                data = self._read(variant_key)['data']
+
+                # mark them as recently used (see cache_manager.py)
+                os.utime(self._get_filename(key))
+                os.utime(self._get_filename(variant_key))
+                return data
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+        return None
+
+    def store(self, key: str, data, deps: Iterable[str] = None):
+        """
+        store result for key.
+
+        Args:
+            key: key of the result
+            data: json serializable result
+            deps: set of the path of the modules the result has been
+                resolved against.
+        """
+        digests = {}
+        for path in (deps or []):
+            try:
+                digests[self.relocate(path)] = file_digest(path)
+            except OSError:
+                continue
+
+        self._write(self._variant_key(key, digests), {'data': data})
+
+        # Record the modules the result depends on, most recent first.
+        # Concurrent updates may lose a set of modules, in which case the
+        # result is only computed again.
+        try:
+            variants = self._read(key)['variants']
+        except (OSError, ValueError, KeyError, TypeError):
+            variants = []
+        deps = sorted(digests)
+        variants = [deps] + [v for v in variants if v != deps]
+        self._write(key, {'variants': variants[:_MAX_VARIANTS]})
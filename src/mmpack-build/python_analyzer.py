@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# @mindmaze_header@
+"""
+python analysis worker.
+
+Long-lived process serving the requests of python provides and depends
+analysis (see python_provides.py and python_depends.py) of a whole build.
+Since the process is kept alive, the modules parsed by astroid are kept in
+its cache and shared between the requests. If a cache folder is specified,
+the results of the analyses are also stored on disk and reused across builds
+(see pyanalysis_cache.py).
+
+Each request is a line on standard input containing a json object of the
+form:
+    {"cmd": "provides", "cwd": <dir>, "pypkgs": [...], "pkgfiles": [...]}
+    {"cmd": "depends", "cwd": <dir>, "pkgfiles": [...]}
+    {"cmd": "imports", "cwd": <dir>, "pkgfiles": [...]}
+
+Each request is answered by a line on standard output containing a json
+object {"result": <result>} or {"error": <error message>}. The result of a
+provides request is the dict of the symbols provided by each python package,
+the one of a depends request is the sorted list of used symbols and the one of
+an imports request is the sorted list of imported modules (see
+python_imports.py).
+
+As for the analysis scripts, this worker is meant to be run by the python
+interpreter targeted by the packages being built, not within the process
+running mmpack-build.
+"""
+
+import json
+import os
+import sys
+import traceback
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from os.path import abspath
+
+from mmpack_build.pyanalysis_cache import AnalysisCache
+from python_depends import gen_pkg_depends
+from python_imports import gen_pkg_imports
+from python_provides import gen_pypkg_symbols
+
+
+def _process_request(request: dict, cache: AnalysisCache, jobs: int,
+                     sitedir: str):
+    os.chdir(request['cwd'])
+    pkgfiles = request['pkgfiles']
+
+    if request['cmd'] == 'provides':
+        pkgfiles = set(pkgfiles)
+        return {pypkg: sorted(gen_pypkg_symbols(pypkg, pkgfiles, cache))
+                for pypkg in request['pypkgs']}
+    if request['cmd'] == 'depends':
+        return sorted(gen_pkg_depends(pkgfiles, cache, jobs))
+    if request['cmd'] == 'imports':
+        return sorted(gen_pkg_imports(pkgfiles, sitedir))
+
+    raise ValueError('Unknown request: ' + request['cmd'])
+
+
+def parse_options():
+    """
+    parse options
+    """
+    parser = ArgumentParser(description=__doc__,
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--site-path', dest='site_path', type=str, nargs='?',
+                        help='path of python site-packages or folder '
+                        'containing python package')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, nargs='?',
+                        help='folder where analysis results are cached')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='number of modules analyzed in parallel '
+                        '(default: number of cpus)')
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    python_analyzer worker entry point
+    """
+    options = parse_options()
+
+    # If site path folder is specified, add it to sys.path so astroid resolve
+    # the imports properly
+    if options.site_path:
+        sys.path.insert(0, abspath(options.site_path))
+
+    cache = None
+    if options.cache_dir:
+        cache = AnalysisCache(options.cache_dir, options.site_path)
+
+    # keep standard output for the answers and redirect everything else that
+    # could be printed to standard error
+    answers = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            answer = {'result': _process_request(request, cache,
+                                                 options.jobs,
+                                                 options.site_path)}
+        except Exception:  # pylint: disable=broad-except
+            answer = {'error': traceback.format_exc()}
+
+        answers.write(json.dumps(answer) + '\n')
+        answers.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,40 +15,89 @@ qualified name refer to the one as define internally in the imported module,
 not the name as declared for example in the __init__.py.
 """
 
+import os
 import sys
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
 from os.path import abspath
-from typing import Set
+from typing import Dict, List, Optional, Set, Tuple
 
 from astroid import MANAGER as astroid_manager
 from astroid import Uninferable
-from astroid.exceptions import InferenceError, NameInferenceError
+from astroid.exceptions import AstroidBuildingError, InferenceError, \
+    NameInferenceError
 from astroid.modutils import is_standard_module
-from astroid.node_classes import Call
+from astroid.nodes import AssignName, Attribute, Break, Call, \
+    ClassDef, Const, Continue, DelName, FunctionDef, Global, Import, \
+    ImportFrom, Module, Name, NodeNG, Nonlocal, Pass
 from mmpack_build.file_utils import is_python_script
+from mmpack_build.pyanalysis_cache import AnalysisCache, file_digest
 
 
-def _is_module_packaged(mod, pkgfiles: Set[str]) -> bool:
+# version of the analysis, to be increased when its results change so that
+# results cached by previous versions are not used
+_ANALYSIS_VERSION = 2
+
+# recursion limit while analyzing a module
+_RECURSION_LIMIT = 10000
+
+# nodes whose subtree cannot contain any call
+_LEAF_NODES = (AssignName, Break, Const, Continue, DelName, Global, Import,
+               ImportFrom, Name, Nonlocal, Pass)
+
+
+def _call_target_key(func: NodeNG) -> Optional[Tuple]:
+    """
+    Get the key identifying the target of a call of the form
+    name.attr1.attr2...(). Two calls with the same key infer the same way
+    since the name is bound to the same assignments. Returns None for any
+    other form of call.
+    """
+    attrs = []
+    while isinstance(func, Attribute):
+        attrs.append(func.attrname)
+        func = func.expr
+
+    if not isinstance(func, Name):
+        return None
+
+    _, assigns = func.lookup(func.name)
+    return (func.name, tuple(attrs), tuple(assigns))
+
+
+def _is_trivially_local(key: Tuple, module: Module) -> bool:
     """
-    test whether a specified module is provided by a file of the same
-    mmpack package.
+    Test whether a call target is a function or class defined in the module
+    itself or a builtin, hence cannot generate dependencies.
     """
-    return mod.path and mod.path[0] in pkgfiles
+    _, attrs, assigns = key
+    if attrs or not assigns:
+        return False
 
+    for assign in assigns:
+        if not isinstance(assign, (ClassDef, FunctionDef)):
+            return False
+        root = assign.root()
+        if root is not module and root.name != 'builtins':
+            return False
 
-def _inspect_call(call: Call, used_symbols: Set[str], pkgfiles: Set[str]):
+    return True
+
+
+def _infer_call(call: Call) -> Set[Tuple[str, str]]:
+    used = set()
     try:
         for funcdef in call.func.infer():
             orig_mod = funcdef.root()
 
             # ignore inferred call that does not generate dependencies
-            # (uninferable or call to stdlib or internal call)
+            # (uninferable or call to stdlib)
             if (orig_mod == Uninferable
-                    or is_standard_module(orig_mod.name)
-                    or _is_module_packaged(orig_mod, pkgfiles)):
+                    or is_standard_module(orig_mod.name)):
                 continue
 
-            used_symbols.add(funcdef.qname())
+            path = orig_mod.path[0] if orig_mod.path else None
+            used.add((funcdef.qname(), path))
 
     # As python is a dynamic language, uninferable name lookup or uninferable
     # object can be common (when it highly depends on the context that we
@@ -56,16 +105,137 @@ def _inspect_call(call: Call, used_symbols: Set[str], pkgfiles: Set[str]):
     except (NameInferenceError, InferenceError):
         pass
 
+    return used
+
+
+def _inspect_call(call: Call, used: Set[Tuple[str, str]], memo: Dict):
+    key = _call_target_key(call.func)
+    if key is None:
+        used.update(_infer_call(call))
+        return
+
+    uses = memo.get(key)
+    if uses is None:
+        if _is_trivially_local(key, call.root()):
+            uses = set()
+        else:
+            uses = _infer_call(call)
+        memo[key] = uses
+
+    used.update(uses)
+
+
+def _inspect_tree(tree: Module, used: Set[Tuple[str, str]]):
+    """
+    Collect the symbols used by the calls of a module. The tree is walked
+    with an explicit stack to support deeply nested code.
+    """
+    memo = {}
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _LEAF_NODES):
+            continue
+
+        if isinstance(node, Call):
+            _inspect_call(node, used, memo)
+
+        stack.extend(node.get_children())
+
+
+def _imported_module_files(tree: Module) -> Set[str]:
+    """
+    Get the files of the non standard modules imported by a module
+    """
+    files = set()
+    for node in tree.nodes_of_class((Import, ImportFrom)):
+        if isinstance(node, ImportFrom):
+            names = [None]  # do_import_module() resolves relative import
+        else:
+            names = [name for name, _ in node.names]
+
+        for name in names:
+            try:
+                mod = node.do_import_module(name)
+            except AstroidBuildingError:
+                continue
+
+            if mod.file and not is_standard_module(mod.name):
+                files.add(mod.file)
+
+    return files
+
+
+def _gen_module_uses(filename: str) -> Tuple[Set[Tuple[str, str]], Set[str]]:
+    """
+    Generate the set of qualified named of used symbols of a python module
+    associated with the file of the module defining them.
+
+    Args:
+        filename: absolute path of a python module
+
+    Returns:
+        set of (qualified name, path of defining module) of used symbols and
+        set of files of the modules the module has been resolved against
+    """
+    # astroid builds the tree and looks up the scope of nodes recursively:
+    # allow generated modules with deeply nested expressions to be analyzed
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, _RECURSION_LIMIT))
+    try:
+        tree = astroid_manager.ast_from_file(filename)
+
+        used = set()
+        _inspect_tree(tree, used)
+
+        deps = {path for _, path in used if path}
+        deps.update(_imported_module_files(tree))
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+    return used, deps
+
 
-def _inspect_node(node, used_symbols: Set[str], pkgfiles: Set[str]):
-    if isinstance(node, Call):
-        _inspect_call(node, used_symbols, pkgfiles)
+def _module_cache_key(filename: str, cache: AnalysisCache) -> str:
+    # The digests of the external modules the result has been resolved
+    # against are added to this key by the cache (see AnalysisCache.store())
+    return cache.key('depends', _ANALYSIS_VERSION, cache.relocate(filename),
+                     file_digest(filename))
 
-    for child in node.get_children():
-        _inspect_node(child, used_symbols, pkgfiles)
 
+def _lookup_module_uses(filename: str, cache: AnalysisCache
+                        ) -> Optional[Set[Tuple[str, str]]]:
+    """
+    Get the result of _gen_module_uses() from cache if the module has
+    already been analyzed, None otherwise.
+    """
+    cached_uses = cache.load(_module_cache_key(filename, cache))
+    if cached_uses is None:
+        return None
+
+    return {(qname, cache.resolve(path) if path else None)
+            for qname, path in cached_uses}
 
-def _gen_py_depends(filename: str, pkgfiles: Set[str]) -> Set[str]:
+
+def _load_module_uses(filename: str,
+                      cache: AnalysisCache) -> Set[Tuple[str, str]]:
+    """
+    Same as _gen_module_uses() but use the result from cache if the module
+    has already been analyzed.
+    """
+    used = _lookup_module_uses(filename, cache)
+    if used is not None:
+        return used
+
+    used, deps = _gen_module_uses(filename)
+    cached_uses = sorted([qname, cache.relocate(path) if path else None]
+                         for qname, path in used)
+    cache.store(_module_cache_key(filename, cache), cached_uses, deps)
+    return used
+
+
+def _gen_py_depends(filename: str, pkgfiles: Set[str],
+                    cache: AnalysisCache = None) -> Set[str]:
     """
     Generate the set of qualified named of used symbols of a python module and
     imported from modules not in the same mmpack package.
@@ -73,16 +243,103 @@ def _gen_py_depends(filename: str, pkgfiles: Set[str]) -> Set[str]:
     Args:
         filename: absolute path of a python module
         pkgfiles: set of absolute path of files in the same mmpack packaged
+        cache: cache of analysis results to use if not None
 
     Returns: Set of qualified name of imported symbols
     """
-    tree = astroid_manager.ast_from_file(filename)
+    if cache:
+        used = _load_module_uses(filename, cache)
+    else:
+        used, _ = _gen_module_uses(filename)
+
+    # ignore symbols defined in the same mmpack package
+    return {qname for qname, path in used if path not in pkgfiles}
+
+
+def _gen_files_depends(filenames: List[str], pkgfiles: Set[str],
+                       cache: AnalysisCache = None) -> Set[str]:
+    symbol_set = set()
+    for filename in filenames:
+        symbol_set.update(_gen_py_depends(filename, pkgfiles, cache))
+
+    return symbol_set
 
-    used_symbols = set()
-    for node in tree.body:
-        _inspect_node(node, used_symbols, pkgfiles)
 
-    return used_symbols
+def _init_pool_worker(path: List[str]):
+    sys.path[:] = path
+
+
+# pool of processes analyzing modules in parallel, created at first use and
+# kept for the next calls so that the astroid cache of each process is reused.
+# It is recreated if the number of jobs or the import path changes.
+_EXECUTOR = None
+_EXECUTOR_CONFIG = None
+
+
+def _get_executor(jobs: int) -> ProcessPoolExecutor:
+    global _EXECUTOR  # pylint: disable=global-statement
+    global _EXECUTOR_CONFIG  # pylint: disable=global-statement
+
+    config = (jobs, list(sys.path))
+    if _EXECUTOR and _EXECUTOR_CONFIG != config:
+        _EXECUTOR.shutdown()
+        _EXECUTOR = None
+
+    if not _EXECUTOR:
+        _EXECUTOR = ProcessPoolExecutor(jobs, initializer=_init_pool_worker,
+                                        initargs=(sys.path,))
+        _EXECUTOR_CONFIG = config
+    return _EXECUTOR
+
+
+def gen_pkg_depends(files: List[str], cache: AnalysisCache = None,
+                    jobs: int = 1) -> Set[str]:
+    """
+    Generate the set of qualified named of used symbols of all python
+    modules of a mmpack package and imported from modules not in the
+    package.
+
+    Args:
+        files: list of path of files in the mmpack package
+        cache: cache of analysis results to use if not None
+        jobs: number of processes analyzing the modules in parallel
+
+    Returns: Set of qualified name of imported symbols
+    """
+    pkgfiles = {abspath(f) for f in files}
+    pyfiles = sorted(f for f in pkgfiles if is_python_script(f))
+
+    # Modules whose analysis is in cache are processed immediately, only the
+    # remaining ones need to be analyzed
+    symbol_set = set()
+    if cache:
+        uncached = []
+        for filename in pyfiles:
+            used = _lookup_module_uses(filename, cache)
+            if used is None:
+                uncached.append(filename)
+            else:
+                symbol_set.update(q for q, path in used
+                                  if path not in pkgfiles)
+        pyfiles = uncached
+
+    if jobs <= 1 or len(pyfiles) <= 1:
+        symbol_set.update(_gen_files_depends(pyfiles, pkgfiles, cache))
+        return symbol_set
+
+    # Shard the modules across the processes of the pool. Since the results
+    # are merged in a set, the result does not depend on the order of
+    # completion. The pool is sized from the requested number of jobs only,
+    # not from the number of modules of this call, since it is reused.
+    num_shards = min(jobs, len(pyfiles))
+    shards = [pyfiles[i::num_shards] for i in range(num_shards)]
+    executor = _get_executor(jobs)
+    for shard_symbols in executor.map(_gen_files_depends, shards,
+                                      [pkgfiles] * num_shards,
+                                      [cache] * num_shards):
+        symbol_set.update(shard_symbols)
+
+    return symbol_set
 
 
 def parse_options():
@@ -94,6 +351,10 @@ def parse_options():
     parser.add_argument('--site-path', dest='site_path', type=str, nargs='?',
                         help='path of python site-packages or folder '
                         'containing python package')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='number of modules analyzed in parallel '
+                        '(default: number of cpus)')
 
     return parser.parse_args()
 
@@ -109,12 +370,8 @@ def main():
     if options.site_path:
         sys.path.insert(0, abspath(options.site_path))
 
-    pkgfiles = [abspath(f.strip()) for f in sys.stdin.readlines()]
-    pyfiles = [f for f in pkgfiles if is_python_script(f)]
-
-    symbol_set = set()
-    for filename in pyfiles:
-        symbol_set.update(_gen_py_depends(filename, pkgfiles))
+    files = [f.strip() for f in sys.stdin.readlines()]
+    symbol_set = gen_pkg_depends(files, jobs=options.jobs)
 
     # Return sorted results on stdout
     symlist = list(symbol_set)
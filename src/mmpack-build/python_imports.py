@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# @mindmaze_header@
+"""
+python imports extractor.
+
+Given a set of files that belong to the same mmpack package, this utility will
+scan the import statements of the python modules and report the modules
+imported from outside of the mmpack package.
+
+It will print on standard output the name of the imported modules.
+
+This is a fast alternative to python_depends.py: the modules are only parsed
+with the ast module of the standard library and no inference is performed.
+Hence all non standard modules imported are reported, even if no symbol of
+them is actually used. However imports guarded by a try statement catching
+ImportError are considered as optional and are not reported.
+"""
+
+import ast
+import os
+import sys
+import sysconfig
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from importlib.util import find_spec
+from os.path import abspath
+from typing import Iterable, List, Optional, Set
+
+from mmpack_build.file_utils import is_python_script, pyimport_name
+
+
+_IMPORT_ERRORS = ('ImportError', 'ModuleNotFoundError')
+
+
+def _is_standard_module(name: str) -> bool:
+    """
+    test whether name is a module of the python standard library
+    """
+    name = name.split('.', maxsplit=1)[0]
+
+    # list of stdlib modules is available only from python 3.10
+    stdlib_names = getattr(sys, 'stdlib_module_names', None)
+    if stdlib_names is not None:
+        return name in stdlib_names
+
+    if name in sys.builtin_module_names:
+        return True
+
+    try:
+        spec = find_spec(name)
+    except (ImportError, ValueError):
+        return False
+
+    if not spec or not spec.origin:
+        return False
+
+    stdlib = sysconfig.get_paths()['stdlib']
+    return (spec.origin.startswith(stdlib)
+            and 'site-packages' not in spec.origin
+            and 'dist-packages' not in spec.origin)
+
+
+def _catches_import_error(handlers: List[ast.ExceptHandler]) -> bool:
+    for handler in handlers:
+        if handler.type is None:
+            return True
+
+        types = handler.type.elts if isinstance(handler.type, ast.Tuple) \
+            else [handler.type]
+        if any(isinstance(t, ast.Name) and t.id in _IMPORT_ERRORS
+               for t in types):
+            return True
+
+    return False
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """
+    collect the absolute name of the modules imported by a module
+    """
+
+    def __init__(self, package: Optional[str]):
+        self.package = package
+        self.imported = set()
+
+    def _resolve_relative(self, module: Optional[str],
+                          level: int) -> Optional[str]:
+        # relative import cannot be resolved if the module is not in a
+        # package or goes beyond its top level package
+        if not self.package or level > self.package.count('.') + 1:
+            return None
+
+        base = self.package.rsplit('.', level - 1)[0]
+        return base + '.' + module if module else base
+
+    def visit_Import(self, node: ast.Import):  # pylint: disable=invalid-name
+        """
+        register modules of import statement
+        """
+        for alias in node.names:
+            self.imported.add(alias.name)
+
+    def visit_ImportFrom(self,  # pylint: disable=invalid-name
+                         node: ast.ImportFrom):
+        """
+        register module of from ... import statement
+        """
+        if node.level:
+            name = self._resolve_relative(node.module, node.level)
+        else:
+            name = node.module
+
+        if name:
+            self.imported.add(name)
+
+    def visit_Try(self, node: ast.Try):  # pylint: disable=invalid-name
+        """
+        skip the imports of try block if they are optional
+        """
+        if not _catches_import_error(node.handlers):
+            for child in node.body:
+                self.visit(child)
+
+        for child in node.handlers + node.orelse + node.finalbody:
+            self.visit(child)
+
+
+def _module_package(filename: str, sitedir: Optional[str]) -> Optional[str]:
+    """
+    Get the name of the package a module file belongs to, None if the file
+    is not in the site folder or is a toplevel module.
+    """
+    if not sitedir or not filename.startswith(sitedir + '/'):
+        return None
+
+    relpath = os.path.dirname(filename[len(sitedir) + 1:])
+    if not relpath:
+        return None
+
+    return relpath.replace('/', '.')
+
+
+def gen_module_imports(filename: str, sitedir: str = None) -> Set[str]:
+    """
+    Generate the set of absolute name of the modules imported by a module.
+
+    Args:
+        filename: path of the python module
+        sitedir: absolute path of the site folder containing the module. If
+            None, the relative imports are ignored.
+
+    Returns:
+        set of imported module names
+    """
+    with open(filename, 'rb') as srcfile:
+        tree = ast.parse(srcfile.read(), filename)
+
+    collector = _ImportCollector(_module_package(filename, sitedir))
+    collector.visit(tree)
+    return collector.imported
+
+
+def _pkg_toplevel_names(files: Iterable[str],
+                        sitedir: Optional[str]) -> Set[str]:
+    """
+    Get the name of the toplevel python packages provided by files
+    """
+    names = set()
+    if sitedir:
+        for filename in files:
+            if filename.startswith(sitedir + '/'):
+                names.add(pyimport_name(filename[len(sitedir) + 1:]))
+
+    names.discard(None)
+    return names
+
+
+def gen_pkg_imports(files: Iterable[str], sitedir: str = None) -> Set[str]:
+    """
+    Generate the set of modules imported by the python modules of a mmpack
+    package and that are neither in the package nor in the standard library.
+
+    Args:
+        files: list of path of files in the mmpack package
+        sitedir: path of the site folder containing the python packages
+
+    Returns: Set of imported module names
+    """
+    sitedir = abspath(sitedir) if sitedir else None
+    pkgfiles = {abspath(f) for f in files}
+    internals = _pkg_toplevel_names(pkgfiles, sitedir)
+
+    imported = set()
+    for filename in pkgfiles:
+        if is_python_script(filename):
+            imported.update(gen_module_imports(filename, sitedir))
+
+    return {name for name in imported
+            if (name.split('.', maxsplit=1)[0] not in internals
+                and not _is_standard_module(name))}
+
+
+def parse_options():
+    """
+    parse options
+    """
+    parser = ArgumentParser(description=__doc__,
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--site-path', dest='site_path', type=str, nargs='?',
+                        help='path of python site-packages or folder '
+                        'containing python package')
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    python_imports utility entry point
+    """
+    options = parse_options()
+
+    # If site path folder is specified, add it to sys.path so the modules
+    # installed in it are not mistaken for standard ones
+    if options.site_path:
+        sys.path.insert(0, abspath(options.site_path))
+
+    files = [f.strip() for f in sys.stdin.readlines()]
+    for name in sorted(gen_pkg_imports(files, options.site_path)):
+        print(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,7 @@ from typing import Set
 from astroid import parse, AstroidImportError
 from astroid.nodes import Import, ImportFrom, AssignName, FunctionDef, \
     ClassDef, Module
+from mmpack_build.pyanalysis_cache import AnalysisCache
 
 
 def _is_module_packaged(mod, pkgfiles: Set[str]) -> bool:
@@ -185,6 +186,33 @@ def _gen_pypkg_symbols(pypkg: str, pkgfiles: Set[str]) -> Set[str]:
     return symbol_set
 
 
+def gen_pypkg_symbols(pypkg: str, pkgfiles: Set[str],
+                      cache: AnalysisCache = None) -> Set[str]:
+    """
+    Generate the set of public symbols provided by a python package.
+
+    Args:
+        pypkg: name of the python package (name supplied to import statement)
+        pkgfiles: set of files in the same mmpack package
+        cache: cache of analysis results to use if not None. Results are
+            reused as long as the python files of the package are unchanged.
+
+    Returns: Set of name of provided symbols
+    """
+    if not cache:
+        return _gen_pypkg_symbols(pypkg, pkgfiles)
+
+    key = cache.key('provides', pypkg,
+                    sorted(cache.relocate(f) for f in pkgfiles))
+    symbols = cache.load(key)
+    if symbols is None:
+        symbols = sorted(_gen_pypkg_symbols(pypkg, pkgfiles))
+        pyfiles = [abspath(f) for f in pkgfiles if f.endswith('.py')]
+        cache.store(key, symbols, pyfiles)
+
+    return set(symbols)
+
+
 def parse_options():
     """
     parse options
@@ -215,7 +243,7 @@ def main():
     # Load list of files in package from stdin
     pkgfiles = {f.strip() for f in sys.stdin.readlines()}
 
-    symbol_set = _gen_pypkg_symbols(options.pypkgname, pkgfiles)
+    symbol_set = gen_pypkg_symbols(options.pypkgname, pkgfiles)
 
     # Return result on stdout
     for sym in symbol_set:
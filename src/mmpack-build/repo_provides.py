@@ -0,0 +1,132 @@
+# @mindmaze_header@
+"""
+Fetch and cache the aggregated provides index published by the repositories
+configured for mmpack.
+
+Each repository publishes next to its binary-index a file named
+provides-index (generated by mmpack-createrepo) which has the following
+layout:
+
+    <symbol type>:
+        <mpk file>:
+            <content of .symbols or .pyobjects file of the package>
+
+This allows mmpack-build to compute the dependencies of a package against
+the packages available in the repositories without having to install them.
+"""
+
+import os
+from hashlib import sha256
+from typing import List
+
+import urllib3
+
+from . common import dprint, iprint, wprint, yaml_load, metadata_load
+from . workspace import Workspace
+
+
+PROVIDES_INDEX_NAME = 'provides-index'
+
+# content of the provides index of each repository, loaded only once per
+# build
+_REPO_PROVIDES = None
+
+
+def _get_repositories_urls() -> List[str]:
+    """
+    get the list of urls of the repositories in the mmpack configuration in
+    use
+    """
+    try:
+        config = yaml_load(Workspace().config_file())
+    except FileNotFoundError:
+        return []
+
+    repositories = config.get('repositories') if config else None
+    if not repositories:
+        return []
+    if isinstance(repositories, dict):
+        repositories = [repositories]
+
+    # Each repository can be either listed directly as url or as a
+    # {name: url} mapping
+    urls = []
+    for repo in repositories:
+        if isinstance(repo, dict):
+            urls += list(repo.values())
+        else:
+            urls.append(repo)
+
+    return urls
+
+
+def _fetch_provides_index(url: str) -> str:
+    """
+    Update the cached copy of the provides index of repository at url.
+
+    Returns:
+        path of the cached provides index, None if there is none
+    """
+    cachedir = Workspace().cachedir('repo-provides')
+    urlhash = sha256(url.encode('utf-8')).hexdigest()[:16]
+    cached_index = os.path.join(cachedir, urlhash)
+    etag_file = cached_index + '.etag'
+
+    headers = {}
+    if os.path.exists(cached_index) and os.path.exists(etag_file):
+        headers['If-None-Match'] = open(etag_file).read().strip()
+
+    index_url = url.rstrip('/') + '/' + PROVIDES_INDEX_NAME
+    try:
+        request = urllib3.PoolManager().request('GET', index_url,
+                                                headers=headers)
+    except urllib3.exceptions.HTTPError as error:
+        wprint('Failed to fetch {}: {}'.format(index_url, error))
+        return cached_index if os.path.exists(cached_index) else None
+
+    if request.status == 304:
+        dprint('provides index of {} is up to date'.format(url))
+        os.utime(cached_index)  # mark it as recently used
+        return cached_index
+
+    if request.status != 200:
+        wprint('No provides index available in {} (HTTP status {})'
+               .format(url, request.status))
+        return None
+
+    # Write in temporary file and move it to prevent concurrent readers to
+    # see a partially written file
+    tmpfile = '{}.{}.tmp'.format(cached_index, os.getpid())
+    with open(tmpfile, 'wb') as outfile:
+        outfile.write(request.data)
+    os.replace(tmpfile, cached_index)
+
+    etag = request.headers.get('ETag')
+    if etag:
+        with open(etag_file, 'w') as outfile:
+            outfile.write(etag)
+    elif os.path.exists(etag_file):
+        os.remove(etag_file)
+
+    iprint('fetched provides index of {}'.format(url))
+    return cached_index
+
+
+def load_repo_provides_indexes() -> List[dict]:
+    """
+    Update the cached provides index of all configured repositories and load
+    them. The indexes are fetched and parsed only at the first call.
+
+    Returns:
+        list of the content of the provides index of each repository
+    """
+    global _REPO_PROVIDES  # pylint: disable=global-statement
+
+    if _REPO_PROVIDES is None:
+        _REPO_PROVIDES = []
+        for url in _get_repositories_urls():
+            index = _fetch_provides_index(url)
+            if index:
+                _REPO_PROVIDES.append(metadata_load(index) or {})
+
+    return _REPO_PROVIDES
@@ -3,42 +3,27 @@
 Fetch/gather sources of a mmpack package and create source tarball
 """
 
+import re
 import shutil
+from hashlib import sha256
 from tempfile import mkdtemp
-from typing import Dict
+from typing import Dict, Optional
 
 import urllib3
+import yaml
 
+from . artifacts import place_artifact
 from . common import *
-from . workspace import Workspace
+from . file_lock import FileLock
+from . git_mirror import git_mirror_checkout, git_mirror_resolve, \
+    git_mirror_read, git_mirror_export, git_mirror_tree_id
+from . srctar_cache import git_tree_digest, srctar_cache_add, \
+    srctar_cache_get, tree_digest
+from . upstream_cache import upstream_cache_add, upstream_cache_get
+from . workspace import Workspace, srcdir_lock
 
 
-def _git_clone(url: str, clonedir: str, tag: str = None,
-               git_ssh_cmd: str = None):
-    """
-    create a shallow clone of a git repo
-
-    Args:
-        url: url of git repository
-        clonedir: folder where the repo must be cloned into
-        tag: option tag, branch, commit hash to check out
-        git_ssh_cmd: optional, ssh cmd to use when cloning git repo through ssh
-    """
-    git_opts = '--quiet --depth=1'
-    if tag:
-        git_opts += ' --branch ' + tag
-
-    if os.path.isdir(url):
-        url = 'file://' + os.path.abspath(url)
-
-    cmd_env = ''
-    if git_ssh_cmd:
-        cmd_env += 'GIT_SSH_COMMAND="{}"'.format(git_ssh_cmd)
-
-    iprint('cloning {} into tmp dir {}'.format(url, clonedir))
-    git_clone_sh_cmd = '{0} git clone {1} {2} {3}'\
-                       .format(cmd_env, git_opts, url, clonedir)
-    shell(git_clone_sh_cmd)
+_DOWNLOAD_CHUNK_SIZE = 1 << 16
 
 
 ###########################################################################
@@ -61,7 +46,7 @@ def _create_srcdir_from_git(builddir: str, url: str,
     Returns:
         tag that have been checked out.
     """
-    _git_clone(url, builddir, tag, kwargs.get('git_ssh_cmd'))
+    git_mirror_checkout(url, builddir, tag, kwargs.get('git_ssh_cmd'))
     git_dir = builddir + '/.git'
 
     # Get tag name if not set yet (use current branch)
@@ -133,10 +118,90 @@ def _fetch_upstream_from_git(srcdir: str, specs: Dict[str, str]) -> str:
         srcdir: folder where sources must be cloned
         specs: dict of settings put in source-strap file
     """
-    _git_clone(specs['url'], srcdir, specs.get('branch'))
+    git_mirror_checkout(specs['url'], srcdir, specs.get('branch'))
     shutil.rmtree(srcdir + '/.git')
 
 
+def _content_range_start(response) -> Optional[int]:
+    """
+    Get the offset of the data of a partial content response, None if it is
+    not specified
+    """
+    match = re.match(r'bytes (\d+)-',
+                     response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+
+def _download(url: str, filename: str, expected_sha256: str = None):
+    """
+    Download a file by streaming it to disk and hashing it on the fly. The
+    data is first written in <filename>.part: if this file exists when the
+    function is called (from an interrupted download), the download resumes
+    from its end if the server supports it. Since only the hash of the
+    complete file can tell whether the part file and the data resumed fit
+    together, a download is resumed only if expected_sha256 is set.
+
+    Args:
+        url: url of the file to download
+        filename: path where the file must be written
+        expected_sha256: if not None, sha256 the downloaded file must have
+
+    Raises:
+        Assert: the download failed or the downloaded file does not match
+            expected sha256
+    """
+    partfile = filename + '.part'
+    hasher = sha256()
+    headers = {}
+
+    # Hash the data already downloaded and request only the remaining part
+    offset = 0
+    if os.path.exists(partfile) and expected_sha256:
+        with open(partfile, 'rb') as infile:
+            for chunk in iter(lambda: infile.read(_DOWNLOAD_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+                offset += len(chunk)
+        headers['Range'] = 'bytes={}-'.format(offset)
+
+    http = urllib3.PoolManager()
+    response = http.request('GET', url, headers=headers,
+                            preload_content=False)
+
+    # Restart from scratch if the server does not send the requested range
+    if (response.status == 206
+            and _content_range_start(response) != offset):
+        dprint('cannot resume download of {} at {}'.format(url, offset))
+        response.release_conn()
+        response = http.request('GET', url, preload_content=False)
+
+    try:
+        if response.status == 206:
+            dprint('resuming download of {} at {}'.format(url, offset))
+            mode = 'ab'
+        elif response.status == 200:
+            hasher = sha256()
+            mode = 'wb'
+        elif response.status == 416 and offset:
+            mode = None  # The part file is already complete
+        else:
+            raise Assert('Failed to download {} (HTTP status {})'
+                         .format(url, response.status))
+
+        if mode:
+            with open(partfile, mode) as outfile:
+                for chunk in response.stream(_DOWNLOAD_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    outfile.write(chunk)
+    finally:
+        response.release_conn()
+
+    if expected_sha256 and hasher.hexdigest() != expected_sha256:
+        os.remove(partfile)
+        raise Assert("Downloaded file does not match expected sha256")
+
+    os.replace(partfile, filename)
+
+
 def _fetch_upstream_from_tar(srcdir: str, specs: Dict[str, str]) -> str:
     """
     Fetch upstream sources from remote tar
@@ -146,25 +211,46 @@ def _fetch_upstream_from_tar(srcdir: str, specs: Dict[str, str]) -> str:
         specs: dict of settings put in source-strap file
     """
     url = specs['url']
-    filename = os.path.basename(url)
-    downloaded_file = os.path.normpath(os.path.join(srcdir, '..', filename))
-
-    # Download remote tar
-    iprint('Downloading {}...'.format(url))
-    request = urllib3.PoolManager().request('GET', url)
-    with open(downloaded_file, 'wb') as outfile:
-        outfile.write(request.data)
-    iprint('Done')
-
-    # Verify sha256 is correct if supplied in specs
-    if 'sha256' in specs and specs['sha256'] != sha256sum(downloaded_file):
-        raise Assert("Downloaded file does not match expected sha256")
+    expected_sha256 = specs.get('sha256')
+
+    # Use the file downloaded by a previous build if its content is pinned
+    cached_file = None
+    if expected_sha256:
+        cached_file = upstream_cache_get(expected_sha256)
 
-    # Extract downloaded_file in srcdir
-    with tarfile.open(downloaded_file, 'r:*') as tar:
-        tar.extractall(path=srcdir)
+    if cached_file:
+        iprint('Using {} from upstream cache'.format(url))
+        with tarfile.open(cached_file, 'r:*') as tar:
+            tar.extractall(path=srcdir)
+        return
 
-    os.remove(downloaded_file)
+    # Download in mmpack cache so that an interrupted download can be
+    # resumed by the next build
+    urlhash = sha256(url.encode('utf-8')).hexdigest()[:16]
+    downloaded_file = '{}/{}-{}'.format(Workspace().cachedir('downloads'),
+                                        urlhash, os.path.basename(url))
+
+    # Concurrent builds fetching the same url wait for each other instead of
+    # writing the same partial download
+    with FileLock(downloaded_file + '.lock'):
+        if expected_sha256:
+            cached_file = upstream_cache_get(expected_sha256)
+
+        if not cached_file:
+            iprint('Downloading {}...'.format(url))
+            _download(url, downloaded_file, expected_sha256)
+            iprint('Done')
+
+            if expected_sha256:
+                cached_file = upstream_cache_add(expected_sha256,
+                                                 downloaded_file)
+
+        # Extract downloaded file in srcdir
+        with tarfile.open(cached_file or downloaded_file, 'r:*') as tar:
+            tar.extractall(path=srcdir)
+
+        if not cached_file:
+            os.remove(downloaded_file)
 
 
 def _fetch_upstream(srcdir: str, specs: Dict[str, str]):
@@ -222,15 +308,27 @@ class SourceTarball:
         """
         # declare class instance attributes
         self._srcdir = None
+        self._srcdir_lock = None
         self.srctar = None
         self.tag = None
         self.name = None
 
         wrk = Workspace()
         self._srcdir = mkdtemp(dir=wrk.sources)
+
+        # Prevent concurrent clean or garbage collection from removing the
+        # temporary sources while they are used
+        self._srcdir_lock = srcdir_lock(self._srcdir)
+        self._srcdir_lock.acquire()
         if not outdir:
             outdir = wrk.packages
 
+        # Git sources without sources-strap are exported directly from the
+        # repository mirror
+        if method == 'git' and self._export_git_tree(path_url, tag, outdir,
+                                                      **kwargs):
+            return
+
         # Fetch sources following the specified method and move them to the
         # temporary source build folder
         dprint('extracting sources in the temporary directory: {}'
@@ -254,8 +352,17 @@ class SourceTarball:
 
         # Create source package tarball
         self.srctar = '{0}/{1}_{2}_src.tar.xz'.format(outdir, name, version)
+        digest = tree_digest(self._srcdir)
+        if srctar_cache_get(digest, self.srctar):
+            return
+
+        # Generate in temporary file so that the tarball is published
+        # atomically
         dprint('Building source tarball ' + self.srctar)
-        create_tarball(self._srcdir, self.srctar, 'xz')
+        tmp_srctar = '{}.{}.tmp'.format(self.srctar, os.getpid())
+        create_tarball(self._srcdir, tmp_srctar, 'xz')
+        srctar_cache_add(digest, tmp_srctar)
+        os.replace(tmp_srctar, self.srctar)
 
     def __del__(self):
         # If source build dir has been created and not detach, remove it at
@@ -264,6 +371,61 @@ class SourceTarball:
             dprint('Destroying temporary source build dir ' + self._srcdir)
             shutil.rmtree(self._srcdir)
 
+        self._release_srcdir_lock()
+
+    def _release_srcdir_lock(self):
+        """
+        release the lock of the temporary sources folder once it has been
+        removed or moved away
+        """
+        if not self._srcdir_lock:
+            return
+
+        self._srcdir_lock.remove()
+        self._srcdir_lock = None
+
+    def _export_git_tree(self, url: str, tag: str, outdir: str,
+                         **kwargs) -> bool:
+        """
+        Create the source tarball by streaming the tree of the requested
+        revision from the object store of the repository mirror, extracting
+        it in the temporary source build folder at the same time.
+
+        Returns:
+            False if the sources cannot be exported this way (no specs or
+            sources-strap used), True otherwise
+        """
+        mirror, commit, tag = git_mirror_resolve(url, tag,
+                                                 kwargs.get('git_ssh_cmd'))
+        specs = git_mirror_read(mirror, commit, 'mmpack/specs')
+        if (specs is None
+                or git_mirror_read(mirror, commit, 'mmpack/sources-strap')
+                is not None):
+            return False
+
+        specs = yaml.load(specs, Loader=YamlLoader)
+        name = specs['general']['name']
+        version = specs['general']['version']
+
+        self.tag = tag
+        self.name = name
+        self.srctar = '{0}/{1}_{2}_src.tar.xz'.format(outdir, name, version)
+
+        # Only extract the sources if the tree has already been packaged
+        digest = git_tree_digest(git_mirror_tree_id(mirror, commit))
+        if srctar_cache_get(digest, self.srctar):
+            with tarfile.open(self.srctar, 'r:xz') as tar:
+                tar.extractall(path=self._srcdir)
+            return True
+
+        dprint('Building source tarball {} from {} at {}'
+               .format(self.srctar, url, commit))
+        tmp_srctar = '{}.{}.tmp'.format(self.srctar, os.getpid())
+        git_mirror_export(mirror, commit, self._srcdir, tmp_srctar)
+        srctar_cache_add(digest, tmp_srctar)
+        os.replace(tmp_srctar, self.srctar)
+        return True
+
     def _process_source_strap(self):
         source_strap = os.path.join(self._srcdir, 'mmpack/sources-strap')
         try:
@@ -304,10 +466,10 @@ class SourceTarball:
         iprint('moving unpacked sources from {0} to {1}'
                .format(self._srcdir, unpackdir))
         shutil.move(self._srcdir, unpackdir)
+        self._release_srcdir_lock()
 
-        # Copy package tarball in package builddir
-        new_srctar = os.path.join(builddir, os.path.basename(self.srctar))
-        shutil.copyfile(self.srctar, new_srctar)
+        # Place package tarball in package builddir
+        new_srctar = place_artifact(self.srctar, builddir)
 
         self._srcdir = unpackdir
         self.srctar = new_srctar
@@ -5,17 +5,18 @@ Class to handle source packages, build them and generates binary packages.
 
 import os
 import re
-import shutil
 import sys
 
 from glob import glob
 from os import path
 from subprocess import Popen
 from threading import Thread
-from typing import Set
+from typing import List, Set
 
-from . workspace import Workspace, get_local_install_dir
+from . workspace import Workspace, get_install_prefix, \
+    get_local_install_dir
 from . binary_package import BinaryPackage
+from . artifacts import place_artifact
 from . common import *
 from . file_utils import *
 from . hooks_loader import MMPACK_BUILD_HOOKS, init_mmpack_build_hooks
@@ -24,6 +25,10 @@ from . settings import PKGDATADIR
 from . mmpack_builddep import process_dependencies, general_specs_builddeps
 
 
+# methods available to compute the dependencies of python packages
+PYTHON_DEPENDS_MODES = ('symbols', 'imports')
+
+
 class _FileConsumer(Thread):
     """
     Read in a thread from file input and duplicate onto the file output and
@@ -42,13 +47,6 @@ class _FileConsumer(Thread):
             log_info(line.strip('\n\r'))
 
 
-def _get_install_prefix() -> str:
-    if os.name == 'nt':
-        return '/m'
-
-    return '/run/mmpack'
-
-
 def _unpack_deps_version(item):
     """
     helper to allow simpler mmpack dependency syntax
@@ -126,7 +124,7 @@ class SrcPackage:
         """
         installdir = get_local_install_dir(self.pkgbuild_path())
         if withprefix:
-            installdir += _get_install_prefix()
+            installdir += get_install_prefix()
 
         os.makedirs(installdir, exist_ok=True)
         return installdir
@@ -207,8 +205,12 @@ class SrcPackage:
         # remove *.la and *.def files
         _ = self._get_matching_files(r'.*\.la$')
         _ = self._get_matching_files(r'.*\.def$')
-        _ = self._get_matching_files(r'.*/__pycache__/.*')
-        _ = self._get_matching_files(r'.*\.pyc$')
+        # keep python bytecode only if compiled by python hook
+        pyc_prefix = ''
+        if Workspace().python_bytecode:
+            pyc_prefix = '(?!lib/python3/site-packages/)'
+        _ = self._get_matching_files(pyc_prefix + r'.*/__pycache__/.*')
+        _ = self._get_matching_files(pyc_prefix + r'.*\.pyc$')
 
     def _parse_specfile_general(self) -> None:
         """
@@ -234,6 +236,23 @@ class SrcPackage:
                 self.build_depends = value
             elif key == 'build-system':
                 self.build_system = value
+            elif key == 'python-depends':
+                if value not in PYTHON_DEPENDS_MODES:
+                    raise ValueError('Invalid python-depends value: {}'
+                                     .format(value))
+                # mode forced on the command line takes precedence
+                if not Workspace().python_depends:
+                    Workspace().python_depends = value
+            elif key == 'python-bytecode':
+                # value is a string since specfile is loaded with BaseLoader
+                if value.lower() not in ('true', 'yes', '1',
+                                         'false', 'no', '0'):
+                    raise ValueError('Invalid python-bytecode value: {}'
+                                     .format(value))
+                # option set on the command line takes precedence
+                if Workspace().python_bytecode is None:
+                    Workspace().python_bytecode = \
+                        value.lower() in ('true', 'yes', '1')
 
     def _binpkg_get_create(self, binpkg_name: str,
                            pkg_type: str = None) -> BinaryPackage:
@@ -288,9 +307,9 @@ class SrcPackage:
         build_env['SRCDIR'] = self.unpack_path()
         build_env['BUILDDIR'] = self.unpack_path() + '/build'
         build_env['DESTDIR'] = self._local_install_path()
-        build_env['PREFIX'] = _get_install_prefix()
+        build_env['PREFIX'] = get_install_prefix()
         build_env['SKIP_TESTS'] = str(skip_tests)
-        build_env['PKG_CONFIG_PATH'] = path.join(_get_install_prefix(),
+        build_env['PKG_CONFIG_PATH'] = path.join(get_install_prefix(),
                                                  'lib/pkgconfig')
         if self.build_options:
             build_env['OPTS'] = self.build_options
@@ -537,41 +556,50 @@ class SrcPackage:
         manifest_path = '{}_{}_{}.mmpack-manifest'.format(self.name,
                                                           self.version,
                                                           arch)
-        yaml_serialize(data, manifest_path, use_block_style=True)
+        metadata_serialize(data, manifest_path, use_block_style=True)
         return manifest_path
 
-    def generate_binary_packages(self):
+    def generate_binary_packages(self) -> List[str]:
         """
         create all the binary packages
+
+        Returns:
+            the paths of the files published in the packages folder (source
+            package, binary packages and manifest)
         """
         instdir = self._local_install_path(True)
         pushdir(instdir)
 
         wrk = Workspace()
 
-        # Copy source package
-        shutil.copy(self.src_tarball, wrk.packages)
-        iprint('source {} copied in {}'
+        # Place source package
+        published = [place_artifact(self.src_tarball, wrk.packages)]
+        iprint('source {} placed in {}'
                .format(path.basename(self.src_tarball), wrk.packages))
 
         # we need all of the provide infos before starting the dependencies
         for pkgname, binpkg in self._packages.items():
             binpkg.gen_provides()
 
+        # let hooks gather what all packages use before dependencies of
+        # each of them are computed
+        pkginfos = [binpkg.get_pkginfo() for binpkg in self._packages.values()]
+        for hook in MMPACK_BUILD_HOOKS:
+            hook.prepare_depends(pkginfos)
+
         for pkgname, binpkg in self._packages.items():
             binpkg.gen_dependencies(self._packages.values())
             pkgfile = binpkg.create(instdir, self.pkgbuild_path())
-            shutil.copy(pkgfile, wrk.packages)
+            published.append(place_artifact(pkgfile, wrk.packages))
             iprint('generated package: {} : {}'
-                   .format(pkgname,
-                           path.join(wrk.packages, path.basename(pkgfile))))
+                   .format(pkgname, published[-1]))
 
         manifest = self._generate_manifest()
-        shutil.copy(manifest, wrk.packages)
-        iprint('generated manifest: {}'
-               .format(path.join(wrk.packages, path.basename(manifest))))
+        published.append(place_artifact(manifest, wrk.packages))
+        iprint('generated manifest: {}'.format(published[-1]))
 
         popdir()  # local install path
+        return published
 
     def __repr__(self):
         return u'{}'.format(self.__dict__)
@@ -0,0 +1,128 @@
+# @mindmaze_header@
+"""
+Cache of the generated source tarballs, indexed by a digest of the source
+tree they contain. A source tarball is generated in a deterministic way from
+its source tree, hence when a tree has already been packaged, the previous
+tarball is reused instead of compressing the tree again.
+
+Each cached tarball is recorded along with its sha256 which is verified
+before it is reused.
+"""
+
+import os
+import stat
+import sys
+import tarfile
+from hashlib import sha256
+
+from . artifacts import place_artifact
+from . common import dprint, sha256sum
+from . workspace import Workspace
+
+
+# Version of the tarball generation. It must be incremented each time the
+# content generated for a given source tree changes.
+_SRCTAR_FORMAT = 1
+
+
+def _format_digest(kind: str, treehash: str) -> str:
+    # The output of the compression might change with the python version
+    fmt = '{}:{}:{}:{}'.format(_SRCTAR_FORMAT, sys.version, tarfile.version,
+                               kind)
+    return sha256((fmt + ':' + treehash).encode('utf-8')).hexdigest()
+
+
+def git_tree_digest(tree_id: str) -> str:
+    """
+    Get the digest of a source tree exported from a git tree object.
+    """
+    return _format_digest('git', tree_id)
+
+
+def tree_digest(srcdir: str) -> str:
+    """
+    Compute the digest of a source tree from the sorted paths, modes and
+    content of the files it contains.
+    """
+    sha = sha256('{:o}\0'.format(os.lstat(srcdir).st_mode).encode('utf-8'))
+    inodes = {}
+    for root, dirs, files in os.walk(srcdir):
+        dirs.sort()
+        for name in sorted(dirs + files):
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, srcdir)
+            info = os.lstat(path)
+            sha.update('{}\0{:o}\0'.format(relpath, info.st_mode)
+                       .encode('utf-8', 'surrogateescape'))
+
+            # hardlinks are recorded as such in the tarball
+            if stat.S_ISREG(info.st_mode) and info.st_nlink > 1:
+                inode = (info.st_dev, info.st_ino)
+                if inode in inodes:
+                    sha.update(b'link\0' + inodes[inode] + b'\0')
+                    continue
+                inodes[inode] = relpath.encode('utf-8', 'surrogateescape')
+
+            if stat.S_ISLNK(info.st_mode):
+                sha.update(os.readlink(path).encode('utf-8',
+                                                    'surrogateescape'))
+            elif stat.S_ISREG(info.st_mode):
+                sha.update(sha256sum(path).encode('utf-8'))
+            sha.update(b'\0')
+
+    return _format_digest('dir', sha.hexdigest())
+
+
+def _entry_path(digest: str) -> str:
+    return '{}/{}.tar.xz'.format(Workspace().cachedir('srctar'), digest)
+
+
+def srctar_cache_get(digest: str, srctar: str) -> bool:
+    """
+    Place at srctar the cached source tarball of a tree if any.
+
+    Args:
+        digest: digest of the source tree
+        srctar: path where the source tarball must be placed
+
+    Returns:
+        True if the source tarball was in cache, False otherwise
+    """
+    cached = _entry_path(digest)
+    try:
+        with open(cached + '.sha256') as hashfile:
+            expected_sha256 = hashfile.read().strip()
+        cached_sha256 = sha256sum(cached)
+    except FileNotFoundError:
+        return False
+
+    if cached_sha256 != expected_sha256:
+        dprint('discarding corrupted cached source tarball ' + cached)
+        os.remove(cached)
+        return False
+
+    dprint('reusing cached source tarball ' + cached)
+    os.utime(cached)  # mark it as recently used
+    place_artifact(cached, srctar)
+    return True
+
+
+def srctar_cache_add(digest: str, srctar: str) -> str:
+    """
+    Record a generated source tarball in the cache.
+
+    Args:
+        digest: digest of the source tree
+        srctar: path of the generated tarball
+
+    Returns:
+        path of the cached tarball
+    """
+    cached = _entry_path(digest)
+    place_artifact(srctar, cached)
+
+    tmp = '{}.sha256.{}.tmp'.format(cached, os.getpid())
+    with open(tmp, 'w') as hashfile:
+        hashfile.write(sha256sum(srctar) + '\n')
+    os.replace(tmp, cached + '.sha256')
+    return cached
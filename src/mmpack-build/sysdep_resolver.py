@@ -0,0 +1,115 @@
+# @mindmaze_header@
+"""
+Resolution of the system dependencies of the packages being built.
+
+The hooks register the sonames and python imports used by all the binary
+packages of the build before computing their dependencies. The first lookup
+then resolves all registered items at once against the system package
+database and the results are kept for the rest of the build. This way the
+sonames and imports shared by several binary packages (libc, libstdc++...)
+are looked up only once.
+"""
+
+import os
+from typing import Iterable, Set
+
+from . decorators import singleton
+from . dpkg import dpkg_soname_tables, dpkg_fill_dependency, dpkg_find_pypkgs
+from . pacman import pacman_soname_tables, pacman_fill_dependency, \
+    pacman_find_pypkgs
+from . settings import DPKG_PREFIX, PACMAN_PREFIX
+from . workspace import Workspace
+
+
+@singleton
+class SysdepResolver:
+    """
+    memoizing batch resolver of system dependencies
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._pending_sonames = set()
+        self._pending_pyimports = set()
+        self._soname_tables = dict()
+        self._pydeps = dict()
+
+    def _get_backend(self) -> str:
+        if not self._backend:
+            if os.path.exists(DPKG_PREFIX):
+                self._backend = 'dpkg'
+            elif os.path.exists(Workspace().cygroot() + PACMAN_PREFIX):
+                self._backend = 'pacman'
+            else:
+                raise FileNotFoundError('Could not find system package '
+                                        'manager')
+        return self._backend
+
+    def add_sonames(self, sonames: Iterable[str]):
+        """
+        register sonames whose system dependency will be looked up
+        """
+        self._pending_sonames.update(set(sonames) - self._soname_tables.keys())
+
+    def add_pyimports(self, imports: Iterable[str]):
+        """
+        register python imports whose system dependency will be looked up
+        """
+        self._pending_pyimports.update(set(imports) - self._pydeps.keys())
+
+    def _resolve_pending(self):
+        """
+        resolve all the registered sonames and imports not resolved yet
+        """
+        if self._pending_sonames:
+            if self._get_backend() == 'dpkg':
+                tables = dpkg_soname_tables(self._pending_sonames)
+            else:
+                tables = pacman_soname_tables(self._pending_sonames)
+
+            for soname in self._pending_sonames:
+                self._soname_tables[soname] = tables.get(soname)
+            self._pending_sonames = set()
+
+        if self._pending_pyimports:
+            if self._get_backend() == 'dpkg':
+                pydeps = dpkg_find_pypkgs(self._pending_pyimports)
+            else:
+                pydeps = pacman_find_pypkgs(self._pending_pyimports)
+
+            for pyimport in self._pending_pyimports:
+                self._pydeps[pyimport] = pydeps.get(pyimport)
+            self._pending_pyimports = set()
+
+    def find_shlib_dependency(self, soname: str, symbol_set: Set[str]) -> str:
+        """
+        Get the system dependency providing soname. The symbols provided by
+        the soname are removed from symbol_set.
+
+        Returns:
+            the system dependency, None if it cannot be found
+        """
+        if soname not in self._soname_tables:
+            self._pending_sonames.add(soname)
+        self._resolve_pending()
+
+        table = self._soname_tables[soname]
+        if not table:
+            return None
+
+        if self._get_backend() == 'dpkg':
+            return dpkg_fill_dependency(table, symbol_set)
+        return pacman_fill_dependency(table, symbol_set)
+
+    def find_pydep(self, pyimport: str) -> str:
+        """
+        Get the system dependency providing the python package pyimport
+
+        Returns:
+            the system dependency, None if it cannot be found
+        """
+        if pyimport not in self._pydeps:
+            self._pending_pyimports.add(pyimport)
+        self._resolve_pending()
+
+        return self._pydeps[pyimport]
@@ -0,0 +1,175 @@
+# @mindmaze_header@
+"""
+Removal of the folders of the workspace without waiting for it.
+
+The folders to remove are first renamed into the trash folder of mmpack
+cache, which is instantaneous, and the trash is then emptied by a detached
+background process. Hence a build never waits for the removal of the
+folders of the previous one.
+
+The trash is emptied by running:
+    python3 -m mmpack_build.trash <trashdir>
+"""
+
+import errno
+import os
+import shutil
+import sys
+import uuid
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, DEVNULL
+
+from . common import dprint
+from . file_lock import FileLock
+
+
+def _remove_dir_entries(dirpath: str):
+    """
+    remove all entries of a folder which are not folders
+    """
+    try:
+        entries = list(os.scandir(dirpath))
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def rmtree_parallel(path: str, jobs: int = None):
+    """
+    Remove a folder and all its content. The files of the different
+    subfolders are removed concurrently.
+
+    Args:
+        path: folder to remove
+        jobs: maximum number of concurrent removals. Defaults to the number
+            of cpus.
+    """
+    if not os.path.isdir(path) or os.path.islink(path):
+        os.unlink(path)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    dirs = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for dirpath, _, _ in os.walk(path):
+            dirs.append(dirpath)
+            futures.append(executor.submit(_remove_dir_entries, dirpath))
+
+    # Report the files that could not be removed
+    for future in futures:
+        future.result()
+
+    # Once all their files are removed, the folders are removed deepest
+    # first
+    for dirpath in reversed(dirs):
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass
+
+    # Remove what could not be removed concurrently (like entries of
+    # folders that were not readable). This reports the actual error if the
+    # folder cannot be removed.
+    if os.path.lexists(path):
+        shutil.rmtree(path)
+
+
+def move_to_trash(path: str, trashdir: str) -> bool:
+    """
+    Move a file or folder into the trash. If it cannot be renamed there
+    (trash located on another filesystem for example), it is removed
+    immediately.
+
+    Args:
+        path: path of file or folder to remove
+        trashdir: trash folder
+
+    Returns:
+        True if path has been moved in the trash, False if it has been
+        removed or did not exist
+    """
+    if not os.path.lexists(path):
+        return False
+
+    # The entry is renamed directly to a unique name in the trash: an
+    # intermediate folder could be removed by a worker emptying the trash
+    # before the entry is moved into it.
+    os.makedirs(trashdir, exist_ok=True)
+    trash_entry = os.path.join(trashdir, '{}-{}'.format(
+        uuid.uuid4().hex, os.path.basename(os.path.normpath(path))))
+    try:
+        os.rename(path, trash_entry)
+        dprint('{} moved to trash'.format(path))
+        return True
+    except OSError as err:
+        if err.errno not in (errno.EXDEV, errno.EACCES, errno.EBUSY):
+            raise
+
+    dprint('removing {}'.format(path))
+    rmtree_parallel(path)
+    return False
+
+
+def empty_trash_background(trashdir: str):
+    """
+    Start a detached process removing the content of the trash. The process
+    keeps running if mmpack-build terminates.
+    """
+    cmd = [sys.executable, '-m', 'mmpack_build.trash', trashdir]
+    dprint('[shell] {0}'.format(' '.join(cmd)))
+
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = 0x00000008  # DETACHED_PROCESS
+    else:
+        kwargs['start_new_session'] = True
+
+    # Make sure the worker imports the same mmpack_build package
+    env = os.environ.copy()
+    pkgdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [pkgdir] + [p for p in [env.get('PYTHONPATH')] if p])
+
+    Popen(cmd, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, env=env,
+          close_fds=True, **kwargs)
+
+
+def empty_trash(trashdir: str):
+    """
+    Remove the content of the trash. If the trash is already being emptied
+    by another process, return immediately: the other process will remove
+    the content added meanwhile.
+    """
+    lock = FileLock(trashdir + '.lock')
+    while os.path.isdir(trashdir) and os.listdir(trashdir):
+        if not lock.acquire(blocking=False):
+            return
+
+        try:
+            for entry in os.listdir(trashdir):
+                rmtree_parallel(os.path.join(trashdir, entry))
+        finally:
+            lock.release()
+
+
+def main():
+    """
+    entry point of the trash removal worker
+    """
+    parser = ArgumentParser(description=__doc__,
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('trashdir', type=str)
+    options = parser.parse_args()
+    empty_trash(options.trashdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# @mindmaze_header@
+"""
+Content-addressed cache of the upstream sources downloaded for the projects
+using sources-strap. The downloaded files are indexed by their sha256 as
+specified in sources-strap, hence a file is downloaded only once as long as
+the specified sha256 does not change.
+
+The least recently used files are evicted when the total size of the cache
+exceeds a limit.
+"""
+
+import os
+from typing import Optional
+
+from . common import dprint
+from . file_lock import FileLock
+from . workspace import Workspace
+
+
+# maximum size of the cache in bytes
+UPSTREAM_CACHE_MAX_SIZE = 2 * 1024**3
+
+
+def _cache_path(sha256: str) -> str:
+    cachedir = Workspace().cachedir('upstream')
+    return '{}/{}/{}'.format(cachedir, sha256[:2], sha256)
+
+
+def upstream_cache_get(sha256: str) -> Optional[str]:
+    """
+    Get the cached file whose content has the hash sha256.
+
+    Returns:
+        path of the cached file, None if not in cache
+    """
+    path = _cache_path(sha256)
+    try:
+        # mark the file as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+
+    return path
+
+
+def _evict(max_size: int, keep: str):
+    """
+    Remove the least recently used files until the cache size does not
+    exceed max_size. The file keep is never removed.
+    """
+    entries = []
+    cachedir = Workspace().cachedir('upstream')
+    for subdir in os.scandir(cachedir):
+        if not subdir.is_dir():
+            continue
+        for entry in os.scandir(subdir.path):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+
+        dprint('evicting {} from upstream cache'.format(path))
+        os.remove(path)
+        total_size -= size
+
+
+def upstream_cache_add(sha256: str, filename: str,
+                       max_size: int = UPSTREAM_CACHE_MAX_SIZE) -> str:
+    """
+    Move a downloaded file into the cache.
+
+    Args:
+        sha256: hash of the content of filename
+        filename: path of the file to add
+        max_size: size limit of the cache
+
+    Returns:
+        path of the cached file
+    """
+    path = _cache_path(sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    cachedir = Workspace().cachedir('upstream')
+    with FileLock(cachedir + '/.lock'):
+        os.replace(filename, path)
+        _evict(max_size, keep=path)
+
+    return path
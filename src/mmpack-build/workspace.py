@@ -4,10 +4,15 @@ os helpers to manipulate the paths and environments
 """
 
 import os
+import re
+from glob import glob, escape as glob_escape
+from typing import List
 
 from . common import shell, dprint, ShellException, pushdir, popdir
 from . decorators import singleton
+from . file_lock import FileLock
 from . settings import BINDIR, EXEEXT
+from . trash import move_to_trash, empty_trash_background
 from . xdg import XDG_CONFIG_HOME, XDG_CACHE_HOME, XDG_DATA_HOME
 
 
@@ -42,7 +47,13 @@ class Workspace:
         self.packages = XDG_DATA_HOME + '/mmpack-packages'
         self._cygpath_root = None
         self._mmpack_bin = None
+        self._builddirs = {}
+        self._builddir_locks = []
         self.prefix = ''
+        self.use_repo_provides = False
+        self.python_depends = None
+        self.python_bytecode = None
+        self.jobs = None
 
         # create the directories if they do not exist
         os.makedirs(XDG_CONFIG_HOME, exist_ok=True)
@@ -82,32 +93,144 @@ class Workspace:
 
         return self._mmpack_bin
 
+    def cachedir(self, name: str) -> str:
+        """
+        get folder named `name` in mmpack cache. Create it if needed.
+        """
+        cachedir = XDG_CACHE_HOME + '/mmpack/' + name
+        os.makedirs(cachedir, exist_ok=True)
+        return cachedir
+
+    def config_file(self) -> str:
+        """
+        get path of mmpack configuration file in use (the one of the prefix
+        if one is set, the global one otherwise)
+        """
+        if self.prefix:
+            return self.prefix + '/etc/mmpack-config.yaml'
+
+        return self.config
+
     def builddir(self, srcpkg: str, tag: str):
         """
         get package build directory. Create it if needed.
+
+        The build directory is locked for the lifetime of the process. If it
+        is already locked by a concurrent build of the same package and tag,
+        a different directory is used.
         """
-        builddir = self.build + '/' + srcpkg + '/' + tag
+        builddir = self._builddirs.get((srcpkg, tag))
+        if not builddir:
+            builddir = self._lock_builddir(srcpkg, tag)
+            self._builddirs[(srcpkg, tag)] = builddir
+
         os.makedirs(builddir, exist_ok=True)
+
+        # mark the build directory as recently used (see cache_manager.py)
+        os.utime(builddir)
         return builddir
 
+    def _lock_builddir(self, srcpkg: str, tag: str) -> str:
+        basedir = self.build + '/' + srcpkg + '/' + tag
+        os.makedirs(os.path.dirname(basedir), exist_ok=True)
+
+        # '~' cannot be used in git references, hence the alternate folders
+        # never clash with the one of an other tag
+        builddir = basedir
+        num = 0
+        while True:
+            lock = builddir_lock(builddir)
+            if lock.acquire(blocking=False):
+                self._builddir_locks.append(lock)
+                return builddir
+
+            dprint('{} is used by another build'.format(builddir))
+            num += 1
+            builddir = '{}~{}'.format(basedir, num)
+
+    def list_builddirs(self, srcpkg: str = '') -> List[str]:
+        """
+        list the build directories of a package, or of all packages if
+        srcpkg is empty
+        """
+        builddirs = []
+        srcpkgs = [srcpkg] if srcpkg else os.listdir(self.build)
+        for name in srcpkgs:
+            pkgdir = os.path.join(self.build, name)
+            if not os.path.isdir(pkgdir) or os.path.islink(pkgdir):
+                continue
+            builddirs += [os.path.join(pkgdir, tag)
+                          for tag in sorted(os.listdir(pkgdir))
+                          if not tag.endswith('.lock')]
+
+        return builddirs
+
+    def discard(self, paths: List[str]):
+        """
+        move files and folders into the trash and let a background process
+        remove them
+        """
+        trashdir = self.cachedir('trash')
+        moved = [move_to_trash(path, trashdir) for path in paths]
+        if any(moved):
+            empty_trash_background(trashdir)
+
+    def _discard_unused(self, paths: List[str], get_lock):
+        """
+        discard the folders that are not used by a concurrent build, along
+        with their lock file
+
+        Args:
+            paths: folders to discard. They may not exist if only their lock
+                file remains.
+            get_lock: function returning the lock of a folder
+        """
+        locks = []
+        for path in paths:
+            lock = get_lock(path)
+            if lock.acquire(blocking=False):
+                locks.append((lock, path))
+            else:
+                dprint('skipping {} used by another build'.format(path))
+
+        try:
+            self.discard([path for _, path in locks])
+        finally:
+            for lock, _ in locks:
+                lock.remove()
+
     def srcclean(self, srcpkg: str = ''):
         """
         remove all copied sources.
-        if pkg is explicit, will only clean given package
+        if pkg is explicit, will only clean given package. The sources used
+        by concurrent builds are not removed.
         """
         if srcpkg:
             dprint('cleaning {0} sources'.format(srcpkg))
 
-        shell('rm -rvf {0}/{1}*'.format(self.sources, srcpkg))
+        self._discard_unused(_list_lockable(self.sources, srcpkg),
+                             srcdir_lock)
 
     def clean(self, srcpkg: str = '', tag: str = ''):
         """
         remove all temporary build objects keep generated packages. if
         srcpkg is explicit, will only clean given package. If tag is further
-        explicted, only tag specific subfolder of srcpkg is cleaned.
+        explicted, only the build directory of the current build of srcpkg
+        and tag is cleaned. The build directories used by concurrent builds
+        are not removed.
         """
         dprint('cleaning {0} workspace'.format(srcpkg + '/' + tag))
-        shell('rm -rvf {0}/{1}/{2}'.format(self.build, srcpkg, tag))
+        if srcpkg and tag:
+            self.discard([self.builddir(srcpkg, tag)])
+            return
+
+        builddirs = []
+        for name in [srcpkg] if srcpkg else os.listdir(self.build):
+            pkgdir = os.path.join(self.build, name)
+            if os.path.isdir(pkgdir) and not os.path.islink(pkgdir):
+                builddirs += _list_lockable(pkgdir)
+
+        self._discard_unused(builddirs, builddir_lock)
 
     def wipe(self):
         """
@@ -115,7 +238,41 @@ class Workspace:
         """
         self.srcclean()
         self.clean()
-        shell('rm -vrf {0}/*'.format(self.packages))
+        self.discard(glob(glob_escape(self.packages) + '/*'))
+
+
+def _list_lockable(dirpath: str, prefix: str = '') -> List[str]:
+    """
+    list the entries of dirpath starting with prefix that are protected by a
+    lock file, including the ones of which only the lock file remains
+    """
+    names = {re.sub(r'\.lock$', '', name) for name in os.listdir(dirpath)
+             if name.startswith(prefix)}
+    return [os.path.join(dirpath, name) for name in sorted(names)]
+
+
+def builddir_lock(builddir: str) -> FileLock:
+    """
+    Get the lock held by the build using builddir
+    """
+    return FileLock(builddir + '.lock')
+
+
+def srcdir_lock(srcdir: str) -> FileLock:
+    """
+    Get the lock held by the build using the temporary source folder srcdir
+    """
+    return FileLock(srcdir + '.lock')
+
+
+def get_install_prefix() -> str:
+    """
+    Get the path where the packages are installed at runtime
+    """
+    if os.name == 'nt':
+        return '/m'
+
+    return '/run/mmpack'
 
 
 def get_local_install_dir(builddir: str):
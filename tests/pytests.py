@@ -2,7 +2,9 @@
 
 import copy
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 
@@ -72,6 +74,15 @@ class TapTestRunner(unittest.TextTestRunner):
 
 
 if __name__ == '__main__':
+    # Run the tests in a temporary workspace so that they never use nor alter
+    # the caches and packages of the user. This must be done before
+    # mmpack_build is imported.
+    test_home = tempfile.mkdtemp(prefix='mmpack-build-tests-')
+    for var, subdir in (('XDG_CACHE_HOME', 'cache'),
+                        ('XDG_CONFIG_HOME', 'config'),
+                        ('XDG_DATA_HOME', 'data')):
+        os.environ[var] = os.path.join(test_home, subdir)
+
     tests_dir = os.path.dirname(os.path.abspath(__file__))
     case_filter = os.environ.get('PY_RUN_CASE', '')
     pattern = 'test_*{0}*.py'.format(case_filter)
@@ -88,6 +99,7 @@ if __name__ == '__main__':
 
     runner = TapTestRunner()
     rv = runner.run(tests)
+    shutil.rmtree(test_home, ignore_errors=True)
     if (len(rv.errors) + len(rv.failures) + len(rv.unexpectedSuccesses)) != 0:
         exit(-1)
     exit(0)
@@ -0,0 +1,64 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest.mock import patch
+
+from mmpack_build.artifacts import place_artifact, _clone_file
+
+
+class TestArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'pkg.mpk')
+        with open(self.src, 'wb') as srcfile:
+            srcfile.write(os.urandom(100000))
+        os.chmod(self.src, 0o640)
+        self.dstdir = os.path.join(self.tmpdir, 'packages')
+        os.makedirs(self.dstdir)
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def _check_placed(self, dst: str):
+        self.assertEqual(dst, os.path.join(self.dstdir, 'pkg.mpk'))
+        self.assertEqual(open(dst, 'rb').read(), open(self.src, 'rb').read())
+        self.assertEqual(os.stat(dst).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.dstdir), ['pkg.mpk'])
+
+    def test_hardlink(self):
+        """test artifact is hardlinked on same filesystem"""
+        with open(os.path.join(self.dstdir, 'pkg.mpk'), 'wb') as oldfile:
+            oldfile.write(b'previous build')
+
+        dst = place_artifact(self.src, self.dstdir)
+        self._check_placed(dst)
+        self.assertTrue(os.path.samefile(self.src, dst))
+
+        # placing it again is a no-op
+        self.assertEqual(place_artifact(self.src, dst), dst)
+        self._check_placed(dst)
+
+    def test_copy(self):
+        """test artifact is copied if it cannot be hardlinked"""
+        with patch('os.link', side_effect=OSError('cross-device link')):
+            dst = place_artifact(self.src, self.dstdir)
+        self._check_placed(dst)
+        self.assertFalse(os.path.samefile(self.src, dst))
+
+        # fallback if the kernel cannot copy it
+        os.remove(dst)
+        with patch('os.link', side_effect=OSError('cross-device link')), \
+                patch('mmpack_build.artifacts._clone_file',
+                      return_value=False):
+            dst = place_artifact(self.src, self.dstdir)
+        self._check_placed(dst)
+
+    def test_clone_file(self):
+        """test copy of file data within the kernel"""
+        dst = os.path.join(self.dstdir, 'pkg.mpk')
+        if _clone_file(self.src, dst):
+            self.assertEqual(open(dst, 'rb').read(),
+                             open(self.src, 'rb').read())
@@ -0,0 +1,125 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from mmpack_build.cache_manager import collect_garbage, parse_size, \
+    _DiskUsage
+from mmpack_build.file_lock import FileLock
+from mmpack_build.workspace import Workspace, builddir_lock, srcdir_lock
+
+
+# age of the old entries created by the tests
+_OLD_AGE_DAYS = 100
+
+
+def _write_file(path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as outfile:
+        outfile.write(b'x' * size)
+
+
+def _set_age(path: str, days: float):
+    mtime = os.stat(path).st_mtime - days * 86400
+    os.utime(path, (mtime, mtime))
+
+
+class TestCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+        rmtree(os.path.join(Workspace().build, 'test-cache-manager'),
+               ignore_errors=True)
+
+    def test_parse_size(self):
+        """test parsing of size with units"""
+        self.assertEqual(parse_size('1024'), 1024)
+        self.assertEqual(parse_size('2K'), 2048)
+        self.assertEqual(parse_size('1.5M'), 3 * 512 * 1024)
+        self.assertEqual(parse_size('20g'), 20 * 1024**3)
+        self.assertEqual(parse_size('1TB'), 1024**4)
+        self.assertRaises(ValueError, parse_size, 'many')
+
+    def test_disk_usage(self):
+        """test hardlinked files are counted once"""
+        _write_file(os.path.join(self.tmpdir, 'dir/file'), 1000)
+        os.link(os.path.join(self.tmpdir, 'dir/file'),
+                os.path.join(self.tmpdir, 'link'))
+
+        usage = _DiskUsage()
+        dirsize = usage.size(os.path.join(self.tmpdir, 'dir'))
+        self.assertGreaterEqual(dirsize, 1000)
+        self.assertEqual(usage.size(os.path.join(self.tmpdir, 'link')), 0)
+
+    def test_max_age(self):
+        """test unused build folders are evicted"""
+        pkgdir = os.path.join(Workspace().build, 'test-cache-manager')
+        for tag, age in (('old', _OLD_AGE_DAYS + 10), ('kept', 0),
+                         ('recent', _OLD_AGE_DAYS - 10)):
+            _write_file(os.path.join(pkgdir, tag, 'obj.o'), 100)
+            mtime = os.stat(pkgdir).st_mtime - age * 86400
+            os.utime(os.path.join(pkgdir, tag), (mtime, mtime))
+
+        # build folder used by a concurrent build is not evicted
+        with builddir_lock(os.path.join(pkgdir, 'old')):
+            evicted = collect_garbage(max_age=_OLD_AGE_DAYS)
+        self.assertEqual(evicted, [])
+
+        evicted = collect_garbage(max_age=_OLD_AGE_DAYS,
+                                  keep=[os.path.join(pkgdir, 'kept')])
+        self.assertEqual([e.paths[0] for e in evicted],
+                         [os.path.join(pkgdir, 'old')])
+        self.assertEqual(Workspace().list_builddirs('test-cache-manager'),
+                         [os.path.join(pkgdir, 'kept'),
+                          os.path.join(pkgdir, 'recent')])
+
+    def test_max_size(self):
+        """test sources in use and published packages are not evicted"""
+        wrk = Workspace()
+        srcdirs = [mkdtemp(dir=wrk.sources) for _ in range(2)]
+        pkgfile = os.path.join(wrk.packages, 'test-cache-manager.mpk')
+        for path in srcdirs + [pkgfile]:
+            _write_file(os.path.join(path, 'data') if path in srcdirs
+                        else path, 1000)
+
+        try:
+            with srcdir_lock(srcdirs[0]):
+                evicted = collect_garbage(max_size=1000, keep=[pkgfile])
+            evicted = [e.paths[0] for e in evicted]
+            self.assertIn(srcdirs[1], evicted)
+            self.assertNotIn(srcdirs[0], evicted)
+            self.assertTrue(os.path.exists(srcdirs[0]))
+            self.assertTrue(os.path.exists(pkgfile))
+        finally:
+            rmtree(srcdirs[0])
+            os.remove(pkgfile)
+
+    def test_other_caches(self):
+        """test git mirrors, analyses and indexes are evicted"""
+        wrk = Workspace()
+        gitdir = wrk.cachedir('git')
+        used = os.path.join(gitdir, 'test-used.git')
+        evictable = [os.path.join(gitdir, 'test-unused.git'),
+                     os.path.join(gitdir, 'test-removed.git.lock'),
+                     os.path.join(wrk.cachedir('pyanalysis'), 'te/test.json'),
+                     os.path.join(wrk.cachedir('indexes'), 'test.json'),
+                     os.path.join(wrk.cachedir('repo-provides'), 'test')]
+        for path in [used] + evictable:
+            _write_file(os.path.join(path, 'HEAD') if path.endswith('.git')
+                        else path, 100)
+            _set_age(path, _OLD_AGE_DAYS + 10)
+
+        try:
+            with FileLock(used + '.lock'):
+                collect_garbage(max_age=_OLD_AGE_DAYS)
+
+            self.assertTrue(os.path.isdir(used))
+            for path in evictable:
+                self.assertFalse(os.path.lexists(path))
+        finally:
+            rmtree(used)
+            os.remove(used + '.lock')
@@ -0,0 +1,124 @@
+# @mindmaze_header@
+
+import unittest
+from os.path import dirname, abspath, join
+
+from mmpack_build.dpkg import dpkg_find_symbols_file, dpkg_find_shlibs_file, \
+    dpkg_parse_symbols, dpkg_find_pypkgs, dpkg_soname_tables, \
+    dpkg_fill_dependency, dpkg_installed_packages, dpkg_version_compare, \
+    dpkg_check_depends
+from mmpack_build.common import get_host_arch
+
+
+_testdir = dirname(abspath(__file__))
+_admindir = join(_testdir, 'dpkg-db')
+
+
+class TestDpkg(unittest.TestCase):
+
+    def test_find_symbols_file(self):
+        """test symbols file lookup from soname index"""
+        # libfoo.so.1 is also described by libfoo-compat which comes first
+        # in alphabetical order: the package named after soname is preferred
+        ref = join(_admindir, 'info/libfoo1.symbols')
+        for soname in ('libfoo.so.1', 'libfoo-extra.so.1'):
+            symbols_file = dpkg_find_symbols_file(soname, _admindir)
+            self.assertEqual(symbols_file, ref)
+
+        with self.assertRaises(FileNotFoundError):
+            dpkg_find_symbols_file('libbar.so.2', _admindir)
+
+    def test_find_shlibs_file(self):
+        """test shlibs file lookup from soname index"""
+        ref = join(_admindir, 'info/libbar2.shlibs')
+        shlibs_file = dpkg_find_shlibs_file('libbar.so.2', _admindir)
+        self.assertEqual(shlibs_file, ref)
+
+        with self.assertRaises(FileNotFoundError):
+            dpkg_find_shlibs_file('libbar.so.3', _admindir)
+
+    def test_parse_symbols(self):
+        """test dependency template filled from symbols file"""
+        symbols_file = join(_admindir, 'info/libfoo1.symbols')
+
+        used = {'foo_init', 'foo_exit', 'other_sym'}
+        dep = dpkg_parse_symbols(symbols_file, 'libfoo.so.1', used)
+        self.assertEqual(dep, 'libfoo1 (>= 1.2)')
+        self.assertEqual(used, {'other_sym'})
+
+        used = {'foo_init', 'foo_new'}
+        dep = dpkg_parse_symbols(symbols_file, 'libfoo.so.1', used)
+        self.assertEqual(dep, 'libfoo1-alt (>= 1.3)')
+        self.assertEqual(used, set())
+
+        used = {'foo_init'}
+        dep = dpkg_parse_symbols(symbols_file, 'libfoo-extra.so.1', used)
+        self.assertEqual(dep, 'libfoo1')
+        self.assertEqual(used, {'foo_init'})
+
+    def test_find_pypkgs(self):
+        """test python package owner lookup from dpkg file lists"""
+        # bazutils is also provided by python3-bazutils which comes after
+        # python3-baz in alphabetical order
+        pypkgs = {'baz', 'bazutils', '_baz_speedups', 'foo'}
+        owners = dpkg_find_pypkgs(pypkgs, _admindir)
+        self.assertEqual(owners, {'baz': 'python3-baz',
+                                  'bazutils': 'python3-baz',
+                                  '_baz_speedups': 'python3-baz'})
+
+    def test_soname_tables(self):
+        """test batched soname lookup"""
+        sonames = {'libfoo.so.1', 'libfoo-extra.so.1', 'libnone.so.0'}
+        tables = dpkg_soname_tables(sonames, _admindir)
+        self.assertEqual(set(tables), {'libfoo.so.1', 'libfoo-extra.so.1'})
+
+        used = {'foo_init', 'foo_extra'}
+        dep = dpkg_fill_dependency(tables['libfoo-extra.so.1'], used)
+        self.assertEqual(dep, 'libfoo1 (>= 1.1)')
+        dep = dpkg_fill_dependency(tables['libfoo.so.1'], used)
+        self.assertEqual(dep, 'libfoo1 (>= 1.0)')
+        self.assertEqual(used, set())
+
+    def test_installed_packages(self):
+        """test parsing of dpkg status file"""
+        installed = dpkg_installed_packages(_admindir)
+        self.assertEqual(installed['packages'], {'libfoo1': '1.3.0-2',
+                                                 'libbar2': '1:2.1-1',
+                                                 'python3-baz': '0.5-1'})
+        self.assertEqual(installed['provides'],
+                         {'python3-baz-compat': ['0.5-1']})
+
+    def test_version_compare(self):
+        """test debian version comparison"""
+        ordered = ['0.9', '1.0~rc1', '1.0', '1.0-1', '1.0-1.1', '1.0a',
+                   '1.0+b1', '1.2', '1.10', '1:0.1']
+        for i, val in enumerate(ordered):
+            for j, ref in enumerate(ordered):
+                cmp = dpkg_version_compare(val, ref)
+                self.assertEqual(cmp > 0, i > j, (val, ref))
+                self.assertEqual(cmp < 0, i < j, (val, ref))
+
+    def test_check_depends(self):
+        """test dependencies check against installed packages"""
+        satisfied = ['libfoo1 (>= 1.3), libbar2 (>> 1:2.0)',
+                     'libqux0 | python3-baz (<< 1.0)',
+                     'python3-baz-compat (= 0.5-1)',
+                     'libfoo1:any',
+                     'libqux0 [!amd64 !i386 !arm64 !armhf]',
+                     'libqux0 [!linux-any]',
+                     'libqux0 [kfreebsd-any hurd-i386]']
+        unmet = dpkg_check_depends(satisfied, _admindir)
+        self.assertEqual(unmet, [])
+
+        unmet = dpkg_check_depends(['libfoo1 (>= 1.4)', 'libqux0',
+                                    'libbar2 (<< 2.0)', 'python3-baz-compat'],
+                                   _admindir)
+        self.assertEqual(unmet, ['libfoo1 (>= 1.4)', 'libqux0',
+                                 'libbar2 (<< 2.0)'])
+
+        # architecture wildcards
+        wildcards = ['libqux0 [any]', 'libqux0 [linux-any]',
+                     'libqux0 [any-{}]'.format(get_host_arch()),
+                     'libqux0 [!kfreebsd-any]']
+        unmet = dpkg_check_depends(wildcards, _admindir)
+        self.assertEqual(unmet, wildcards)
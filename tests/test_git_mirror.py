@@ -0,0 +1,157 @@
+# @mindmaze_header@
+
+import os
+import tarfile
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+from subprocess import run
+
+from mmpack_build.common import create_tarball
+from mmpack_build.git_mirror import git_mirror_checkout, git_mirror_path, \
+    git_mirror_resolve, git_mirror_read, git_mirror_export
+
+
+def _git(repodir: str, *args):
+    run(['git', '-C', repodir] + list(args), check=True,
+        capture_output=True)
+
+
+def _commit_file(repodir: str, filename: str, content: str):
+    with open(os.path.join(repodir, filename), 'wt') as outfile:
+        outfile.write(content)
+    _git(repodir, 'add', filename)
+    _git(repodir, '-c', 'user.name=test', '-c', 'user.email=test@test',
+         'commit', '--quiet', '-m', 'update ' + filename)
+
+
+class TestGitMirror(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.repodir = os.path.join(self.tmpdir, 'repo')
+        self.url = 'file://' + self.repodir
+        os.makedirs(self.repodir)
+        _git(self.repodir, 'init', '--quiet')
+        _commit_file(self.repodir, 'foo', 'v1')
+        _git(self.repodir, 'tag', 'v1')
+
+    def tearDown(self):
+        rmtree(git_mirror_path(self.url), ignore_errors=True)
+        rmtree(self.tmpdir)
+
+    def _checkout(self, tag: str = None) -> str:
+        clonedir = mkdtemp(dir=self.tmpdir)
+        git_mirror_checkout(self.url, clonedir, tag)
+        return open(os.path.join(clonedir, 'foo')).read()
+
+    def test_checkout(self):
+        """test checkout of default branch, tag and commit"""
+        self.assertEqual(self._checkout(), 'v1')
+        self.assertTrue(os.path.isdir(git_mirror_path(self.url)))
+
+        _commit_file(self.repodir, 'foo', 'v2')
+        self.assertEqual(self._checkout(), 'v2')
+        self.assertEqual(self._checkout('v1'), 'v1')
+
+        _commit_file(self.repodir, 'foo', 'v3')
+        commit = run(['git', '-C', self.repodir, 'rev-parse', 'HEAD'],
+                     check=True, capture_output=True, text=True).stdout
+        _commit_file(self.repodir, 'foo', 'v4')
+        self.assertEqual(self._checkout(commit.strip()), 'v3')
+
+    def test_default_branch(self):
+        """test default branch follows the HEAD of the repository"""
+        self.assertEqual(self._checkout(), 'v1')
+
+        _git(self.repodir, 'checkout', '--quiet', '-b', 'dev')
+        _commit_file(self.repodir, 'foo', 'v2')
+        _, _, tag = git_mirror_resolve(self.url)
+        self.assertEqual(tag, 'dev')
+        self.assertEqual(self._checkout(), 'v2')
+
+        _git(self.repodir, 'checkout', '--quiet', '--detach', 'v1')
+        _, _, tag = git_mirror_resolve(self.url)
+        self.assertEqual(tag, 'HEAD')
+        self.assertEqual(self._checkout(), 'v1')
+
+    def test_pinned_commit(self):
+        """test mirror is not fetched if pinned commit is already there"""
+        commit = run(['git', '-C', self.repodir, 'rev-parse', 'HEAD'],
+                     check=True, capture_output=True, text=True).stdout
+        self.assertEqual(self._checkout(), 'v1')
+
+        # upstream is unreachable, but the commit is already mirrored
+        rmtree(self.repodir)
+        self.assertEqual(self._checkout(commit.strip()), 'v1')
+        _, resolved, _ = git_mirror_resolve(self.url, commit.strip())
+        self.assertEqual(resolved, commit.strip())
+
+    def test_local_path(self):
+        """test local folder uses the same mirror as its file url"""
+        self.assertEqual(git_mirror_path(self.repodir),
+                         git_mirror_path(self.url))
+        self.assertTrue(os.path.basename(git_mirror_path(self.url))
+                        .startswith('repo-'))
+
+    def test_export(self):
+        """test deterministic export of tree in tarball"""
+        os.makedirs(os.path.join(self.repodir, 'sub'))
+        _commit_file(self.repodir, 'sub/script.sh', '#!/bin/sh\n')
+        os.symlink('sub/script.sh', os.path.join(self.repodir, 'link'))
+        _git(self.repodir, 'add', 'link')
+        _git(self.repodir, 'update-index', '--chmod=+x', 'sub/script.sh')
+        _commit_file(self.repodir, 'foo', 'v2')
+
+        mirror, commit, tag = git_mirror_resolve(self.url, 'v1')
+        self.assertEqual(tag, 'v1')
+        self.assertEqual(git_mirror_read(mirror, commit, 'foo'), b'v1')
+        self.assertIsNone(git_mirror_read(mirror, commit, 'sub/script.sh'))
+
+        mirror, commit, _ = git_mirror_resolve(self.url)
+        tarballs = []
+        for i in range(2):
+            dstdir = os.path.join(self.tmpdir, 'export{}'.format(i))
+            os.makedirs(dstdir)
+            tarballs.append(dstdir + '.tar.xz')
+            git_mirror_export(mirror, commit, dstdir, tarballs[-1])
+
+            self.assertEqual(open(dstdir + '/foo').read(), 'v2')
+            self.assertEqual(os.readlink(dstdir + '/link'), 'sub/script.sh')
+            self.assertTrue(os.access(dstdir + '/sub/script.sh', os.X_OK))
+
+        self.assertEqual(open(tarballs[0], 'rb').read(),
+                         open(tarballs[1], 'rb').read())
+        with tarfile.open(tarballs[0]) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+        self.assertEqual(set(members), {'.', './foo', './link', './sub',
+                                        './sub/script.sh'})
+        self.assertEqual(members['./sub/script.sh'].mode, 0o755)
+        self.assertEqual(members['./foo'].mode, 0o644)
+        self.assertTrue(members['./link'].issym())
+        self.assertTrue(all(m.mtime == 0 and m.uid == 0
+                            for m in members.values()))
+
+    def test_export_same_as_checkout(self):
+        """test export gives the same tarball as a checkout"""
+        os.makedirs(os.path.join(self.repodir, 'sub'))
+        _commit_file(self.repodir, 'sub/script.sh', '#!/bin/sh\n')
+        _commit_file(self.repodir, 'sub.c', '')
+        _commit_file(self.repodir, 'sub-dir', '')
+        _commit_file(self.repodir, 'sub/data', 'data')
+        os.symlink('sub/data', os.path.join(self.repodir, 'sub.link'))
+        _git(self.repodir, 'add', 'sub.link')
+        _git(self.repodir, 'update-index', '--chmod=+x', 'sub/script.sh')
+        _git(self.repodir, '-c', 'user.name=test', '-c',
+             'user.email=test@test', 'commit', '--quiet', '-m', 'chmod')
+
+        clonedir = mkdtemp(dir=self.tmpdir)
+        git_mirror_checkout(self.url, clonedir)
+        rmtree(os.path.join(clonedir, '.git'))
+        create_tarball(clonedir, clonedir + '.tar.xz', 'xz')
+
+        mirror, commit, _ = git_mirror_resolve(self.url)
+        dstdir = mkdtemp(dir=self.tmpdir)
+        git_mirror_export(mirror, commit, dstdir, dstdir + '.tar.xz')
+
+        self.assertEqual(open(clonedir + '.tar.xz', 'rb').read(),
+                         open(dstdir + '.tar.xz', 'rb').read())
@@ -1,12 +1,19 @@
 # @mindmaze_header@
 
+import marshal
+import os
+import shutil
 import unittest
 from glob import glob
 from os.path import dirname, abspath, join
+from tempfile import mkdtemp
 from typing import Set
 
 from mmpack_build.base_hook import PackageInfo
-from mmpack_build.hook_python import _gen_pysymbols, _gen_pydepends
+from mmpack_build.hook_python import _gen_pysymbols, _gen_pydepends, \
+    _gen_pyimports, _compile_bytecode, MMPackBuildHook
+from mmpack_build.mm_version import Version
+from mmpack_build.workspace import get_install_prefix
 
 
 _testdir = dirname(abspath(__file__))
@@ -20,6 +27,12 @@ def _load_py_symbols(name: str, pkgfiles: Set[str]) -> Set[str]:
     return _gen_pysymbols(name, pkg, _sitedir)
 
 
+def _write_file(filename: str, content: str):
+    os.makedirs(dirname(filename), exist_ok=True)
+    with open(filename, 'wt') as outfile:
+        outfile.write(content)
+
+
 def _get_py_imports(pkgfiles: Set[str]) -> Set[str]:
     pkg = PackageInfo('test_pkg')
     pkg.files = {join(_sitedir, f) for f in pkgfiles}
@@ -27,6 +40,12 @@ def _get_py_imports(pkgfiles: Set[str]) -> Set[str]:
     return {s.split('.', maxsplit=1)[0] for s in used_symbols}
 
 
+def _get_py_import_stmts(pkgfiles: Set[str]) -> Set[str]:
+    pkg = PackageInfo('test_pkg')
+    pkg.files = {join(_sitedir, f) for f in pkgfiles}
+    return _gen_pyimports(pkg, _sitedir)
+
+
 class TestPythonHook(unittest.TestCase):
 
     def test_provides_bare_module(self):
@@ -136,3 +155,110 @@ class TestPythonHook(unittest.TestCase):
         refimports = {'simple'}
         imports = _get_py_imports(pkgfiles)
         self.assertEqual(imports, refimports)
+
+    def test_imports_simple(self):
+        """test import statements of simple package with no import"""
+        pkgfiles = ['simple/__init__.py']
+        imports = _get_py_import_stmts(pkgfiles)
+        self.assertEqual(imports, set())
+
+    def test_imports_multi(self):
+        """test import statements with relative imports"""
+        pkgfiles = [
+            'multi/__init__.py',
+            'multi/foo.py',
+            'multi/bar.py',
+        ]
+        imports = _get_py_import_stmts(pkgfiles)
+        self.assertEqual(imports, set())
+
+    def test_imports_pkg_imported(self):
+        """test import statements with pkg importing another package"""
+        pkgfiles = ['pkg_imported/__init__.py']
+        imports = _get_py_import_stmts(pkgfiles)
+        self.assertEqual(imports, {'simple'})
+
+    def test_dispatch_bytecode(self):
+        """test bytecode files are dispatched with their module"""
+        install_files = {
+            'lib/python3/site-packages/bare.py',
+            'lib/python3/site-packages/__pycache__/bare.cpython-37.pyc',
+            'lib/python3/site-packages/multi/__init__.py',
+            'lib/python3/site-packages/multi/__pycache__/'
+            '__init__.cpython-37.pyc',
+        }
+        hook = MMPackBuildHook('test', Version('1.0.0'), 'amd64-debian')
+        dispatch = hook.get_dispatch(install_files)
+        self.assertEqual(set(dispatch.keys()), {'python3-bare',
+                                                'python3-multi'})
+        self.assertEqual(len(dispatch['python3-bare']), 2)
+        self.assertEqual(len(dispatch['python3-multi']), 2)
+
+    def test_compile_bytecode(self):
+        """test bytecode is hash-based and refers to runtime path"""
+        sitedir = 'lib/python3/site-packages'
+        tmpdir = mkdtemp()
+        prevdir = os.getcwd()
+        try:
+            os.chdir(tmpdir)
+            shutil.copytree(join(_sitedir, 'simple'), join(sitedir, 'simple'))
+
+            _compile_bytecode(sitedir)
+            pycfiles = glob(sitedir + '/simple/__pycache__/__init__.*.pyc')
+            self.assertEqual(len(pycfiles), 1)
+            data = open(pycfiles[0], 'rb').read()
+
+            # flags of header must indicate unchecked hash-based bytecode
+            self.assertEqual(int.from_bytes(data[4:8], 'little'), 1)
+            code = marshal.loads(data[16:])
+            self.assertEqual(code.co_filename, get_install_prefix() + '/'
+                             + sitedir + '/simple/__init__.py')
+
+            # compiling again must produce the same bytecode
+            _compile_bytecode(sitedir)
+            self.assertEqual(open(pycfiles[0], 'rb').read(), data)
+        finally:
+            os.chdir(prevdir)
+            shutil.rmtree(tmpdir)
+
+    def test_post_local_install_merge(self):
+        """test move of versioned site folders to unversioned one"""
+        hook = MMPackBuildHook('test', Version('1.0.0'), 'amd64-debian')
+        tmpdir = mkdtemp()
+        prevdir = os.getcwd()
+        try:
+            os.chdir(tmpdir)
+            _write_file('lib/python3.6/site-packages/foo/__init__.py', 'A=1')
+            _write_file('lib/python3.6/site-packages/foo/sub/mod.py', '')
+            _write_file('lib/python3.7/site-packages/foo/__init__.py', 'A=1')
+            _write_file('lib/python3.7/site-packages/bar/__init__.py', '')
+
+            hook.post_local_install()
+            self.assertEqual(set(glob('lib/**', recursive=True)), {
+                'lib/',
+                'lib/python3.6',
+                'lib/python3.7',
+                'lib/python3',
+                'lib/python3/site-packages',
+                'lib/python3/site-packages/foo',
+                'lib/python3/site-packages/foo/__init__.py',
+                'lib/python3/site-packages/foo/sub',
+                'lib/python3/site-packages/foo/sub/mod.py',
+                'lib/python3/site-packages/bar',
+                'lib/python3/site-packages/bar/__init__.py',
+            })
+
+            # same file with different content must not be merged
+            _write_file('lib/python3.8/site-packages/bar/__init__.py', 'B=2')
+            self.assertRaises(FileExistsError, hook.post_local_install)
+            os.remove('lib/python3.8/site-packages/bar/__init__.py')
+
+            # even if size and modification time are the same
+            ref = 'lib/python3/site-packages/foo/__init__.py'
+            _write_file('lib/python3.8/site-packages/foo/__init__.py', 'A=2')
+            os.utime('lib/python3.8/site-packages/foo/__init__.py',
+                     ns=(os.stat(ref).st_atime_ns, os.stat(ref).st_mtime_ns))
+            self.assertRaises(FileExistsError, hook.post_local_install)
+        finally:
+            os.chdir(prevdir)
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,88 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mmpack_build.common import metadata_serialize, metadata_load, \
+    yaml_load, METADATA_FORMATS, set_metadata_format
+from mmpack_build.mm_version import Version
+from mmpack_build.provide import Provide, ProvideList
+
+
+_SYMBOLS_DATA = {
+    'libfoo.so.1': {
+        'depends': 'libfoo1',
+        'symbols': {'foo_init': Version('1.0'), 'foo_exit': Version('1.2')},
+    },
+}
+
+_SYMBOLS_REF = {
+    'libfoo.so.1': {
+        'depends': 'libfoo1',
+        'symbols': {'foo_init': '1.0', 'foo_exit': '1.2'},
+    },
+}
+
+
+class TestMetadata(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.saved_formats = METADATA_FORMATS.copy()
+
+    def tearDown(self):
+        METADATA_FORMATS.update(self.saved_formats)
+        rmtree(self.tmpdir)
+
+    def test_yaml_roundtrip(self):
+        """test metadata are written and read back in yaml by default"""
+        filename = os.path.join(self.tmpdir, 'libfoo1.symbols')
+        metadata_serialize(_SYMBOLS_DATA, filename)
+        self.assertEqual(metadata_load(filename), _SYMBOLS_REF)
+        self.assertEqual(yaml_load(filename), _SYMBOLS_REF)
+
+    def test_compact_roundtrip(self):
+        """test compact metadata can be read by both readers"""
+        set_metadata_format('symbols', 'compact')
+        filename = os.path.join(self.tmpdir, 'libfoo1.symbols')
+        metadata_serialize(_SYMBOLS_DATA, filename)
+        self.assertTrue(open(filename).read().startswith('{"libfoo.so.1"'))
+        self.assertEqual(metadata_load(filename), _SYMBOLS_REF)
+        self.assertEqual(yaml_load(filename), _SYMBOLS_REF)
+
+    def test_compact_per_filetype(self):
+        """test compact format is only used for the selected file types"""
+        set_metadata_format('symbols', 'compact')
+        filename = os.path.join(self.tmpdir, 'libfoo1.sha256sums')
+        metadata_serialize({'lib/libfoo.so.1': 'reg-abcd'}, filename,
+                           use_block_style=True)
+        self.assertEqual(open(filename).read(), 'lib/libfoo.so.1: reg-abcd\n')
+
+        with self.assertRaises(ValueError):
+            set_metadata_format('sha256sums', 'compact')
+
+    def test_provides_bloom(self):
+        """test provide files are only parsed if bloom filter matches"""
+        for i in range(3):
+            provide = Provide('libfoo{}'.format(i), 'libfoo.so.{}'.format(i))
+            provide.pkgdepends = 'libfoo{}'.format(i)
+            provide.add_symbols({'foo_init', 'foo_exit'}, Version('1.0'))
+            provides = ProvideList('sharedlib')
+            provides.add(provide)
+            provides.serialize(os.path.join(self.tmpdir,
+                                            'libfoo{}.symbols'.format(i)))
+
+        provides = ProvideList('sharedlib')
+        for i in range(3):
+            provides.add_from_file(os.path.join(self.tmpdir,
+                                                'libfoo{}.symbols'.format(i)),
+                                   lazy=True)
+
+        sonames = {'libfoo.so.1', 'libbar.so.1'}
+        symbols = {'foo_init', 'bar_init'}
+        deps = provides.gen_deps(sonames, symbols)
+        self.assertEqual(deps, [('libfoo1', Version('1.0'))])
+        self.assertEqual(sonames, {'libbar.so.1'})
+        self.assertEqual(symbols, {'bar_init'})
+        self.assertEqual(len(provides._pending), 2)
@@ -1,9 +1,12 @@
 # @mindmaze_header@
 import os
 import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
 
 from mmpack_build.src_package import SrcPackage
 from mmpack_build.mm_version import Version
+from mmpack_build.workspace import Workspace
 
 
 class TestSrcPackageClass(unittest.TestCase):
@@ -73,3 +76,29 @@ class TestSrcPackageClass(unittest.TestCase):
         self.assertEqual(len(custom._dependencies['depends']), 2)
         self.assertRegexpMatches(custom.description,
                                  r'This should overload .*')
+
+    def _load_with_general_key(self, key: str, value: str) -> SrcPackage:
+        tmpdir = mkdtemp()
+        self.addCleanup(rmtree, tmpdir)
+        specdir = os.path.dirname(os.path.abspath(__file__)) + '/specfiles'
+        specfile = os.path.join(tmpdir, 'mmpack.yaml')
+        with open(specdir + '/simple.yaml') as infile, \
+                open(specfile, 'wt') as outfile:
+            outfile.write(infile.read().replace(
+                'general:\n', 'general:\n  {}: {}\n'.format(key, value)))
+        return SrcPackage(specfile, 'dummy_tag', 'empty_file')
+
+    def test_python_bytecode(self):
+        """
+        parsing of python-bytecode boolean
+        """
+        self.addCleanup(setattr, Workspace(), 'python_bytecode', None)
+        for value, expected in (('false', False), ('No', False),
+                                ('true', True), ('yes', True)):
+            Workspace().python_bytecode = None
+            self._load_with_general_key('python-bytecode', value)
+            self.assertIs(Workspace().python_bytecode, expected)
+
+        Workspace().python_bytecode = None
+        self.assertRaises(ValueError, self._load_with_general_key,
+                          'python-bytecode', 'maybe')
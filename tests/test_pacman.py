@@ -0,0 +1,32 @@
+# @mindmaze_header@
+
+import unittest
+from os.path import dirname, abspath, join
+
+from mmpack_build.pacman import pacman_find_file_owner, pacman_find_pypkgs
+
+
+_testdir = dirname(abspath(__file__))
+_dbdir = join(_testdir, 'pacman-db')
+
+
+class TestPacman(unittest.TestCase):
+
+    def test_find_file_owner(self):
+        """test file owner lookup from pacman local database"""
+        owner = pacman_find_file_owner('/mingw64/bin/zlib1.dll', _dbdir)
+        self.assertEqual(owner, 'mingw-w64-x86_64-zlib')
+
+        owner = pacman_find_file_owner('mingw64\\bin\\ZLIB1.dll', _dbdir)
+        self.assertEqual(owner, 'mingw-w64-x86_64-zlib')
+
+        owner = pacman_find_file_owner('/mingw64/bin/libfoo.dll', _dbdir)
+        self.assertIsNone(owner)
+
+    def test_find_pypkgs(self):
+        """test python package owner lookup from pacman local database"""
+        # foo is only installed in msys python, not the mingw64 one
+        pypkgs = {'numpy', 'six', '__pycache__', 'foo'}
+        owners = pacman_find_pypkgs(pypkgs, _dbdir)
+        self.assertEqual(owners, {'numpy': 'mingw-w64-x86_64-python-numpy',
+                                  'six': 'mingw-w64-x86_64-python-six'})
@@ -0,0 +1,63 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mmpack_build.pyanalysis_cache import AnalysisCache
+
+
+def _write_file(filename: str, content: str):
+    with open(filename, 'wt') as outfile:
+        outfile.write(content)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.sitedir = os.path.join(self.tmpdir, 'site')
+        os.makedirs(self.sitedir)
+        self.cache = AnalysisCache(os.path.join(self.tmpdir, 'cache'),
+                                   self.sitedir)
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_relocate(self):
+        """test paths in site folder are recorded relative to it"""
+        path = os.path.join(self.sitedir, 'foo/__init__.py')
+        relocated = self.cache.relocate(path)
+        self.assertFalse(relocated.startswith(self.tmpdir))
+        self.assertEqual(self.cache.resolve(relocated), path)
+        self.assertEqual(self.cache.relocate('/usr/lib/bar.py'),
+                         '/usr/lib/bar.py')
+
+    def test_invalidation(self):
+        """test result is discarded when a module resolved against changes"""
+        dep = os.path.join(self.sitedir, 'dep.py')
+        _write_file(dep, 'def foo():\n    pass\n')
+
+        key = self.cache.key('depends', 'mod.py', 'digest')
+        self.assertIsNone(self.cache.load(key))
+        self.cache.store(key, [['dep.foo', dep]], {dep})
+        self.assertEqual(self.cache.load(key), [['dep.foo', dep]])
+
+        _write_file(dep, 'def foobar():\n    pass\n')
+        self.assertIsNone(self.cache.load(key))
+
+    def test_variants(self):
+        """test results against different versions of a module are kept"""
+        dep = os.path.join(self.sitedir, 'dep.py')
+        key = self.cache.key('depends', 'mod.py', 'digest')
+
+        _write_file(dep, 'def foo():\n    pass\n')
+        self.cache.store(key, [['dep.foo', dep]], {dep})
+        _write_file(dep, 'def foobar():\n    pass\n')
+        self.assertIsNone(self.cache.load(key))
+        self.cache.store(key, [['dep.foobar', dep]], {dep})
+
+        _write_file(dep, 'def foo():\n    pass\n')
+        self.assertEqual(self.cache.load(key), [['dep.foo', dep]])
+        _write_file(dep, 'def foobar():\n    pass\n')
+        self.assertEqual(self.cache.load(key), [['dep.foobar', dep]])
@@ -0,0 +1,79 @@
+# @mindmaze_header@
+
+import os
+import sys
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mmpack_build.python_depends import _gen_py_depends, gen_pkg_depends
+
+
+def _write_file(filename: str, content: str):
+    with open(filename, 'wt') as outfile:
+        outfile.write(content)
+
+
+class TestPythonDepends(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        sys.path.insert(0, self.tmpdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir)
+        rmtree(self.tmpdir)
+
+    def _gen_depends(self, modname: str, content: str):
+        filename = os.path.join(self.tmpdir, modname + '.py')
+        _write_file(filename, content)
+        return _gen_py_depends(filename, {filename})
+
+    def test_deeply_nested(self):
+        """test analysis of generated module with deeply nested expression"""
+        _write_file(os.path.join(self.tmpdir, 'extdep_deep.py'),
+                    'def compute(val):\n    return val\n')
+        terms = ' + '.join('compute({})'.format(i) for i in range(1500))
+        content = 'from extdep_deep import compute\n\nVAL = ' + terms + '\n'
+
+        used = self._gen_depends('deep', content)
+        self.assertEqual(used, {'extdep_deep.compute'})
+
+    def test_call_targets(self):
+        """test calls with same target name bound differently"""
+        _write_file(os.path.join(self.tmpdir, 'extdep_targets.py'),
+                    'def helper():\n    pass\n\n'
+                    'def other():\n    pass\n')
+        content = ('import extdep_targets\n\n'
+                   'def use_ext():\n'
+                   '    from extdep_targets import helper\n'
+                   '    return helper()\n\n'
+                   'def use_local():\n'
+                   '    def helper():\n'
+                   '        return len([])\n'
+                   '    return helper() + helper()\n\n'
+                   'class Local:\n'
+                   '    def meth(self):\n'
+                   '        return extdep_targets.other()\n\n'
+                   'Local().meth()\n')
+
+        used = self._gen_depends('targets', content)
+        self.assertEqual(used, {'extdep_targets.helper',
+                                'extdep_targets.other'})
+
+    def test_parallel_jobs(self):
+        """test analysis gives the same result whatever the number of jobs"""
+        _write_file(os.path.join(self.tmpdir, 'extdep_jobs.py'),
+                    'def helper():\n    pass\n\n'
+                    'class Base:\n    pass\n')
+        files = []
+        for i in range(5):
+            files.append(os.path.join(self.tmpdir, 'jobs{}.py'.format(i)))
+            _write_file(files[-1], 'import extdep_jobs\n\n'
+                        'OBJ{} = extdep_jobs.Base()\n'
+                        'extdep_jobs.helper()\n'.format(i))
+
+        ref = gen_pkg_depends(files, jobs=1)
+        self.assertEqual(ref, {'extdep_jobs.Base', 'extdep_jobs.helper'})
+        for jobs in (4, 2, 8):
+            self.assertEqual(gen_pkg_depends(files, jobs=jobs), ref)
+        self.assertEqual(gen_pkg_depends(files[:1], jobs=8), ref)
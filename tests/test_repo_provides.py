@@ -0,0 +1,105 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from tempfile import mkdtemp
+from threading import Thread
+from shutil import rmtree
+
+from mmpack_build import repo_provides
+from mmpack_build.common import get_host_arch_dist, metadata_serialize, \
+    yaml_serialize
+from mmpack_build.provide import load_mmpack_provides
+from mmpack_build.workspace import Workspace
+
+
+_INSTALLED_SYMBOLS = {
+    'libfoo.so.1': {
+        'depends': 'libfoo1',
+        'symbols': {'foo_init': '1.0'},
+    },
+    'libinstalled.so.1': {
+        'depends': 'libinstalled1',
+        'symbols': {'inst_init': '1.0'},
+    },
+}
+
+_REPO_SYMBOLS = {
+    'libfoo.so.1': {
+        'depends': 'libfoo1',
+        'symbols': {'foo_init': '1.0', 'foo_new': '2.0'},
+    },
+}
+
+
+class _IndexRequestHandler(BaseHTTPRequestHandler):
+    """
+    serve the provides index of the server
+    """
+    # pylint: disable=invalid-name
+    def do_GET(self):
+        if self.path != '/' + repo_provides.PROVIDES_INDEX_NAME:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.content)))
+        self.end_headers()
+        self.wfile.write(self.server.content)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestRepoProvides(unittest.TestCase):
+    def setUp(self):
+        self.prefix = mkdtemp()
+        self.server = HTTPServer(('127.0.0.1', 0), _IndexRequestHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        # Generate the provides index published by the repository
+        mpkfile = 'libfoo1_2.0_{}.mpk'.format(get_host_arch_dist())
+        indexfile = os.path.join(self.prefix, 'provides-index')
+        yaml_serialize({'sharedlib': {mpkfile: _REPO_SYMBOLS}}, indexfile)
+        self.server.content = open(indexfile, 'rb').read()
+
+        # Configure the repository in prefix and install metadata of a
+        # package providing the same library
+        os.makedirs(self.prefix + '/etc')
+        yaml_serialize({'repositories': ['http://127.0.0.1:{}/'.format(
+            self.server.server_address[1])]},
+                       self.prefix + '/etc/mmpack-config.yaml')
+        metadatadir = self.prefix + '/var/lib/mmpack/metadata'
+        os.makedirs(metadatadir)
+        metadata_serialize(_INSTALLED_SYMBOLS,
+                           metadatadir + '/libfoo1.symbols')
+
+        wrk = Workspace()
+        wrk.prefix = self.prefix
+        wrk.use_repo_provides = True
+        repo_provides._REPO_PROVIDES = None  # pylint: disable=W0212
+
+    def tearDown(self):
+        wrk = Workspace()
+        wrk.prefix = ''
+        wrk.use_repo_provides = False
+        repo_provides._REPO_PROVIDES = None  # pylint: disable=W0212
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        rmtree(self.prefix)
+
+    def test_repo_precedence(self):
+        """test provides of repository take precedence over installed ones"""
+        provides = load_mmpack_provides('symbols', 'sharedlib')
+
+        foo = provides.get('libfoo.so.1')
+        self.assertEqual(set(foo.symbols), {'foo_init', 'foo_new'})
+
+        # libraries only installed remain available
+        self.assertIsNotNone(provides.get('libinstalled.so.1'))
+        self.assertIsNone(provides.get('libmissing.so.1'))
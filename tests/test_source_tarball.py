@@ -0,0 +1,192 @@
+# @mindmaze_header@
+
+import io
+import os
+import re
+import tarfile
+import time
+import unittest
+from hashlib import sha256
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from tempfile import mkdtemp
+from threading import Thread
+from shutil import rmtree
+
+from mmpack_build.common import Assert
+from mmpack_build.source_tarball import _download, _fetch_upstream_from_tar
+from mmpack_build.upstream_cache import upstream_cache_add, \
+    upstream_cache_get
+from mmpack_build.workspace import Workspace
+
+
+_CONTENT = bytes(range(256)) * 1024
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    serve the content of the server at any path, supporting Range requests
+    """
+    # pylint: disable=invalid-name
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get('Range'))
+        content = self.server.content
+
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            # misbehaving server sending the whole content as partial
+            if self.server.ignore_range:
+                start = 0
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'
+                             .format(start, len(content) - 1,
+                                     len(content)))
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'file.tar')
+        self.server = HTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        self.server.ranges = []
+        self.server.content = _CONTENT
+        self.server.ignore_range = False
+        self.url = 'http://127.0.0.1:{}/file.tar'\
+                   .format(self.server.server_address[1])
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        rmtree(self.tmpdir)
+
+    def test_download(self):
+        """test download with hash verification"""
+        _download(self.url, self.filename, sha256(_CONTENT).hexdigest())
+        self.assertEqual(open(self.filename, 'rb').read(), _CONTENT)
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+        self.assertEqual(self.server.ranges, [None])
+
+    def test_hash_mismatch(self):
+        """test download is rejected if hash does not match"""
+        self.assertRaises(Assert, _download, self.url, self.filename,
+                          sha256(b'other').hexdigest())
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+
+    def test_resume(self):
+        """test interrupted download is resumed"""
+        with open(self.filename + '.part', 'wb') as partfile:
+            partfile.write(_CONTENT[:1000])
+
+        _download(self.url, self.filename, sha256(_CONTENT).hexdigest())
+        self.assertEqual(open(self.filename, 'rb').read(), _CONTENT)
+        self.assertEqual(self.server.ranges, ['bytes=1000-'])
+
+    def test_resume_unpinned(self):
+        """test download is not resumed if content is not pinned"""
+        with open(self.filename + '.part', 'wb') as partfile:
+            partfile.write(b'x' * 1000)
+
+        _download(self.url, self.filename)
+        self.assertEqual(open(self.filename, 'rb').read(), _CONTENT)
+        self.assertEqual(self.server.ranges, [None])
+
+    def test_resume_wrong_range(self):
+        """test download restarts if server does not send requested range"""
+        self.server.ignore_range = True
+        with open(self.filename + '.part', 'wb') as partfile:
+            partfile.write(_CONTENT[:1000])
+
+        _download(self.url, self.filename, sha256(_CONTENT).hexdigest())
+        self.assertEqual(open(self.filename, 'rb').read(), _CONTENT)
+        self.assertEqual(self.server.ranges, ['bytes=1000-', None])
+
+    def test_resume_complete(self):
+        """test resume of download already complete"""
+        with open(self.filename + '.part', 'wb') as partfile:
+            partfile.write(_CONTENT)
+
+        _download(self.url, self.filename, sha256(_CONTENT).hexdigest())
+        self.assertEqual(open(self.filename, 'rb').read(), _CONTENT)
+
+    def test_upstream_cache(self):
+        """test upstream tarball with sha256 is downloaded only once"""
+        tarbuf = io.BytesIO()
+        with tarfile.open(fileobj=tarbuf, mode='w') as tar:
+            info = tarfile.TarInfo('foo')
+            info.size = 3
+            tar.addfile(info, io.BytesIO(b'bar'))
+        self.server.content = tarbuf.getvalue()
+        specs = {'url': self.url,
+                 'sha256': sha256(self.server.content).hexdigest()}
+
+        try:
+            for i in range(2):
+                srcdir = os.path.join(self.tmpdir, 'src{}'.format(i))
+                os.makedirs(srcdir)
+                _fetch_upstream_from_tar(srcdir, specs)
+                self.assertEqual(open(srcdir + '/foo').read(), 'bar')
+
+            self.assertEqual(self.server.ranges, [None])
+        finally:
+            cached = upstream_cache_get(specs['sha256'])
+            if cached:
+                os.remove(cached)
+
+
+class TestUpstreamCache(unittest.TestCase):
+    def setUp(self):
+        # tests are run in a temporary workspace (see pytests.py)
+        rmtree(Workspace().cachedir('upstream'))
+        self.tmpdir = mkdtemp()
+        self.hashes = []
+
+    def tearDown(self):
+        for filehash in self.hashes:
+            cached = upstream_cache_get(filehash)
+            if cached:
+                os.remove(cached)
+        rmtree(self.tmpdir)
+
+    def _add(self, content: bytes, max_size: int) -> str:
+        filename = os.path.join(self.tmpdir, 'file')
+        with open(filename, 'wb') as outfile:
+            outfile.write(content)
+
+        filehash = sha256(content).hexdigest()
+        self.hashes.append(filehash)
+        return upstream_cache_add(filehash, filename, max_size)
+
+    def test_eviction(self):
+        """test least recently used files are evicted"""
+        size = 1024 * 1024 * 1024
+        first = self._add(b'1' * 1000, size)
+        second = self._add(b'2' * 1000, size)
+        now = time.time()
+        os.utime(first, (now - 20, now - 20))
+        os.utime(second, (now - 10, now - 10))
+
+        # first becomes the most recently used
+        self.assertEqual(upstream_cache_get(self.hashes[0]), first)
+
+        third = self._add(b'3' * 1000, 2500)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
@@ -0,0 +1,76 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mmpack_build.common import create_tarball
+from mmpack_build.srctar_cache import srctar_cache_add, srctar_cache_get, \
+    tree_digest
+
+
+def _create_tree(srcdir: str):
+    os.makedirs(os.path.join(srcdir, 'mmpack'))
+    with open(os.path.join(srcdir, 'mmpack/specs'), 'w') as specs:
+        specs.write('general:\n  name: foo\n  version: 1.0.0\n')
+    with open(os.path.join(srcdir, 'build.sh'), 'w') as script:
+        script.write('#!/bin/sh\n')
+    os.chmod(os.path.join(srcdir, 'build.sh'), 0o755)
+    os.symlink('build.sh', os.path.join(srcdir, 'configure'))
+
+
+class TestSrctarCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.srcdirs = [mkdtemp(dir=self.tmpdir) for _ in range(2)]
+        for srcdir in self.srcdirs:
+            _create_tree(srcdir)
+        self.cached = []
+
+    def tearDown(self):
+        for cached in self.cached:
+            for path in (cached, cached + '.sha256'):
+                if os.path.exists(path):
+                    os.remove(path)
+        rmtree(self.tmpdir)
+
+    def test_tree_digest(self):
+        """test digest depends only on paths, modes and content"""
+        digest = tree_digest(self.srcdirs[0])
+        self.assertEqual(tree_digest(self.srcdirs[1]), digest)
+
+        script = os.path.join(self.srcdirs[1], 'build.sh')
+        os.chmod(script, 0o644)
+        self.assertNotEqual(tree_digest(self.srcdirs[1]), digest)
+        os.chmod(script, 0o755)
+
+        with open(script, 'a') as scriptfile:
+            scriptfile.write('true\n')
+        self.assertNotEqual(tree_digest(self.srcdirs[1]), digest)
+
+        os.remove(os.path.join(self.srcdirs[0], 'configure'))
+        os.symlink('mmpack', os.path.join(self.srcdirs[0], 'configure'))
+        self.assertNotEqual(tree_digest(self.srcdirs[0]), digest)
+
+    def test_reuse(self):
+        """test reused tarball is identical to a generated one"""
+        srctars = [os.path.join(self.tmpdir, 'src{}.tar.xz'.format(i))
+                   for i in range(3)]
+        for srcdir, srctar in zip(self.srcdirs, srctars):
+            create_tarball(srcdir, srctar, 'xz')
+
+        digest = tree_digest(self.srcdirs[0])
+        self.assertFalse(srctar_cache_get(digest, srctars[2]))
+        self.cached.append(srctar_cache_add(digest, srctars[0]))
+
+        self.assertTrue(srctar_cache_get(digest, srctars[2]))
+        self.assertEqual(open(srctars[2], 'rb').read(),
+                         open(srctars[1], 'rb').read())
+
+        # corrupted entry is not reused
+        os.remove(srctars[2])
+        with open(self.cached[0], 'ab') as cached:
+            cached.write(b'garbage')
+        self.assertFalse(srctar_cache_get(digest, srctars[2]))
+        self.assertFalse(os.path.exists(srctars[2]))
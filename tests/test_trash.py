@@ -0,0 +1,86 @@
+# @mindmaze_header@
+
+import os
+import time
+import unittest
+from unittest.mock import patch
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from mmpack_build.trash import rmtree_parallel, move_to_trash, empty_trash, \
+    empty_trash_background
+
+
+def _create_tree(rootdir: str):
+    for i in range(10):
+        subdir = os.path.join(rootdir, 'dir{}'.format(i), 'sub')
+        os.makedirs(subdir)
+        for j in range(10):
+            with open(os.path.join(subdir, 'file{}'.format(j)), 'w') as f:
+                f.write('content')
+    os.makedirs(os.path.join(rootdir, 'outside'))
+    os.symlink('../outside', os.path.join(rootdir, 'dir0', 'link'))
+
+
+class TestTrash(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.trashdir = os.path.join(self.tmpdir, 'trash')
+        self.tree = os.path.join(self.tmpdir, 'tree')
+        _create_tree(self.tree)
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def test_rmtree_parallel(self):
+        """test concurrent removal of folder"""
+        outside = os.path.join(self.tmpdir, 'outside')
+        os.makedirs(outside)
+        os.symlink(outside, os.path.join(self.tree, 'dir1', 'abslink'))
+
+        rmtree_parallel(self.tree, jobs=4)
+        self.assertFalse(os.path.lexists(self.tree))
+        self.assertTrue(os.path.isdir(outside))
+
+    def test_rmtree_parallel_error(self):
+        """test failure of file removal is reported"""
+        real_unlink = os.unlink
+
+        def _failing_unlink(path, **kwargs):
+            if os.path.basename(path) == 'file5':
+                raise PermissionError(13, 'Permission denied', path)
+            real_unlink(path, **kwargs)
+
+        with patch('mmpack_build.trash.os.unlink', _failing_unlink):
+            self.assertRaises(PermissionError, rmtree_parallel, self.tree,
+                              jobs=4)
+
+    def test_trash(self):
+        """test removal through trash"""
+        self.assertTrue(move_to_trash(self.tree, self.trashdir))
+        self.assertFalse(os.path.lexists(self.tree))
+        self.assertEqual(len(os.listdir(self.trashdir)), 1)
+        self.assertFalse(move_to_trash(self.tree, self.trashdir))
+
+        # entries of same name are moved directly in the trash side by side
+        _create_tree(self.tree)
+        self.assertTrue(move_to_trash(self.tree, self.trashdir))
+        entries = os.listdir(self.trashdir)
+        self.assertEqual(len(entries), 2)
+        self.assertTrue(all(e.endswith('-tree') for e in entries))
+        self.assertTrue(os.path.isdir(os.path.join(self.trashdir, entries[0],
+                                                   'dir0', 'sub')))
+
+        empty_trash(self.trashdir)
+        self.assertEqual(os.listdir(self.trashdir), [])
+
+    def test_trash_background(self):
+        """test trash is emptied by a background process"""
+        move_to_trash(self.tree, self.trashdir)
+        empty_trash_background(self.trashdir)
+
+        for _ in range(100):
+            if not os.listdir(self.trashdir):
+                break
+            time.sleep(0.1)
+        self.assertEqual(os.listdir(self.trashdir), [])
@@ -0,0 +1,73 @@
+# @mindmaze_header@
+
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from mmpack_build.workspace import Workspace, builddir_lock, srcdir_lock
+
+
+class TestWorkspace(unittest.TestCase):
+    def tearDown(self):
+        for srcpkg in ('test-ws-concurrent', 'test-ws-clean'):
+            rmtree(os.path.join(Workspace().build, srcpkg),
+                   ignore_errors=True)
+
+    def test_concurrent_builddir(self):
+        """test concurrent builds of same package use different folders"""
+        wrk = Workspace()
+        pkgdir = os.path.join(wrk.build, 'test-ws-concurrent')
+        os.makedirs(pkgdir)
+        with builddir_lock(os.path.join(pkgdir, 'v1')):
+            builddir = wrk.builddir('test-ws-concurrent', 'v1')
+
+        self.assertEqual(builddir, os.path.join(pkgdir, 'v1~1'))
+        self.assertTrue(os.path.isdir(builddir))
+
+        # same folder is used for the whole build
+        self.assertEqual(wrk.builddir('test-ws-concurrent', 'v1'), builddir)
+
+        # clean removes only the folder of the current build
+        os.makedirs(os.path.join(pkgdir, 'v1'), exist_ok=True)
+        wrk.clean('test-ws-concurrent', 'v1')
+        self.assertTrue(os.path.isdir(os.path.join(pkgdir, 'v1')))
+        self.assertFalse(os.path.exists(builddir))
+        self.assertEqual(wrk.builddir('test-ws-concurrent', 'v1'), builddir)
+
+    def test_clean_skip_locked(self):
+        """test clean does not remove folders of concurrent builds"""
+        wrk = Workspace()
+        pkgdir = os.path.join(wrk.build, 'test-ws-clean')
+        for tag in ('used', 'unused'):
+            os.makedirs(os.path.join(pkgdir, tag, 'objs'))
+
+        # lock file left by a removed build directory
+        open(os.path.join(pkgdir, 'removed.lock'), 'w').close()
+
+        with builddir_lock(os.path.join(pkgdir, 'used')):
+            wrk.clean('test-ws-clean')
+
+        self.assertEqual(wrk.list_builddirs('test-ws-clean'),
+                         [os.path.join(pkgdir, 'used')])
+
+        # lock files are removed with their build directory
+        self.assertEqual(sorted(os.listdir(pkgdir)), ['used', 'used.lock'])
+
+    def test_srcclean_skip_locked(self):
+        """test srcclean does not remove sources of concurrent builds"""
+        wrk = Workspace()
+        srcdirs = [mkdtemp(prefix='test-ws-srcclean', dir=wrk.sources)
+                   for _ in range(2)]
+        try:
+            with srcdir_lock(srcdirs[1]):
+                pass
+            with srcdir_lock(srcdirs[0]):
+                wrk.srcclean('test-ws-srcclean')
+
+            self.assertTrue(os.path.isdir(srcdirs[0]))
+            self.assertFalse(os.path.lexists(srcdirs[1]))
+            self.assertFalse(os.path.lexists(srcdirs[1] + '.lock'))
+        finally:
+            rmtree(srcdirs[0])
+            os.remove(srcdirs[0] + '.lock')